@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio 转换接口
+在事件循环中启动转换并以类型化事件（见 events）报告进度：日志、状态、进度、
+每张幻灯片的渲染与编码、各阶段耗时，最后是 ConversionDone 或 ConversionFailed。
+渲染后端和编码都是阻塞调用，转换本身在引擎的线程池中运行，事件经
+call_soon_threadsafe 交回事件循环，不需要轮询；多个转换可以在同一个事件循环中并发等待。
+取消是协作式的：请求取消后转换在下一张幻灯片之前停止（见 SlideConverter 的 cancel_event）。
+
+示例：
+    async def main():
+        async with ConversionEngine(renderer='libreoffice', max_workers=2) as engine:
+            task = engine.start('讲义.pptx', '讲义_image.pptx')
+            async for event in task:
+                print(event.to_dict())
+            return task.result
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+
+from converter import ConversionCancelled, SlideConverter
+from encoders import create_encoder
+from events import ConversionDone, ConversionFailed, LogMessage, Progress, StatusMessage
+from renderers import default_renderer_name, parallel_limit
+
+
+class ConversionTask:
+    """一个正在进行（或已结束）的转换
+
+    async for 逐个取得事件，直到结束事件为止（只能有一个消费者）；
+    await task 等待结束并返回结束事件；cancel() 请求在下一张幻灯片之前停止。
+    等待事件或结果的协程被取消时，转换也一并取消。
+    """
+
+    def __init__(self, input_ppt, output_ppt, loop):
+        self.input_ppt = input_ppt
+        self.output_ppt = output_ppt
+        self.cancel_event = threading.Event()
+        # 结束事件（ConversionDone 或 ConversionFailed），结束前为None
+        self.result = None
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._future = None
+
+    def emit(self, event):
+        """发出事件（任何线程）"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    @property
+    def succeeded(self):
+        return isinstance(self.result, ConversionDone)
+
+    async def __aiter__(self):
+        try:
+            while True:
+                event = await self._queue.get()
+                yield event
+                if event.terminal:
+                    return
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    async def wait(self):
+        """等待转换结束，返回结束事件"""
+        try:
+            return await asyncio.shield(self._future)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    def __await__(self):
+        return self.wait().__await__()
+
+
+class ConversionEngine:
+    """在线程池中运行转换的异步引擎
+
+    renderer 为渲染后端名称，每个转换在自己的线程中创建、退出自己的后端实例；
+    max_workers 为同时进行的转换数，更多的转换排队等待；PowerPoint只能单实例运行
+    （所有转换驱动同一个进程，一个转换退出或结束它会连累其他转换），总是为1。
+    encoder_options 为 create_encoder 的参数，每个转换创建自己的编码器（编码统计按转换分开）。
+    其余关键字参数（cache、tracer、resolution、dedup_tolerance、stream 等）传给
+    SlideConverter，由所有同时进行的转换共用，其中的对象必须线程安全：
+    RenderCache 和 Tracer 内部加锁，可以共用；直接传入的 encoder 也会被共用，
+    其编码统计混在一起，需要分开时改用 encoder_options。
+    """
+
+    def __init__(self, renderer=None, max_workers=1, encoder_options=None, **converter_options):
+        self.renderer = renderer or default_renderer_name()
+        self.max_workers = parallel_limit(self.renderer, max_workers)
+        self.encoder_options = encoder_options
+        self.converter_options = converter_options
+        self.tasks = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='conversion')
+
+    def start(self, input_ppt, output_ppt, patch=False, slides=None):
+        """开始转换，返回 ConversionTask（须在运行中的事件循环里调用）
+
+        patch 为True时只更新已有输出文件中的部分幻灯片（见 SlideConverter.patch）。
+        """
+        loop = asyncio.get_running_loop()
+        task = ConversionTask(input_ppt, output_ppt, loop)
+        task._future = loop.run_in_executor(self._executor, self._run, task, patch, slides)
+        self.tasks = [item for item in self.tasks if not item.done] + [task]
+        return task
+
+    async def convert(self, input_ppt, output_ppt, on_event=None, patch=False, slides=None):
+        """转换一份PPT并等待结束，返回结束事件；on_event 接收每个事件"""
+        task = self.start(input_ppt, output_ppt, patch, slides)
+        async for event in task:
+            if on_event:
+                on_event(event)
+        return task.result
+
+    def cancel_all(self):
+        for task in self.tasks:
+            task.cancel()
+
+    def close(self, wait=False):
+        """关闭线程池；wait 为False时不等待正在进行的转换"""
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.cancel_all()
+        pending = [task._future for task in self.tasks if not task.done]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.close()
+
+    def _run(self, task, patch, slides):
+        """在工作线程中执行一次转换，发出并返回结束事件
+
+        无论如何结束（包括COM初始化失败或 BaseException），都会发出一个结束事件，
+        否则等待事件的协程会一直等下去。
+        """
+        start = time.perf_counter()
+        com_initialized = False
+        try:
+            try:
+                if self.renderer == 'powerpoint':
+                    import pythoncom
+                    pythoncom.CoInitialize()
+                    com_initialized = True
+                options = dict(self.converter_options)
+                if self.encoder_options is not None:
+                    options['encoder'] = create_encoder(**self.encoder_options)
+                converter = SlideConverter(
+                    renderer=self.renderer, cancel_event=task.cancel_event, events=task.emit,
+                    log=lambda message: task.emit(LogMessage(message)),
+                    status=lambda message: task.emit(StatusMessage(message)),
+                    progress=lambda completed, total: task.emit(Progress(completed, total)),
+                    **options)
+                converter.check_cancelled()
+                if patch:
+                    success = converter.patch(task.input_ppt, task.output_ppt, slides)
+                else:
+                    success = converter.convert(task.input_ppt, task.output_ppt)
+            except ConversionCancelled as e:
+                result = ConversionFailed(str(e), cancelled=True)
+            except Exception as e:
+                result = ConversionFailed(f"{type(e).__name__}: {e}")
+            else:
+                if success:
+                    result = ConversionDone(os.path.abspath(task.output_ppt), None)
+                else:
+                    result = ConversionFailed("转换失败，详见日志")
+        except BaseException as e:
+            result = ConversionFailed(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            if com_initialized:
+                try:
+                    pythoncom.CoUninitialize()
+                except Exception:
+                    pass
+            result.seconds = time.perf_counter() - start
+            task.result = result
+            task.emit(result)
+        return result
+
+
+async def convert_async(input_ppt, output_ppt, on_event=None, renderer=None, **converter_options):
+    """便捷函数：用一个临时引擎转换一份PPT，返回结束事件"""
+    engine = ConversionEngine(renderer, **converter_options)
+    try:
+        return await engine.convert(input_ppt, output_ppt, on_event)
+    finally:
+        engine.close()
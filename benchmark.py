@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换流程基准测试
+生成合成演示文稿（纯文字 / 图片为主 / 大量重复页），用假渲染器跑完整的转换流程，
+记录吞吐量（张/秒）、峰值内存、临时目录占用和输出大小，结果保存为JSON便于版本间对比。
+不需要PowerPoint或LibreOffice。
+
+示例：
+    python benchmark.py --slides 100 --output bench.json
+    python benchmark.py --slides 100 --adaptive-jpeg --compare bench.json
+    python benchmark.py --import-budget
+"""
+
+import argparse
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from tracing import pad_display
+
+DECK_KINDS = ('text', 'photo', 'duplicate')
+
+# 重复页场景中每组相同幻灯片的张数（模拟逐步展开的动画被拍平后的效果）
+DUPLICATE_RUN = 4
+
+# 命令行、服务和转换核心的导入耗时预算（毫秒）：批量转换的工作进程、服务进程
+# 每次启动都要付出这部分时间
+IMPORT_BUDGETS_MS = {'cli': 150, 'service': 250, 'converter': 150}
+# 导入上述模块时不应加载的模块：GUI、COM，以及只在渲染/编码时才用到的重型依赖
+LAZY_MODULES = ('tkinter', 'tkinterdnd2', 'win32com', 'pythoncom', 'numpy', 'PIL',
+                'turbojpeg', 'simplejpeg')
+
+
+def generate_deck(path, kind, slides, seed=0):
+    """生成合成演示文稿
+
+    text：标题加若干行要点；photo：每页一张不同的图片；
+    duplicate：每 DUPLICATE_RUN 张内容完全相同。
+    """
+    from pptx import Presentation
+    from pptx.util import Inches
+    from PIL import Image
+
+    rng = random.Random(seed)
+    deck = Presentation()
+    deck.slide_width, deck.slide_height = Inches(13.333), Inches(7.5)
+    for index in range(slides):
+        if kind == 'photo':
+            slide = deck.slides.add_slide(deck.slide_layouts[5])
+            slide.shapes.title.text = f"图片 {index + 1}"
+            noise = bytes(rng.getrandbits(8) for _ in range(32 * 18 * 3))
+            picture = Image.frombytes("RGB", (32, 18), noise).resize((640, 360), Image.BICUBIC)
+            buffer = io.BytesIO()
+            picture.save(buffer, "JPEG", quality=85)
+            buffer.seek(0)
+            slide.shapes.add_picture(buffer, Inches(1.5), Inches(1.5), width=Inches(10))
+        else:
+            group = index // DUPLICATE_RUN if kind == 'duplicate' else index
+            slide = deck.slides.add_slide(deck.slide_layouts[1])
+            slide.shapes.title.text = f"第 {group + 1} 节"
+            line_rng = random.Random(f"{seed}-{group}")
+            lines = [' '.join('要点' * line_rng.randint(1, 6) for _ in range(line_rng.randint(2, 5)))
+                     for _ in range(line_rng.randint(3, 7))]
+            slide.placeholders[1].text = '\n'.join(lines)
+    deck.save(path)
+    return path
+
+
+def _directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class DiskMonitor:
+    """后台线程定期统计目录大小，记录峰值"""
+
+    def __init__(self, path, interval=0.02):
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _directory_bytes(self.path))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _directory_bytes(self.path))
+
+
+def png_baseline_bytes(deck_path, options):
+    """同样的幻灯片以PNG保存的总大小（v2.2.0 之前的做法），用于验证JPEG带来的压缩比"""
+    from renderers import FakeRenderer
+
+    renderer = FakeRenderer()
+    renderer.set_resolution(options.get('dpi'), options.get('width'))
+    renderer.open(deck_path)
+    total = 0
+    try:
+        for index in range(1, renderer.slide_count + 1):
+            buffer = io.BytesIO()
+            renderer.render_image(index).save(buffer, "PNG")
+            total += buffer.tell()
+    finally:
+        renderer.close()
+    return total
+
+
+def run_case(case):
+    """在独立进程中转换一份合成演示文稿，返回测量结果（峰值内存只包含本场景）"""
+    from converter import SlideConverter
+    from encoders import create_encoder
+    from renderers import create_renderer
+    from sharded_renderer import ShardedRenderer
+    from tracing import Tracer, peak_rss_bytes
+
+    work_root = tempfile.mkdtemp(prefix='ppt_bench_')
+    scratch = os.path.join(work_root, 'tmp')
+    os.makedirs(scratch)
+    # 转换过程中的临时文件全部落在 scratch 下，便于统计磁盘占用
+    tempfile.tempdir = scratch
+    try:
+        deck_path = generate_deck(os.path.join(work_root, f"{case['kind']}.pptx"),
+                                  case['kind'], case['slides'])
+        output_path = os.path.join(work_root, 'out', f"{case['kind']}_image.pptx")
+        options = case['options']
+        # 与实际转换一样经过 create_renderer，默认带看门狗（见 render_supervisor）
+        renderer_kwargs = {'render_delay': options['render_delay'],
+                           'call_delay': options['call_delay'],
+                           'hang_slides': set(options.get('hang_slides') or ())}
+        if options.get('slide_timeout'):
+            renderer_kwargs['timeouts'] = {'slide': options['slide_timeout']}
+        else:
+            renderer_kwargs['supervise'] = False
+        if options.get('shards', 1) > 1:
+            renderer = ShardedRenderer(['fake'] * options['shards'],
+                                       renderer_kwargs=renderer_kwargs)
+        else:
+            renderer = create_renderer('fake', **renderer_kwargs)
+        tracer = Tracer()
+        converter = SlideConverter(
+            renderer=renderer, tracer=tracer, resume=options['resume'],
+            jobs_dir=os.path.join(scratch, 'jobs'), stream=options['stream'],
+            encoder=create_encoder(**options['encoder']),
+            dedup_tolerance=options['dedup_tolerance'],
+            dpi=options.get('dpi'), width=options.get('width'),
+            bulk_render=options['bulk_render'],
+        )
+        rss_before = peak_rss_bytes()
+        with DiskMonitor(scratch) as disk:
+            start = time.perf_counter()
+            success = converter.convert(deck_path, output_path)
+            seconds = time.perf_counter() - start
+        renderer.shutdown()
+
+        result = {
+            'kind': case['kind'],
+            'slides': case['slides'],
+            'success': success,
+            'seconds': round(seconds, 3),
+            'slides_per_second': round(case['slides'] / seconds, 2) if seconds else None,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'rss_before_bytes': rss_before,
+            'peak_temp_bytes': disk.peak,
+            'input_bytes': os.path.getsize(deck_path),
+            'output_bytes': os.path.getsize(output_path) if success else None,
+            'stages': {name: {'count': stage['count'], 'wall': round(stage['wall'], 4),
+                              'cpu': round(stage['cpu'], 4)}
+                       for name, stage in tracer.summary().items()},
+        }
+        if success and options['png_baseline']:
+            png_bytes = png_baseline_bytes(deck_path, options)
+            result['png_bytes'] = png_bytes
+            result['png_to_output_ratio'] = round(png_bytes / result['output_bytes'], 2)
+        return result
+    finally:
+        tempfile.tempdir = None
+        shutil.rmtree(work_root, ignore_errors=True)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmark(kinds, slides, options, repeat=1):
+    """依次运行各场景（每次一个新进程），返回可保存为JSON的结果"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for kind in kinds:
+        for _ in range(repeat):
+            # 不用 multiprocessing.Pool：其工作进程是守护进程，不能再启动渲染分片进程
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+                results.append(executor.submit(run_case, {'kind': kind, 'slides': slides,
+                                                          'options': options}).result())
+    return {
+        'revision': _git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': options,
+        'results': results,
+    }
+
+
+def measure_import(module, repeat=3):
+    """在新进程中用 python -X importtime 导入 module（取最快一次），
+    返回 (毫秒, 导入时加载了的 LAZY_MODULES 中的模块)"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    loaded = set()
+    for _ in range(repeat + 1):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                   capture_output=True, text=True, cwd=cwd, timeout=60)
+        if completed.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{completed.stderr[-2000:]}")
+        for line in completed.stderr.splitlines():
+            if not line.startswith('import time:') or line.count('|') != 2:
+                continue
+            _, cumulative, name = line.split('|')
+            name = name.strip()
+            if name.split('.')[0] in LAZY_MODULES:
+                loaded.add(name.split('.')[0])
+            if name == module and cumulative.strip().isdigit():
+                milliseconds = int(cumulative) / 1000
+                best = milliseconds if best is None else min(best, milliseconds)
+    return best, sorted(loaded)
+
+
+def check_import_budget(budgets=None, repeat=3):
+    """逐个测量 IMPORT_BUDGETS_MS 中的模块，打印结果，全部达标时返回True
+    （第一次导入会编译 .pyc，measure_import 多跑的一次用于预热）"""
+    budgets = budgets or IMPORT_BUDGETS_MS
+    passed = True
+    for module, budget in budgets.items():
+        milliseconds, loaded = measure_import(module, repeat)
+        ok = milliseconds is not None and milliseconds <= budget and not loaded
+        passed = passed and ok
+        detail = f"，提前加载了 {', '.join(loaded)}" if loaded else ''
+        print(f"{'通过' if ok else '超标'}  import {module}: {milliseconds or 0:.1f} ms"
+              f"（预算 {budget} ms{detail}）")
+    return passed
+
+
+def _mb(value):
+    return f"{value / 1024 / 1024:.1f}" if value else '-'
+
+
+def print_report(report, baseline=None):
+    """打印结果表；给出基准结果时附上与之相比的变化"""
+    previous = {}
+    if baseline:
+        for result in baseline['results']:
+            previous.setdefault(result['kind'], result)
+
+    widths = (12, 6, 9, 13, 13, 9, 10)
+
+    def row(*cells):
+        return ''.join(pad_display(cell, width, right=column > 0)
+                       for column, (cell, width) in enumerate(zip(cells, widths)))
+
+    print(row('场景', '张数', '张/秒', '峰值内存MB', '临时空间MB', '输出MB', 'PNG/输出'))
+    for result in report['results']:
+        ratio = result.get('png_to_output_ratio')
+        print(row(result['kind'], result['slides'], f"{result['slides_per_second'] or 0:.1f}",
+                  _mb(result['peak_rss_bytes']), _mb(result['peak_temp_bytes']),
+                  _mb(result['output_bytes']), f'{ratio:.1f}x' if ratio else '-'))
+        old = previous.get(result['kind'])
+        if old and old.get('slides_per_second') and old.get('output_bytes') \
+                and result.get('output_bytes'):
+            speed = result['slides_per_second'] / old['slides_per_second'] - 1
+            size = result['output_bytes'] / old['output_bytes'] - 1
+            memory = (result['peak_rss_bytes'] or 0) / (old['peak_rss_bytes'] or 1) - 1
+            print(f"{'':<12}对比 {baseline.get('revision') or '基准'}：吞吐 {speed:+.1%}，"
+                  f"输出 {size:+.1%}，峰值内存 {memory:+.1%}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="用合成演示文稿和假渲染器测量转换性能")
+    parser.add_argument('--slides', type=int, default=50, help="每份演示文稿的张数（默认: %(default)s）")
+    parser.add_argument('--kinds', nargs='+', choices=DECK_KINDS, default=list(DECK_KINDS),
+                        help="要运行的场景（默认全部）")
+    parser.add_argument('--repeat', type=int, default=1, help="每个场景重复次数")
+    parser.add_argument('--render-delay', type=float, default=0.0,
+                        help="每张幻灯片模拟的渲染耗时（秒），接近真实PowerPoint导出时可设为0.05-0.2")
+    parser.add_argument('--call-delay', type=float, default=0.0,
+                        help="每次调用渲染后端的固定开销（秒），模拟COM往返或启动pdftoppm")
+    parser.add_argument('--no-bulk-render', action='store_true', help="逐张调用渲染后端")
+    parser.add_argument('--hang-slides', type=int, nargs='+', metavar='N',
+                        help="这些幻灯片第一次渲染时卡住，模拟PowerPoint导出卡死")
+    parser.add_argument('--slide-timeout', type=float, default=10.0,
+                        help="看门狗的单张渲染期限（秒，默认: %(default)s，0 表示不加看门狗）")
+    parser.add_argument('--adaptive-jpeg', action='store_true', help="使用自适应JPEG编码")
+    parser.add_argument('--jpeg-codec', default='pillow',
+                        help="JPEG编码后端：auto、pillow、turbojpeg 或 simplejpeg（默认: %(default)s）")
+    parser.add_argument('--lossless-text', action='store_true', help="文字/线条页改用无损PNG")
+    parser.add_argument('--stream', action='store_true', help="使用流式输出")
+    parser.add_argument('--resume', action='store_true', help="使用可续传的工作目录")
+    parser.add_argument('--dedup-tolerance', type=int, metavar='CELLS',
+                        help="近似重复页的容差：32×32缩略图中允许不同的格子数（共1024个）")
+    parser.add_argument('--shards', type=int, default=1, help="每份演示文稿的渲染进程数")
+    parser.add_argument('--dpi', type=int, help="输出dpi")
+    parser.add_argument('--width', type=int, help="输出像素宽度")
+    parser.add_argument('--no-png-baseline', action='store_true',
+                        help="不统计PNG格式的大小（省去一次额外渲染）")
+    parser.add_argument('-o', '--output', help="把结果保存为JSON文件")
+    parser.add_argument('--compare', help="与之前保存的JSON结果对比")
+    parser.add_argument('--import-budget', action='store_true',
+                        help="只检查命令行、服务和转换核心的导入耗时是否在预算内（python -X importtime）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.import_budget:
+        return 0 if check_import_budget() else 1
+    options = {
+        'render_delay': args.render_delay,
+        'call_delay': args.call_delay,
+        'bulk_render': not args.no_bulk_render,
+        'hang_slides': args.hang_slides or [],
+        'slide_timeout': args.slide_timeout,
+        'encoder': {'adaptive': args.adaptive_jpeg, 'codec': args.jpeg_codec,
+                    'lossless_text': args.lossless_text},
+        'stream': args.stream,
+        'resume': args.resume,
+        'dedup_tolerance': args.dedup_tolerance,
+        'dpi': args.dpi,
+        'width': args.width,
+        'shards': args.shards,
+        'png_baseline': not args.no_png_baseline,
+    }
+    report = run_benchmark(args.kinds, args.slides, options, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+    return 0 if all(result['success'] for result in report['results']) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
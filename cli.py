@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PPT转图片幻灯片工具 - 命令行/批量版本
+支持文件、通配符和目录，多个进程并行转换，结束时输出JSON汇总
+
+示例：
+    python cli.py 讲义/ -j 4
+    python cli.py "2024秋/**/*.pptx" --renderer libreoffice --output-dir out/
+    python cli.py 讲义.pptx --update               # 只重新转换有变化的幻灯片
+    python cli.py 讲义.pptx --slides 42,50-52      # 只重新转换指定的幻灯片
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from converter import SlideConverter, make_output_path
+from deck_patch import parse_slide_ranges
+from encoders import JPEG_CODECS, METRICS, create_encoder
+from render_cache import DEFAULT_CACHE_SIZE, RenderCache, default_cache_dir
+from render_supervisor import DEFAULT_TIMEOUTS
+from renderer_pool import DEFAULT_MAX_JOBS, RendererPool
+from renderers import RENDERERS, RESOLUTION_PRESETS, default_renderer_name, parallel_limit
+from tracing import Tracer
+
+PPT_EXTENSIONS = ('.ppt', '.pptx')
+
+# 本工具生成的输出文件（xxx_image.pptx / xxx_image(n).pptx），扫描目录时跳过
+_OUTPUT_NAME_RE = re.compile(r'_image(\(\d+\))?\.pptx$', re.IGNORECASE)
+
+# 每个工作进程各自持有一个渲染后端实例池（大小为1），在多个任务间复用
+_worker_pool = None
+# 渲染缓存（各工作进程共享同一缓存目录）
+_worker_cache = None
+# 本批次的转换选项，见 default_options()
+_worker_options = None
+
+
+def is_output_name(path):
+    """文件名是否为本工具的输出（xxx_image.pptx / xxx_image(n).pptx）"""
+    return bool(_OUTPUT_NAME_RE.search(os.path.basename(path)))
+
+
+def is_convertible(path):
+    """是否为需要转换的PPT文件（排除Office锁文件和本工具的输出）"""
+    name = os.path.basename(path)
+    return (name.lower().endswith(PPT_EXTENSIONS)
+            and not name.startswith('~$')
+            and not is_output_name(name))
+
+
+def collect_inputs(patterns, recursive=False):
+    """把文件、通配符和目录展开为去重后的PPT文件列表（保持输入顺序）"""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for root, _, files in os.walk(pattern):
+                    found.extend(os.path.join(root, name) for name in sorted(files))
+            else:
+                found.extend(os.path.join(pattern, name) for name in sorted(os.listdir(pattern)))
+        elif glob.has_magic(pattern):
+            found.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            found.append(pattern)
+
+    inputs = []
+    seen = set()
+    for path in found:
+        path = os.path.abspath(path)
+        if path in seen or not os.path.isfile(path) or not is_convertible(path):
+            continue
+        seen.add(path)
+        inputs.append(path)
+    return inputs
+
+
+def plan_jobs(inputs, output_dir=None, update=False):
+    """预先分配输出路径，避免并行任务抢到同一个文件名；update 时使用已有的输出文件"""
+    reserved = set()
+    jobs = []
+    for input_path in inputs:
+        output_path = make_output_path(input_path, output_dir, reserved, existing=update)
+        reserved.add(output_path)
+        jobs.append((input_path, output_path))
+    return jobs
+
+
+def default_options():
+    """批量转换选项
+
+    max_jobs: 每个渲染后端实例处理多少份PPT后重建
+    cache: (缓存目录, 容量字节数)，None 表示不使用渲染缓存
+    resume: 中断的转换是否保留进度，下次从断点继续
+    encoder: 传给 encoders.create_encoder 的参数
+    dedup_tolerance: 近似去重允许缩略图中不同的格子数（共1024个，见 image_dedup），
+        None 表示只合并完全相同的幻灯片图片
+    resolution: 输出分辨率（resolution 预设名 / dpi / width），传给 SlideConverter
+    stream: 编码结果直接写入输出文件，不在临时目录保留图片
+    trace_dir: 每个任务的分阶段计时写到这个目录（None 表示不记录）
+    shards: 每份PPT分给多个渲染进程时各进程的后端名称列表（见 sharded_renderer），
+        None 表示由一个渲染后端逐张渲染
+    bulk_render: 支持的渲染后端一次渲染一批幻灯片，而不是逐张调用
+    max_slides: 页数超过该值的演示文稿不转换（预检时拒绝），None 表示不限制
+    patch: 就地更新已有的输出文件（见 SlideConverter.patch），{'slides': 幻灯片序号列表，
+        None 表示内容有变化的幻灯片}；None 表示生成新的输出文件
+    slide_timeout: 渲染一张幻灯片的期限（秒），超时时看门狗结束并重建渲染后端
+        （见 render_supervisor）；0 表示不加看门狗
+    """
+    return {
+        'max_jobs': DEFAULT_MAX_JOBS,
+        'cache': None,
+        'resume': True,
+        'encoder': {},
+        'dedup_tolerance': None,
+        'resolution': {},
+        'stream': False,
+        'trace_dir': None,
+        'shards': None,
+        'bulk_render': True,
+        'max_slides': None,
+        'patch': None,
+        'slide_timeout': DEFAULT_TIMEOUTS['slide'],
+    }
+
+
+def watchdog_kwargs(options):
+    """按 slide_timeout 得到传给 create_renderer 的看门狗参数"""
+    if not options['slide_timeout']:
+        return {'supervise': False}
+    return {'timeouts': {'slide': options['slide_timeout']}}
+
+
+def create_renderer_pool(renderer_name, options, log=None):
+    """按转换选项创建大小为1的渲染后端实例池"""
+    if options['shards']:
+        # 分片渲染器本身就是一组渲染进程，作为一个实例放进池中复用
+        return RendererPool('sharded', size=1, max_jobs=options['max_jobs'], log=log,
+                            backends=options['shards'], renderer_kwargs=watchdog_kwargs(options))
+    return RendererPool(renderer_name, size=1, max_jobs=options['max_jobs'], log=log,
+                        **watchdog_kwargs(options))
+
+
+def create_converter(renderer, options, log=None, cache=None, tracer=None, progress=None,
+                     cancel_event=None):
+    """按转换选项创建 SlideConverter"""
+    return SlideConverter(renderer=renderer, log=log, cache=cache, tracer=tracer,
+                          progress=progress, cancel_event=cancel_event, resume=options['resume'],
+                          encoder=create_encoder(**options['encoder']),
+                          dedup_tolerance=options['dedup_tolerance'],
+                          stream=options['stream'], bulk_render=options['bulk_render'],
+                          max_slides=options['max_slides'], **options['resolution'])
+
+
+def _init_worker(renderer_name, verbose, options):
+    """工作进程初始化：准备COM环境并创建本进程专用的渲染后端实例池"""
+    global _worker_pool, _worker_cache, _worker_options
+    if renderer_name == 'powerpoint':
+        import pythoncom
+        pythoncom.CoInitialize()
+    _worker_options = options
+    _worker_pool = create_renderer_pool(renderer_name, options, _make_logger('worker', verbose))
+    _worker_cache = RenderCache(*options['cache']) if options['cache'] else None
+
+    # 进程正常退出时关闭渲染后端（atexit在multiprocessing子进程中不会执行）
+    from multiprocessing import util
+    util.Finalize(None, _worker_pool.close, exitpriority=10)
+
+
+def _make_logger(tag, verbose):
+    if not verbose:
+        return lambda message: None
+
+    def log(message):
+        print(f"[{tag}] {message}", file=sys.stderr, flush=True)
+    return log
+
+
+def convert_one(input_path, output_path, verbose=False):
+    """转换单个文件，返回可序列化的结果字典"""
+    tag = os.path.basename(input_path)
+    messages = []
+    verbose_log = _make_logger(tag, verbose)
+
+    def log(message):
+        messages.append(message)
+        verbose_log(message)
+
+    trace_dir = _worker_options['trace_dir']
+    tracer = Tracer() if trace_dir else None
+    start = time.perf_counter()
+    try:
+        with _worker_pool.lease() as renderer:
+            converter = create_converter(renderer, _worker_options, log, _worker_cache, tracer)
+            if _worker_options['patch'] is not None:
+                success = converter.patch(input_path, output_path,
+                                          _worker_options['patch']['slides'])
+            else:
+                success = converter.convert(input_path, output_path)
+            if not success:
+                _worker_pool.mark_failed(renderer)
+    except Exception as e:
+        log(f"转换过程发生异常: {e}")
+        success = False
+
+    result = {
+        'input': input_path,
+        'output': output_path if success else None,
+        'success': success,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    if success and os.path.exists(output_path):
+        result['output_bytes'] = os.path.getsize(output_path)
+    if not success:
+        # 失败时附带最后几条日志便于排查
+        result['log_tail'] = messages[-5:]
+    if tracer is not None:
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+        trace_path = os.path.join(trace_dir, stem + '.trace.json')
+        tracer.write_chrome_trace(trace_path)
+        tracer.write_jsonl(os.path.join(trace_dir, stem + '.spans.jsonl'))
+        result['trace'] = trace_path
+    return result
+
+
+def run_batch(jobs, renderer_name, workers, verbose=False, on_result=None, options=None):
+    """并行执行转换任务，按输入顺序返回结果列表；options 见 default_options()"""
+    options = options or default_options()
+    results = [None] * len(jobs)
+    workers = max(1, min(workers, len(jobs) or 1))
+    if workers > 1 and not options['shards'] and parallel_limit(renderer_name, workers) < workers:
+        # 多个进程驱动同一个PowerPoint，一个进程退出或被看门狗结束会连累其他进程的演示文稿
+        print(f"警告: 渲染后端 {renderer_name} 只能单实例运行，忽略 -j {workers}，改为逐个转换",
+              file=sys.stderr, flush=True)
+        workers = 1
+
+    if workers == 1:
+        # 单进程时直接在当前进程转换，省去进程启动开销
+        _init_worker(renderer_name, verbose, options)
+        try:
+            for index, (input_path, output_path) in enumerate(jobs):
+                results[index] = convert_one(input_path, output_path, verbose)
+                if on_result:
+                    on_result(results[index])
+        finally:
+            _worker_pool.close()
+        return results
+
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_init_worker, initargs=(renderer_name, verbose, options)) as executor:
+        futures = {
+            executor.submit(convert_one, input_path, output_path, verbose): index
+            for index, (input_path, output_path) in enumerate(jobs)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                # 工作进程崩溃等情况
+                results[index] = {
+                    'input': jobs[index][0], 'output': None,
+                    'success': False, 'error': str(e),
+                }
+            if on_result:
+                on_result(results[index])
+    return results
+
+
+def add_conversion_arguments(parser):
+    """添加与转换设置相关的参数（命令行和转换服务共用），由 options_from_args 解析"""
+    parser.add_argument('-r', '--renderer', choices=sorted(RENDERERS), default=default_renderer_name(),
+                        help="渲染后端（默认: %(default)s）")
+    parser.add_argument('--shards', type=int, metavar='K',
+                        help="每份PPT分给K个渲染进程同时渲染（各自打开一个渲染后端实例），适合页数很多的文件")
+    parser.add_argument('--shard-renderers', metavar='NAMES',
+                        help="分片使用的后端，逗号分隔（如 libreoffice,libreoffice,fake），"
+                             "个数即分片数；默认K个 --renderer（PowerPoint只能单实例运行，不能分片）")
+    resolution = parser.add_mutually_exclusive_group()
+    resolution.add_argument('--resolution', choices=list(RESOLUTION_PRESETS), default='standard',
+                            help="输出分辨率预设：standard≈1280像素宽，projector 1920，"
+                                 "4k 3840，print 300dpi（默认: %(default)s）")
+    resolution.add_argument('--dpi', type=int, help="按dpi指定输出分辨率")
+    resolution.add_argument('--width', type=int, metavar='PX', help="固定输出图片的像素宽度")
+    parser.add_argument('--no-bulk-render', action='store_true',
+                        help="逐张调用渲染后端导出幻灯片（默认PowerPoint整份导出、pdftoppm按段栅格化）")
+    parser.add_argument('--max-slides', type=int, metavar='N',
+                        help="拒绝超过N张幻灯片的演示文稿（启动渲染后端之前，直接读取PPTX判断）")
+    parser.add_argument('--slide-timeout', type=float, default=DEFAULT_TIMEOUTS['slide'],
+                        metavar='SECONDS',
+                        help="渲染一张幻灯片超过这么多秒时结束并重启渲染后端，再重试"
+                             "（默认: %(default)s，0 表示不限制）")
+    parser.add_argument('--max-jobs-per-renderer', type=int, default=DEFAULT_MAX_JOBS,
+                        help="每个渲染后端实例处理多少份PPT后重启（默认: %(default)s）")
+    parser.add_argument('--cache-dir', default=default_cache_dir(),
+                        help="渲染缓存目录（默认: %(default)s）")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help="渲染缓存容量上限，单位MB（默认: %(default)s）")
+    parser.add_argument('--no-cache', action='store_true', help="不使用渲染缓存")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="不保留中断任务的进度（默认中断后再次转换会从断点继续）")
+    parser.add_argument('--stream', action='store_true',
+                        help="流式输出：图片编码后直接写入输出文件，临时空间不随页数增长（不支持断点续传）")
+    parser.add_argument('--adaptive-jpeg', action='store_true',
+                        help="逐张搜索满足质量阈值的最低JPEG质量（需要numpy）")
+    parser.add_argument('--quality-metric', choices=sorted(METRICS), default='ssim',
+                        help="自适应编码的质量指标（默认: %(default)s）")
+    parser.add_argument('--quality-threshold', type=float,
+                        help="自适应编码的质量阈值（默认 SSIM 0.98 / PSNR 40dB）")
+    parser.add_argument('--jpeg-codec', choices=['auto'] + list(JPEG_CODECS), default='auto',
+                        help="JPEG编码后端；auto 在已安装的后端（turbojpeg、simplejpeg、pillow）中"
+                             "测速选出最快的一个（默认: %(default)s）")
+    parser.add_argument('--lossless-text', action='store_true',
+                        help="颜色很少的文字/线条页改用无损PNG（仅在不比JPG大时）")
+    parser.add_argument('--dedup-tolerance', type=int, metavar='CELLS',
+                        help="把32×32灰度缩略图中不同的格子不超过CELLS个（共1024个）的相近幻灯片"
+                             "也合并为同一张图片（有损；默认只合并完全相同的图片）")
+    parser.add_argument('--trace', metavar='DIR',
+                        help="记录各阶段耗时，每个文件输出Chrome trace（.trace.json）和JSON行（.spans.jsonl），"
+                             "汇总表写入日志")
+    parser.add_argument('-v', '--verbose', action='store_true', help="把转换日志输出到stderr")
+
+
+def options_from_args(args):
+    """把 add_conversion_arguments 的参数转换为 default_options() 格式；参数有误时抛出 ValueError"""
+    options = default_options()
+    options['max_jobs'] = args.max_jobs_per_renderer
+    options['resume'] = not (args.no_resume or args.stream)
+    options['stream'] = args.stream
+    options['bulk_render'] = not args.no_bulk_render
+    options['max_slides'] = args.max_slides
+    options['slide_timeout'] = args.slide_timeout
+    if args.trace:
+        os.makedirs(args.trace, exist_ok=True)
+        options['trace_dir'] = os.path.abspath(args.trace)
+    if args.shard_renderers:
+        options['shards'] = [name.strip() for name in args.shard_renderers.split(',') if name.strip()]
+        unknown = sorted(set(options['shards']) - set(RENDERERS))
+        if unknown:
+            raise ValueError(f"未知的渲染后端: {', '.join(unknown)}"
+                             f"（可选: {', '.join(sorted(RENDERERS))}）")
+    elif args.shards and args.shards > 1:
+        options['shards'] = [args.renderer] * args.shards
+    if options['shards'] and len(options['shards']) > 1:
+        single = sorted({name for name in options['shards'] if parallel_limit(name, 2) == 1})
+        if single:
+            raise ValueError(f"渲染后端 {', '.join(single)} 只能单实例运行，不能用于分片渲染")
+    options['dedup_tolerance'] = args.dedup_tolerance
+    options['resolution'] = {'resolution': args.resolution, 'dpi': args.dpi, 'width': args.width}
+    if not args.no_cache:
+        options['cache'] = (args.cache_dir, args.cache_size * 1024 * 1024)
+    options['encoder'] = {'codec': args.jpeg_codec, 'lossless_text': args.lossless_text}
+    if args.adaptive_jpeg:
+        threshold = args.quality_threshold
+        if threshold is None:
+            threshold = 0.98 if args.quality_metric == 'ssim' else 40.0
+        options['encoder'].update({'adaptive': True, 'metric': args.quality_metric,
+                                   'threshold': threshold})
+    # 提前检查依赖，避免每个任务都失败；auto 在这里完成测速，各任务直接复用结果
+    try:
+        encoder = create_encoder(**options['encoder'])
+    except ImportError as e:
+        raise ValueError(str(e))
+    options['encoder']['codec'] = encoder.codec.name
+    return options
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="把PPT的每一页转换为图片，并生成以图片为背景的新PPT（批量/无界面）")
+    parser.add_argument('inputs', nargs='+', help="PPT文件、通配符（如 \"*.pptx\"）或目录")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="并行转换的进程数（每个进程一个渲染后端实例，默认1；"
+                             "PowerPoint只能单实例运行，总是逐个转换）")
+    parser.add_argument('-o', '--output-dir', help="输出目录（默认与原PPT同目录）")
+    parser.add_argument('--recursive', action='store_true', help="递归扫描目录")
+    parser.add_argument('--update', action='store_true',
+                        help="就地更新已有的 xxx_image.pptx，只重新转换内容有变化的幻灯片"
+                             "（输出文件不存在时完整转换）")
+    parser.add_argument('--slides', metavar='RANGE',
+                        help="与 --update 相同，但只重新转换指定的幻灯片，如 42 或 3,5-7")
+    add_conversion_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    inputs = collect_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("未找到可转换的PPT文件", file=sys.stderr)
+        return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        args.output_dir = os.path.abspath(args.output_dir)
+
+    def report(result):
+        mark = '✓' if result['success'] else '✗'
+        print(f"{mark} {result['input']}", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    update = args.update or bool(args.slides)
+    jobs = plan_jobs(inputs, args.output_dir, update)
+    try:
+        options = options_from_args(args)
+        if update:
+            options['patch'] = {'slides': parse_slide_ranges(args.slides) if args.slides else None}
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    results = run_batch(jobs, args.renderer, args.workers, args.verbose, on_result=report,
+                        options=options)
+
+    succeeded = sum(1 for result in results if result['success'])
+    summary = {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'renderer': args.renderer,
+        'workers': args.workers,
+        'seconds': round(time.perf_counter() - start, 3),
+        'results': results,
+    }
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return 0 if succeeded == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,920 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PPT转图片幻灯片的转换核心（不依赖GUI）
+渲染后端逐页导出位图，线程池并行编码JPG，最后写出图片背景PPTX
+"""
+
+import concurrent.futures
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import zipfile
+
+from encoders import AdaptiveJpegEncoder, FixedJpegEncoder
+from deck_patch import DeckPatcher, changed_slides
+from events import EventTracer, SlideEncoded, SlideRendered
+from image_dedup import DuplicateDetector
+from job_manifest import JobManifest
+from preflight import try_preflight
+from render_check import check_render
+from pptx_writer import (DEFAULT_SLIDE_HEIGHT, DEFAULT_SLIDE_WIDTH, EMU_PER_POINT,
+                         ImageSlideDeckWriter, StreamingDeckWriter, points_to_emu)
+from render_supervisor import Backoff, remove_tree
+from renderers import create_renderer, default_renderer_name, resolve_resolution
+from tracing import NULL_TRACER
+
+# JPG编码线程数（Pillow编码时会释放GIL）
+ENCODE_WORKERS = max(2, min(8, (os.cpu_count() or 2)))
+
+# 需要回到渲染线程重新导出的状态：PNG无效，或渲染结果空白而原幻灯片有内容
+RETRY_STATUSES = ('png_invalid', 'png_blank')
+# 每张需要重新导出的幻灯片最多重试的次数，以及每次之前的退避等待
+RENDER_RETRIES = 2
+RETRY_BACKOFF = Backoff(base=0.1, max_delay=2.0)
+
+# 同时在途（已渲染、未编码完）的幻灯片像素总数上限。每个像素在编码时约占用
+# 十几个字节（解码的位图、RGB副本、质量评估用的解码结果），4K输出时据此减少
+# 并行编码的张数，长演示文稿也不会占用数GB内存
+MAX_IN_FLIGHT_PIXELS = 48 * 1000 * 1000
+
+
+class ConversionCancelled(Exception):
+    """转换在幻灯片之间被取消（见 SlideConverter 的 cancel_event）"""
+
+
+def make_output_path(input_ppt, output_dir=None, reserved=(), existing=False):
+    """生成输出文件路径：默认与原PPT同目录，命名为 xxx_image.pptx，
+    已存在（或已被 reserved 占用）时依次尝试 xxx_image(1).pptx、xxx_image(2).pptx ...
+    existing 为True时总是返回 xxx_image.pptx（就地更新已有的输出文件）
+    """
+    input_dir = output_dir or os.path.dirname(os.path.abspath(input_ppt))
+    input_basename = os.path.splitext(os.path.basename(input_ppt))[0]
+    output_file = os.path.join(input_dir, f"{input_basename}_image.pptx")
+    if existing:
+        return output_file
+
+    # 如果文件已存在，生成不重复的文件名
+    counter = 1
+    while os.path.exists(output_file) or output_file in reserved:
+        output_file = os.path.join(input_dir, f"{input_basename}_image({counter}).pptx")
+        counter += 1
+    return output_file
+
+
+def validate_image_file(image_path):
+    """验证图片文件的有效性"""
+    try:
+        # 检查文件是否存在
+        if not os.path.exists(image_path):
+            return False
+
+        # 检查文件大小（空文件或太小的文件可能有问题）
+        file_size = os.path.getsize(image_path)
+        if file_size < 1000:  # 小于1KB的图片文件可能有问题
+            return False
+
+        # 尝试用PIL打开图片验证其有效性
+        from PIL import Image
+
+        with Image.open(image_path) as img:
+            return _check_image(img)
+
+    except Exception:
+        return False
+
+
+def validate_image_data(data):
+    """验证内存中的图片数据（与 validate_image_file 的标准相同）"""
+    try:
+        if len(data) < 1000:
+            return False
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as img:
+            return _check_image(img)
+    except Exception:
+        return False
+
+
+def _check_image(img):
+    # 验证图片尺寸
+    width, height = img.size
+    if width < 10 or height < 10:  # 尺寸太小的图片可能有问题
+        return False
+
+    # 验证图片模式
+    if img.mode not in ['RGB', 'RGBA', 'L', 'P']:
+        return False
+    return True
+
+
+def _checked_rgb(img, tracer, slide, expect_content):
+    """校验已解码的幻灯片位图，返回 (状态, RGB图片)"""
+    if not _check_image(img):
+        return 'png_invalid', None
+    with tracer.span('check_render', slide=slide):
+        blank_reason = check_render(img, expect_content)
+    if blank_reason:
+        return 'png_blank', None
+    return 'ok', img if img.mode == 'RGB' else img.convert("RGB")
+
+
+def encode_slide_data(source, encoder=None, tracer=NULL_TRACER, slide=None,
+                      expect_content=True):
+    """验证渲染结果并编码，返回 (状态, JPG数据)
+
+    source 为导出的PNG文件路径，或渲染后端直接给出的图片（见 BaseRenderer.render_frame）。
+    PNG只打开、解码一次，在解码后的位图上做尺寸/模式校验和空白检测
+    （见 render_check.check_render）。状态为 'ok'、'png_invalid'（文件缺失、过小、
+    损坏或截断）、'png_blank'（原幻灯片有内容但渲染结果是空白）或 'jpg_invalid'。
+    """
+    from PIL import Image
+
+    if isinstance(source, Image.Image):
+        status, rgb_img = _checked_rgb(source, tracer, slide, expect_content)
+        if status != 'ok':
+            return status, None
+    else:
+        with tracer.span('decode_png', slide=slide):
+            try:
+                if os.path.getsize(source) < 1000:  # 小于1KB的图片文件可能有问题
+                    return 'png_invalid', None
+                with Image.open(source) as img:
+                    img.load()  # 截断的文件在这里报错
+                    status, rgb_img = _checked_rgb(img, tracer, slide, expect_content)
+                if status != 'ok':
+                    return status, None
+            except Exception:
+                return 'png_invalid', None
+    encoder = encoder or FixedJpegEncoder()
+    with tracer.span('encode_jpeg', slide=slide):
+        result = encoder.encode(rgb_img)
+    with tracer.span('validate_jpeg', slide=slide):
+        valid = validate_image_data(result.data)
+    if not valid:
+        return 'jpg_invalid', None
+    return 'ok', result.data
+
+
+def encode_slide_image(png_path, jpg_path, encoder=None):
+    """验证导出的PNG并编码为JPG文件，返回 'ok' / 'png_invalid' / 'jpg_invalid'"""
+    status, data = encode_slide_data(png_path, encoder)
+    if data is not None:
+        with open(jpg_path, 'wb') as f:
+            f.write(data)
+    return status
+
+
+def _link_or_copy(source, dest):
+    """同一目录内优先建硬链接，不支持时复制"""
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+class DirectorySlideStore:
+    """把每张幻灯片的JPG保存在工作目录中，最后一次性写出PPTX（可续传）
+
+    与 pptx_writer.StreamingDeckWriter 提供相同的 add_image / share_image 接口。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, index):
+        return os.path.join(self.directory, f"slide_{index:03d}.jpg")
+
+    def add_image(self, index, data, ext=None):
+        # 文件名固定为 .jpg，实际格式（JPG或PNG）由写包时读文件头判断
+        with open(self.path(index), 'wb') as f:
+            f.write(data)
+
+    def share_image(self, index, original):
+        _link_or_copy(self.path(original), self.path(index))
+
+    def has_image(self, index):
+        return os.path.exists(self.path(index))
+
+
+class SlideConverter:
+    """把一份PPT转换为图片背景PPT
+
+    log / status 为回调函数，分别接收日志文本和状态文本；progress(已完成张数, 总张数)
+    在每张幻灯片处理完（成功或失败）时调用，可能来自编码线程；
+    renderer 可以是后端名称，也可以是已创建的渲染器实例。
+    渲染出相同图片的幻灯片只编码一次；dedup_tolerance 不为None时
+    还按缩略图比较合并相近的幻灯片（见 image_dedup.DuplicateDetector）。
+    输出分辨率由 resolution（预设名，见 renderers.RESOLUTION_PRESETS）、
+    dpi 或 width（固定像素宽度）指定，默认与PowerPoint默认导出一致。
+    stream 为True时编码好的图片直接写入输出文件，不在临时目录保留JPG，
+    磁盘占用与幻灯片数量无关（不支持断点续传）。
+    tracer 为 tracing.Tracer 时记录各阶段耗时，并在转换结束时把汇总表写入日志。
+    bulk_render 为True时支持批量渲染的后端一次渲染一批幻灯片（见 renderers.BaseRenderer.prefetch）。
+    max_slides 不为None时，预检发现页数超过该值的演示文稿直接拒绝，不启动渲染后端。
+    events 为回调函数，接收 events 模块中的类型化事件（每张幻灯片渲染、编码完成和各阶段耗时），
+    可能来自编码线程。cancel_event（threading.Event）被设置后，转换在下一张幻灯片之前停止，
+    convert / patch 抛出 ConversionCancelled；可续传任务保留已完成的进度。
+    """
+
+    def __init__(self, renderer=None, log=None, status=None, encode_workers=ENCODE_WORKERS,
+                 cache=None, resume=False, jobs_dir=None, encoder=None, dedup_tolerance=None,
+                 resolution=None, dpi=None, width=None, stream=False, tracer=None,
+                 progress=None, bulk_render=True, max_slides=None, events=None,
+                 cancel_event=None):
+        self.renderer = renderer
+        self.log = log or (lambda message: None)
+        self.update_status = status or (lambda message: None)
+        self.report_progress = progress or (lambda completed, total: None)
+        self.encode_workers = encode_workers
+        self.cache = cache
+        self.resume = resume
+        self.jobs_dir = jobs_dir
+        self.encoder = encoder or FixedJpegEncoder()
+        self.dedup_tolerance = dedup_tolerance
+        self.dpi, self.width = resolve_resolution(resolution, dpi, width)
+        self.stream = stream
+        self.tracer = tracer or NULL_TRACER
+        self.bulk_render = bulk_render
+        self.max_slides = max_slides
+        self.emit = events or (lambda event: None)
+        self.cancel_event = cancel_event
+        if events is not None:
+            self.tracer = EventTracer(self.tracer, events)
+
+    def check_cancelled(self):
+        """已请求取消时抛出 ConversionCancelled；在幻灯片之间调用"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ConversionCancelled("转换已取消")
+
+    def render_settings(self):
+        """影响输出图片的设置，参与渲染缓存键的计算"""
+        if self.renderer is None or isinstance(self.renderer, str):
+            renderer_name = self.renderer or default_renderer_name()
+        else:
+            renderer_name = self.renderer.name
+        settings = {'renderer': renderer_name, 'dpi': self.dpi, 'width': self.width}
+        settings.update(self.encoder.settings())
+        if self.dedup_tolerance is not None:
+            # 有损去重会让相近的幻灯片共用图片，结果与不去重时不同
+            settings['dedup_tolerance'] = self.dedup_tolerance
+        return settings
+
+    def _preflight(self, input_ppt):
+        """读取PPTX元数据（见 preflight），无法读取时返回None"""
+        with self.tracer.span('preflight'):
+            info = try_preflight(input_ppt, self.render_settings())
+        if info is not None:
+            width, height = info.slide_size_points
+            hidden = f"，其中 {info.hidden_count} 张隐藏" if info.hidden_count else ''
+            self.log(f"预检: {info.slide_count} 张幻灯片{hidden}，{width:.0f} x {height:.0f} 点，"
+                     f"媒体 {info.media_bytes / 1024 / 1024:.1f} MB")
+        return info
+
+    def _check_limits(self, info):
+        if self.max_slides is not None and info.slide_count > self.max_slides:
+            self.log(f"错误：演示文稿有 {info.slide_count} 张幻灯片，超过上限 {self.max_slides} 张")
+            return False
+        return True
+
+    def _create_renderer(self):
+        if self.renderer is None or isinstance(self.renderer, str):
+            with self.tracer.span('renderer_create'):
+                renderer, owns = create_renderer(self.renderer, log=self.log), True
+        else:
+            renderer, owns = self.renderer, False
+        # 实例池中的渲染器会被不同任务复用，每次都按本次转换的设置重新指定分辨率
+        renderer.set_resolution(self.dpi, self.width)
+        renderer.bulk_enabled = self.bulk_render
+        return renderer, owns
+
+    def render_and_encode_slides(self, renderer, slide_count, temp_dir, png_paths, skip=(),
+                                 on_encoded=None, duplicates=None, store=None,
+                                 content_flags=None):
+        """渲染与编码流水线：当前线程逐张渲染，线程池并行验证并编码JPG
+
+        COM对象只能在创建它的线程中使用，所以渲染留在当前线程；
+        编码线程数量有限，同时在途的幻灯片数量也有上限，避免临时PNG堆积。
+        渲染后端支持时（supports_frames）直接在内存中传递位图，否则经由
+        temp_dir 中的临时PNG；编码结果交给 store（默认保存为 temp_dir 下的JPG）。
+        skip 中的幻灯片（例如缓存命中）不再渲染；每张JPG编码成功后
+        在编码线程中调用 on_encoded(序号, JPG数据)，用于记录检查点和写入缓存。
+        与前面某张重复的幻灯片不再编码，记入 duplicates {序号: 原幻灯片序号}，
+        由 resolve_duplicates 补齐。content_flags 为每张原幻灯片是否有可见内容，
+        用于判断空白的渲染结果是否异常（None 表示未知，按有内容处理）。
+        返回 {幻灯片序号: 状态}，由调用方按序号重新组装。
+        """
+        results = {}
+        store = store or DirectorySlideStore(temp_dir)
+        detector = DuplicateDetector(self.dedup_tolerance) if duplicates is not None else None
+        # 高分辨率时按像素预算减少在途张数，编码线程数也随之减少
+        width, height = renderer.pixel_size()
+        budget = max(1, MAX_IN_FLIGHT_PIXELS // max(1, width * height))
+        workers = max(1, min(self.encode_workers, slide_count, budget))
+        in_flight = threading.BoundedSemaphore(max(workers, min(workers * 2, budget)))
+
+        tracer = self.tracer
+        progress_lock = threading.Lock()
+        completed = [len(skip)]
+
+        def slide_finished():
+            with progress_lock:
+                completed[0] += 1
+                self.report_progress(completed[0], slide_count)
+
+        self.report_progress(completed[0], slide_count)
+        renderer.prefetch([i for i in range(1, slide_count + 1) if i not in skip])
+        use_frames = renderer.supports_frames
+
+        def encode_job(i, source):
+            try:
+                expect_content = content_flags[i - 1] if content_flags else True
+                status, data = encode_slide_data(source, self.encoder, tracer, i, expect_content)
+                if status == 'ok':
+                    with tracer.span('store', slide=i):
+                        store.add_image(i, data)
+                        if not use_frames:
+                            os.remove(source)
+                        if on_encoded:
+                            on_encoded(i, data)
+                self.emit(SlideEncoded(i, status, len(data) if data else 0))
+                return status
+            finally:
+                in_flight.release()
+                slide_finished()
+
+        futures = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for i in range(1, slide_count + 1):
+                if i in skip:
+                    continue
+                self.check_cancelled()
+                png_path = os.path.join(temp_dir, f"slide_{i:03d}_tmp.png")  # 临时PNG
+                png_paths[i] = png_path
+                self.log(f"导出幻灯片 {i}/{slide_count}: slide_{i:03d}.jpg")
+
+                try:
+                    render_start = time.perf_counter()
+                    with tracer.span('render', slide=i):
+                        if use_frames:
+                            source = renderer.render_frame(i)
+                        else:
+                            source = renderer.render_slide(i, png_path)
+                except Exception as e:
+                    self.log(f"导出幻灯片 {i} 失败: {e}")
+                    slide_finished()
+                    continue
+                self.emit(SlideRendered(i, time.perf_counter() - render_start))
+
+                if detector is not None:
+                    try:
+                        with tracer.span('dedup', slide=i):
+                            original = detector.match(i, source)
+                    except Exception as dedup_error:
+                        # 无法读取时交给编码阶段的校验处理
+                        self.log(f"幻灯片 {i} 重复检测失败: {dedup_error}")
+                        original = None
+                    if original is not None:
+                        duplicates[i] = original
+                        if not use_frames:
+                            os.remove(png_path)
+                        self.log(f"幻灯片 {i} 与第 {original} 张相同，复用其图片")
+                        slide_finished()
+                        continue
+
+                # 编码队列已满时阻塞渲染，保持在途数量有界
+                with tracer.span('encode_backpressure', slide=i):
+                    in_flight.acquire()
+                futures[i] = executor.submit(encode_job, i, source)
+
+            for i in sorted(futures):
+                try:
+                    status = futures[i].result()
+                except Exception as imgconv_e:
+                    self.log(f"✗ 幻灯片 {i} PNG转JPG失败: {imgconv_e}")
+                    continue
+                results[i] = status
+                if status == 'ok':
+                    self.update_status(f"已导出 {i}/{slide_count} 张幻灯片")
+                    self.log(f"✓ 幻灯片 {i} JPG 转换成功")
+                elif status == 'png_invalid':
+                    self.log(f"✗ 幻灯片 {i} PNG临时文件导出失败或文件无效")
+                elif status == 'png_blank':
+                    self.log(f"✗ 幻灯片 {i} 渲染结果为空白，但原幻灯片有内容")
+                else:
+                    self.log(f"✗ 幻灯片 {i} JPG 转换失败")
+
+        return results
+
+    def retry_failed_slides(self, renderer, slide_count, png_paths, results, store,
+                            content_flags=None, on_encoded=None):
+        """编码阶段判定PNG无效或空白的幻灯片，回到渲染线程重新导出
+
+        每张最多重试 RENDER_RETRIES 次，每次之前按指数退避加抖动等待（RETRY_BACKOFF），
+        第一次只等约0.1秒，后端确实需要缓一缓时才越等越久。
+        """
+        for i in range(1, slide_count + 1):
+            if results.get(i) not in RETRY_STATUSES:
+                continue
+            expect_content = content_flags[i - 1] if content_flags else True
+            status = data = None
+            for attempt in range(RENDER_RETRIES):
+                with self.tracer.span('retry_wait', slide=i):
+                    RETRY_BACKOFF.wait(attempt, self.cancel_event)
+                self.check_cancelled()
+                try:
+                    status, data = self._retry_slide(renderer, i, png_paths[i], expect_content,
+                                                     last=attempt == RENDER_RETRIES - 1)
+                except Exception as retry_e:
+                    status = None
+                    self.log(f"✗ 幻灯片 {i} 重新导出时发生异常: {retry_e}")
+                    continue
+                if status not in RETRY_STATUSES:
+                    break
+            if status == 'ok':
+                store.add_image(i, data)
+                os.remove(png_paths[i])
+                results[i] = 'ok'
+                if on_encoded:
+                    on_encoded(i, data)
+                self.log(f"✓ 幻灯片 {i} 重新导出并转JPG成功")
+            elif status == 'png_invalid':
+                self.log(f"✗ 幻灯片 {i} 重新导出PNG临时文件仍然失败")
+            elif status is not None:
+                self.log(f"✗ 幻灯片 {i} 重新导出转JPG仍然失败")
+
+    def _retry_slide(self, renderer, i, png_path, expect_content, last):
+        """重新导出并编码一张幻灯片，返回 (状态, 图片数据)"""
+        tracer = self.tracer
+        render_start = time.perf_counter()
+        with tracer.span('render', slide=i, retry=True):
+            renderer.render_slide(i, png_path)
+        self.emit(SlideRendered(i, time.perf_counter() - render_start, retry=True))
+        status, data = encode_slide_data(png_path, self.encoder, tracer, i, expect_content)
+        if status == 'png_blank' and last:
+            # 多次重新导出都是空白，多半确实如此（例如白底白字），按原样保留
+            self.log(f"⚠ 幻灯片 {i} 重新导出后仍为空白，按渲染结果保留")
+            status, data = encode_slide_data(png_path, self.encoder, tracer, i,
+                                             expect_content=False)
+        self.emit(SlideEncoded(i, status, len(data) if data else 0, retry=True))
+        return status, data
+
+    def resolve_duplicates(self, duplicates, results, store, on_shared=None):
+        """让重复的幻灯片使用原幻灯片的图片，状态随原幻灯片"""
+        for i, original in sorted(duplicates.items()):
+            if results.get(original) != 'ok':
+                self.log(f"✗ 幻灯片 {i} 所复用的第 {original} 张未能导出")
+                continue
+            store.share_image(i, original)
+            results[i] = 'ok'
+            if on_shared:
+                on_shared(i, original)
+
+    def convert(self, input_ppt, output_ppt):
+        """转换PPT为图片幻灯片（背景模式），成功返回True"""
+        with self.tracer.span('convert', input=os.path.basename(input_ppt)):
+            success = self._convert(input_ppt, output_ppt)
+        self._log_trace_summary()
+        return success
+
+    def patch(self, input_ppt, output_ppt, slides=None):
+        """只重新转换部分幻灯片，就地更新已有的输出文件，成功返回True
+
+        slides 为幻灯片序号列表；None 表示内容有变化的幻灯片（按输出文件中记录的内容键判断）。
+        输出文件不存在、页数或幻灯片尺寸与原PPT不一致、没有记录内容键而需要判断变化，
+        或者所有幻灯片都有变化时，改为完整转换并覆盖输出文件。
+        """
+        with self.tracer.span('patch', input=os.path.basename(input_ppt)):
+            success = self._patch(input_ppt, output_ppt, slides)
+            if success is None:
+                success = self._convert(input_ppt, output_ppt)
+        self._log_trace_summary()
+        return success
+
+    def _log_trace_summary(self):
+        if self.tracer.enabled:
+            self.log("各阶段耗时：")
+            for line in self.tracer.summary_lines():
+                self.log(line)
+
+    def _convert(self, input_ppt, output_ppt):
+        tracer = self.tracer
+        temp_dir = None
+        renderer = None
+        owns_renderer = False
+        manifest = None
+        streaming_writer = None
+        succeeded = False
+
+        try:
+            # 流式输出：编码结果直接写入输出文件，临时目录里只有在途的PNG
+            done = set()
+            if self.stream:
+                streaming_writer = StreamingDeckWriter(output_ppt)
+                store = streaming_writer
+                if self.resume:
+                    self.log("流式输出不保留中间图片，本次转换不支持断点续传")
+            # 可续传任务使用固定的工作目录，否则创建临时目录
+            elif self.resume:
+                try:
+                    with tracer.span('job_manifest'):
+                        manifest = JobManifest.open_for(input_ppt, self.render_settings(),
+                                                        self.jobs_dir)
+                    temp_dir = manifest.work_dir
+                    done = manifest.completed_slides()
+                    self.log(f"任务工作目录: {temp_dir}")
+                    if done:
+                        self.log(f"发现未完成的转换任务，已完成 {len(done)} 张幻灯片，从断点继续")
+                except OSError as manifest_error:
+                    self.log(f"无法创建可续传任务，改用临时目录: {manifest_error}")
+                    manifest = None
+            if temp_dir is None:
+                temp_dir = tempfile.mkdtemp(prefix="ppt_to_image_")
+                self.log(f"创建临时目录: {temp_dir}")
+            if streaming_writer is None:
+                store = DirectorySlideStore(temp_dir)
+
+            # 1. 预检（直接读取PPTX压缩包，不需要启动渲染后端）：页数、尺寸、
+            # 各幻灯片的内容键（查询渲染缓存，并记录在输出文件中供以后只更新有变化的幻灯片）
+            # 和是否有可见内容（识别空白的渲染结果）；.ppt 等无法读取时为None
+            info = self._preflight(input_ppt)
+            if info is not None and not self._check_limits(info):
+                return False
+            content_keys = info.content_keys if info else None
+            content_flags = info.content_flags if info else None
+            cache_keys = None
+            cached = set()
+            if self.cache is not None:
+                cache_keys = content_keys
+                with tracer.span('cache_lookup'):
+                    for i, key in enumerate(cache_keys or (), 1):
+                        if i in done:
+                            continue
+                        data = self.cache.read(key)
+                        if data is not None:
+                            store.add_image(i, data)
+                            cached.add(i)
+                if cache_keys:
+                    self.log(f"渲染缓存命中 {len(cached)}/{len(cache_keys)} 张幻灯片")
+
+            # 已知页数时，检查是否所有幻灯片都已就绪（断点进度 + 缓存命中）
+            known_count = len(cache_keys) if cache_keys else None
+            known_size = None
+            if manifest is not None and manifest.slide_count:
+                known_count = known_count or manifest.slide_count
+                known_size = manifest.slide_size
+            ready = done | cached
+
+            if known_count and ready >= set(range(1, known_count + 1)):
+                # 全部就绪：无需启动渲染后端
+                slide_count = known_count
+                if known_size:
+                    slide_width, slide_height = known_size
+                elif info is not None:
+                    slide_width, slide_height = info.slide_size_points
+                else:
+                    slide_width = DEFAULT_SLIDE_WIDTH / EMU_PER_POINT
+                    slide_height = DEFAULT_SLIDE_HEIGHT / EMU_PER_POINT
+                self.log(f"全部幻灯片已就绪，跳过渲染，共 {slide_count} 张幻灯片")
+                self.report_progress(slide_count, slide_count)
+                results = {i: 'ok' for i in ready}
+                if manifest is not None:
+                    for i in cached:
+                        manifest.mark(i, 'done')
+            else:
+                # 2. 准备渲染后端并打开原PPT
+                try:
+                    renderer, owns_renderer = self._create_renderer()
+                    self.log(f"使用渲染后端: {renderer.name}")
+                except Exception as render_error:
+                    self.log(f"渲染后端初始化失败: {render_error}")
+                    return False
+
+                with tracer.span('open_deck'):
+                    renderer.open(input_ppt)
+                slide_count = renderer.slide_count
+                self.log(f"成功打开PPT，共 {slide_count} 张幻灯片")
+
+                if content_keys and len(content_keys) != slide_count:
+                    content_keys = None
+                if cache_keys and len(cache_keys) != slide_count:
+                    # 渲染后端看到的页数与压缩包不一致（例如跳过了隐藏页），缓存键无法对应
+                    self.log("幻灯片数量与缓存键不一致，本次不使用渲染缓存")
+                    if streaming_writer is not None and cached:
+                        # 缓存命中的图片已写入输出，只能重新开始
+                        streaming_writer.abort()
+                        streaming_writer = store = StreamingDeckWriter(output_ppt)
+                    cache_keys = None
+                    cached = set()
+
+                # 获取幻灯片尺寸信息
+                slide_width, slide_height = renderer.slide_size
+                self.log(f"幻灯片尺寸: {slide_width:.1f} x {slide_height:.1f} 点")
+                pixel_width, pixel_height = renderer.pixel_size()
+                self.log(f"输出分辨率: {pixel_width} x {pixel_height} 像素"
+                         f"（{renderer.effective_dpi:.0f} dpi）")
+
+                if content_flags is not None and len(content_flags) != slide_count:
+                    content_flags = None
+
+                if manifest is not None:
+                    if not manifest.set_slide_info(slide_count, renderer.slide_size):
+                        self.log("页数与上次记录不一致，断点进度作废")
+                        done = set()
+                    for i in cached:
+                        manifest.mark(i, 'done')
+                ready = done | cached
+
+                # 每张图片就绪后记录检查点，新渲染的图片写入缓存
+                def on_encoded(i, data):
+                    if manifest is not None:
+                        manifest.mark(i, 'done')
+                    if cache_keys:
+                        self.cache.put_data(cache_keys[i - 1], data)
+
+                def on_shared(i, original):
+                    if manifest is not None:
+                        manifest.mark(i, 'done')
+                    if cache_keys:
+                        self.cache.copy(cache_keys[original - 1], cache_keys[i - 1])
+
+                # 3. 导出为图片（渲染与JPG编码流水线并行）
+                self.log("开始导出幻灯片为图片...")
+                png_paths = {}
+                duplicates = {}
+                results = self.render_and_encode_slides(renderer, slide_count, temp_dir, png_paths,
+                                                        skip=ready, on_encoded=on_encoded,
+                                                        duplicates=duplicates, store=store,
+                                                        content_flags=content_flags)
+                results.update((i, 'ok') for i in ready)
+
+                # 原幻灯片要重新导出时，与它“相同”的幻灯片也不可信，一并重新导出
+                for i, original in list(duplicates.items()):
+                    if results.get(original) in RETRY_STATUSES:
+                        del duplicates[i]
+                        results[i] = results[original]
+
+                self.retry_failed_slides(renderer, slide_count, png_paths, results, store,
+                                         content_flags, on_encoded)
+
+                with tracer.span('close_deck'):
+                    renderer.close()
+                if duplicates:
+                    self.log(f"{len(duplicates)} 张幻灯片与前面的幻灯片重复，未重复编码")
+                    self.resolve_duplicates(duplicates, results, store, on_shared)
+
+                if manifest is not None:
+                    for i in range(1, slide_count + 1):
+                        if results.get(i) != 'ok':
+                            manifest.mark(i, 'failed')
+
+            exported = sum(1 for i in range(1, slide_count + 1) if results.get(i) == 'ok')
+            if not exported:
+                self.log("错误：没有成功导出任何图片")
+                return False
+
+            self.log(f"成功导出 {exported} 张JPG图片")
+            stats = self.encoder.stats
+            if isinstance(self.encoder, AdaptiveJpegEncoder) and stats.slides:
+                ratio = stats.saved_bytes / stats.baseline_bytes * 100 if stats.baseline_bytes else 0
+                self.log(f"自适应编码 {stats.slides} 张：{stats.bytes / 1024 / 1024:.2f} MB，"
+                         f"比固定质量节省 {stats.saved_bytes / 1024 / 1024:.2f} MB（{ratio:.1f}%）")
+            if stats.lossless:
+                self.log(f"{stats.lossless} 张文字/线条页改用无损PNG（不比JPG大）")
+
+            # 4. 生成以JPG为背景的PPTX（纯Python写包，不再二次打开PowerPoint）
+            self.check_cancelled()
+            self.log("生成图片背景PPT...")
+            self.update_status("正在保存文件...")
+            if streaming_writer is not None:
+                writer = streaming_writer
+                writer.slide_width = points_to_emu(slide_width)
+                writer.slide_height = points_to_emu(slide_height)
+            else:
+                # 按幻灯片顺序重新组装
+                writer = ImageSlideDeckWriter(points_to_emu(slide_width), points_to_emu(slide_height))
+                for i in range(1, slide_count + 1):
+                    if results.get(i) == 'ok':
+                        writer.add_slide(store.path(i))
+            if content_keys and exported == slide_count:
+                # 输出的幻灯片与原幻灯片一一对应时才记录内容键
+                writer.source_keys = content_keys
+
+            try:
+                abs_output_path = os.path.abspath(output_ppt)
+                self.log(f"保存到: {abs_output_path}")
+                with tracer.span('write_package'):
+                    writer.save(abs_output_path)
+                streaming_writer = None
+            except Exception as save_error:
+                self.log(f"保存失败，转换未完成: {save_error}")
+                return False
+
+            self.log(f"成功处理 {writer.slide_count} 张幻灯片")
+            if writer.shared_slide_count:
+                self.log(f"{writer.shared_slide_count} 张幻灯片共用图片，"
+                         f"输出文件只保存 {len(writer.media)} 张图片")
+            self.log("PPT转换完成")
+            succeeded = True
+            return True
+
+        except ConversionCancelled:
+            self.log("转换已取消")
+            raise
+
+        except Exception as e:
+            self.log(f"转换过程发生错误: {e}")
+            self.log("详细错误信息:")
+            self.log(traceback.format_exc())
+            return False
+
+        finally:
+            self.log("开始清理资源...")
+
+            # 1. 关闭演示文稿；自己创建的渲染后端一并退出
+            if renderer is not None:
+                try:
+                    with tracer.span('renderer_shutdown' if owns_renderer else 'close_deck'):
+                        if owns_renderer:
+                            renderer.shutdown()
+                        else:
+                            renderer.close()
+                except Exception as cleanup_error:
+                    self.log(f"关闭渲染后端时出错: {cleanup_error}")
+
+            # 2. 未完成的流式输出删除临时文件，不留下半个PPTX
+            if streaming_writer is not None:
+                streaming_writer.abort()
+
+            # 3. 清理临时目录；可续传任务失败时保留工作目录，下次从断点继续
+            if manifest is not None:
+                if succeeded:
+                    with tracer.span('cleanup'):
+                        manifest.discard()
+                else:
+                    self.log(f"转换未完成，进度已保存在 {temp_dir}，再次转换将从断点继续")
+            elif temp_dir and os.path.exists(temp_dir):
+                # 后端刚关闭时文件可能仍被占用，轮询直到删除成功
+                with tracer.span('cleanup'):
+                    removed = remove_tree(temp_dir)
+                if removed:
+                    self.log(f"清理临时目录: {temp_dir}")
+                else:
+                    self.log(f"清理临时目录失败（文件仍被占用）: {temp_dir}")
+
+            self.log("资源清理完成")
+
+    def _patch(self, input_ppt, output_ppt, slides):
+        """patch() 的实现；需要改为完整转换时返回None"""
+        tracer = self.tracer
+        if not os.path.exists(output_ppt):
+            self.log("输出文件不存在，进行完整转换")
+            return None
+        info = self._preflight(input_ppt)
+        if info is not None and not self._check_limits(info):
+            return False
+        try:
+            patcher = DeckPatcher(output_ppt)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as open_error:
+            self.log(f"无法就地更新输出文件（{open_error}），进行完整转换")
+            return None
+        slide_count = patcher.slide_count
+        if info is None or info.slide_count != slide_count:
+            self.log("原PPT的页数与输出文件不一致（或无法读取），进行完整转换")
+            return None
+        content_keys = info.content_keys
+        if not patcher.slide_size or any(
+                abs(a - b) > EMU_PER_POINT for a, b in zip(info.slide_size, patcher.slide_size)):
+            self.log("幻灯片尺寸有变化，进行完整转换")
+            return None
+
+        if slides is None:
+            if patcher.source_keys is None:
+                self.log("输出文件没有记录原幻灯片的内容，无法判断哪些幻灯片有变化，进行完整转换")
+                return None
+            targets = changed_slides(patcher.source_keys, content_keys)
+            if len(targets) == slide_count:
+                self.log("所有幻灯片都有变化（或转换设置不同），进行完整转换")
+                return None
+        else:
+            targets = sorted(set(slides))
+            invalid = [i for i in targets if not 1 <= i <= slide_count]
+            if invalid:
+                self.log(f"幻灯片序号超出范围（共 {slide_count} 张）: "
+                         f"{', '.join(map(str, invalid))}")
+                return False
+        if not targets:
+            self.log("没有内容有变化的幻灯片，输出文件保持不变")
+            self.report_progress(slide_count, slide_count)
+            return True
+        self.log(f"只更新 {len(targets)} 张幻灯片: {', '.join(map(str, targets))}")
+
+        temp_dir = tempfile.mkdtemp(prefix="ppt_to_image_")
+        store = DirectorySlideStore(temp_dir)
+        renderer = None
+        owns_renderer = False
+        try:
+            cached = set()
+            if self.cache is not None:
+                with tracer.span('cache_lookup'):
+                    for i in targets:
+                        data = self.cache.read(content_keys[i - 1])
+                        if data is not None:
+                            store.add_image(i, data)
+                            cached.add(i)
+                if cached:
+                    self.log(f"渲染缓存命中 {len(cached)}/{len(targets)} 张幻灯片")
+
+            results = {i: 'ok' for i in cached}
+            pending = set(targets) - cached
+            if pending:
+                try:
+                    renderer, owns_renderer = self._create_renderer()
+                    self.log(f"使用渲染后端: {renderer.name}")
+                except Exception as render_error:
+                    self.log(f"渲染后端初始化失败: {render_error}")
+                    return False
+                with tracer.span('open_deck'):
+                    renderer.open(input_ppt)
+                if renderer.slide_count != slide_count:
+                    self.log("渲染后端看到的页数与输出文件不一致，进行完整转换")
+                    return None
+
+                content_flags = info.content_flags
+
+                def on_encoded(i, data):
+                    if self.cache is not None:
+                        self.cache.put_data(content_keys[i - 1], data)
+
+                png_paths = {}
+                duplicates = {}
+                skip = set(range(1, slide_count + 1)) - pending
+                results.update(self.render_and_encode_slides(
+                    renderer, slide_count, temp_dir, png_paths, skip=skip, on_encoded=on_encoded,
+                    duplicates=duplicates, store=store, content_flags=content_flags))
+                for i, original in list(duplicates.items()):
+                    if results.get(original) in RETRY_STATUSES:
+                        del duplicates[i]
+                        results[i] = results[original]
+                self.retry_failed_slides(renderer, slide_count, png_paths, results, store,
+                                         content_flags, on_encoded)
+                with tracer.span('close_deck'):
+                    renderer.close()
+                self.resolve_duplicates(duplicates, results, store)
+
+            failed = [i for i in targets if results.get(i) != 'ok']
+            for i in targets:
+                if i not in failed:
+                    with open(store.path(i), 'rb') as f:
+                        patcher.replace_image(i, f.read(), content_keys[i - 1])
+            if len(failed) == len(targets):
+                self.log("错误：没有成功导出任何图片，输出文件保持不变")
+                return False
+
+            self.check_cancelled()
+            self.update_status("正在保存文件...")
+            with tracer.span('write_package'):
+                replaced = patcher.save()
+            self.log(f"已更新 {replaced} 张幻灯片: {os.path.abspath(output_ppt)}")
+            if failed:
+                self.log(f"✗ 以下幻灯片未能更新，保留原来的图片: {', '.join(map(str, failed))}")
+                return False
+            return True
+
+        except ConversionCancelled:
+            self.log("更新已取消，输出文件保持不变")
+            raise
+
+        except Exception as e:
+            self.log(f"更新过程发生错误: {e}")
+            self.log(traceback.format_exc())
+            return False
+
+        finally:
+            if renderer is not None:
+                try:
+                    if owns_renderer:
+                        renderer.shutdown()
+                    else:
+                        renderer.close()
+                except Exception as cleanup_error:
+                    self.log(f"关闭渲染后端时出错: {cleanup_error}")
+            remove_tree(temp_dir)
+
+
+def convert_ppt_to_image_slides(input_ppt, output_ppt, renderer=None, log=None, status=None,
+                                cache=None, resume=False, encoder=None, dedup_tolerance=None,
+                                resolution=None, stream=False, tracer=None, progress=None):
+    """便捷函数：用指定渲染后端转换一份PPT"""
+    converter = SlideConverter(renderer=renderer, log=log, status=status, cache=cache,
+                               resume=resume, encoder=encoder, dedup_tolerance=dedup_tolerance,
+                               resolution=resolution, stream=stream, tracer=tracer,
+                               progress=progress)
+    return converter.convert(input_ppt, output_ppt)
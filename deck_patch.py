@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+只更新已有输出文件中的部分幻灯片
+修改了原PPT的几张幻灯片后，不必重新生成整个 xxx_image.pptx：只重新渲染这几张，
+把新图片作为新的媒体部件写入，改写对应幻灯片的关系文件，其余部件原样复制
+（图片本身以存储方式保存，不重新压缩），不再被引用的旧图片随之删除。
+输出文件中记录的原幻灯片内容键（见 pptx_writer.SOURCE_KEYS_PROPERTY）用于找出有变化的幻灯片。
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+
+from pptx_package import PptxPackage, rels_part_name
+from pptx_writer import (CUSTOM_PROPERTIES_PART, CUSTOM_PROPERTIES_TYPE, IMAGE_CONTENT_TYPES, RT,
+                         custom_properties_xml, image_extension, parse_source_keys,
+                         replace_output, short_source_key)
+
+CONTENT_TYPES_PART = '[Content_Types].xml'
+PACKAGE_RELS_PART = '_rels/.rels'
+
+_MEDIA_NUMBER_RE = re.compile(r'^ppt/media/image(\d+)\.\w+$')
+_REL_ID_RE = re.compile(r'\bId="rId(\d+)"')
+
+
+def parse_slide_ranges(text):
+    """解析 "3,5-7,42" 形式的幻灯片范围，返回升序的序号列表；格式有误时抛出 ValueError"""
+    slides = set()
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError(f"无法识别的幻灯片范围: {item}")
+        if first < 1 or last < first:
+            raise ValueError(f"无法识别的幻灯片范围: {item}")
+        slides.update(range(first, last + 1))
+    if not slides:
+        raise ValueError("没有指定幻灯片")
+    return sorted(slides)
+
+
+def changed_slides(recorded_keys, current_keys):
+    """对比输出文件中记录的内容键和原PPT当前的内容键，返回需要更新的幻灯片序号"""
+    return [index for index, (old, new) in enumerate(zip(recorded_keys, current_keys), 1)
+            if old is None or old != short_source_key(new)]
+
+
+class DeckPatcher:
+    """替换本工具生成的图片背景PPTX中若干张幻灯片的图片
+
+    用法：
+        patcher = DeckPatcher("xxx_image.pptx")
+        patcher.replace_image(42, jpeg_bytes, source_key)
+        patcher.save()
+
+    文件不是图片背景PPTX（某张幻灯片没有图片）时构造函数抛出 ValueError。
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with PptxPackage(self.path) as package:
+            self.slide_parts = list(package.slide_parts)
+            self.slide_size = package.slide_size()
+            self.slide_images = []
+            for part in self.slide_parts:
+                images = [target for rtype, target, external in package.relationships(part).values()
+                          if rtype == 'image' and not external]
+                if len(images) != 1:
+                    raise ValueError(f"{part} 不是单张图片背景的幻灯片")
+                self.slide_images.append(images[0])
+            self.source_keys = None
+            if package.has_part(CUSTOM_PROPERTIES_PART):
+                self.source_keys = parse_source_keys(package.read_text(CUSTOM_PROPERTIES_PART))
+                if self.source_keys is not None and len(self.source_keys) != len(self.slide_parts):
+                    self.source_keys = None
+        # 序号 -> (图片数据, 扩展名, 内容键)
+        self._replacements = {}
+
+    @property
+    def slide_count(self):
+        return len(self.slide_parts)
+
+    def replace_image(self, index, data, source_key=None, ext=None):
+        """把第 index 张幻灯片的图片换成 data；source_key 为原幻灯片新的内容键"""
+        if not 1 <= index <= self.slide_count:
+            raise IndexError(f"幻灯片序号超出范围: {index}")
+        ext = ext or image_extension(data) or 'jpg'
+        if ext not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f"不支持的图片格式: {ext}")
+        self._replacements[index] = (data, ext, source_key)
+
+    def save(self):
+        """写出更新后的文件（同目录临时文件写完后替换原文件），返回替换的图片张数"""
+        if not self._replacements:
+            return 0
+        with zipfile.ZipFile(self.path) as source:
+            names = source.namelist()
+            slide_images = list(self.slide_images)
+            new_media = {}
+            added = {}
+            next_number = max((int(m.group(1)) for m in map(_MEDIA_NUMBER_RE.match, names) if m),
+                              default=0) + 1
+            for index, (data, ext, _) in sorted(self._replacements.items()):
+                # 这次新加入的图片之间按内容去重
+                key = (ext, hashlib.sha256(data).hexdigest())
+                if key not in added:
+                    added[key] = f'ppt/media/image{next_number}.{ext}'
+                    new_media[added[key]] = data
+                    next_number += 1
+                slide_images[index - 1] = added[key]
+            unused = set(self.slide_images) - set(slide_images)
+
+            parts = {}
+            for index in self._replacements:
+                slide_part = self.slide_parts[index - 1]
+                rels_name = rels_part_name(slide_part)
+                base = posixpath.dirname(slide_part)
+                old_target = posixpath.relpath(self.slide_images[index - 1], base)
+                new_target = posixpath.relpath(slide_images[index - 1], base)
+                xml = parts.get(rels_name) or source.read(rels_name).decode('utf-8')
+                parts[rels_name] = (xml.replace(f'Target="{old_target}"', f'Target="{new_target}"')
+                                    .replace(f'Target="/{self.slide_images[index - 1]}"',
+                                             f'Target="{new_target}"'))
+            parts.update(self._package_parts(source, names, new_media))
+
+            output_dir = os.path.dirname(self.path)
+            fd, tmp_path = tempfile.mkstemp(prefix='.pptx_patch_', suffix='.tmp', dir=output_dir)
+            os.close(fd)
+            try:
+                with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+                    for info in source.infolist():
+                        if info.filename in unused or info.filename in parts:
+                            continue
+                        # 未改动的部件逐块原样复制，保持原有的压缩方式
+                        copy = zipfile.ZipInfo(info.filename, info.date_time)
+                        copy.compress_type = info.compress_type
+                        copy.external_attr = info.external_attr
+                        with source.open(info) as src, target.open(copy, 'w') as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                    for name, xml in parts.items():
+                        target.writestr(name, xml)
+                    for name, data in new_media.items():
+                        target.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+                # 沿用原文件的权限（mkstemp 创建的临时文件为 0600）
+                replace_output(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        self.slide_images = slide_images
+        count = len(self._replacements)
+        self._replacements = {}
+        return count
+
+    def _package_parts(self, source, names, new_media):
+        """需要改写的包级部件：内容类型、包关系和记录内容键的自定义属性"""
+        parts = {}
+        content_types = source.read(CONTENT_TYPES_PART).decode('utf-8')
+        for ext in sorted({name.rsplit('.', 1)[1] for name in new_media}):
+            if f'Extension="{ext}"' not in content_types:
+                content_types = content_types.replace(
+                    '</Types>', f'<Default Extension="{ext}" ContentType="{IMAGE_CONTENT_TYPES[ext]}"/></Types>')
+
+        keys = list(self.source_keys or [None] * self.slide_count)
+        for index, (_, _, source_key) in self._replacements.items():
+            keys[index - 1] = short_source_key(source_key)
+        if self.source_keys is not None or any(keys):
+            parts[CUSTOM_PROPERTIES_PART] = custom_properties_xml(keys)
+            if CUSTOM_PROPERTIES_PART not in names:
+                content_types = content_types.replace(
+                    '</Types>', f'<Override PartName="/{CUSTOM_PROPERTIES_PART}" '
+                                f'ContentType="{CUSTOM_PROPERTIES_TYPE}"/></Types>')
+                rels = source.read(PACKAGE_RELS_PART).decode('utf-8')
+                rel_id = max((int(n) for n in _REL_ID_RE.findall(rels)), default=0) + 1
+                parts[PACKAGE_RELS_PART] = rels.replace(
+                    '</Relationships>',
+                    f'<Relationship Id="rId{rel_id}" Type="{RT}/custom-properties" '
+                    f'Target="{CUSTOM_PROPERTIES_PART}"/></Relationships>')
+        parts[CONTENT_TYPES_PART] = content_types
+        return parts
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+幻灯片图片编码器
+- FixedJpegEncoder：固定质量（默认 quality=95），与以前的行为一致
+- AdaptiveJpegEncoder：逐张搜索满足SSIM/PSNR阈值的最低质量和合适的色度抽样，
+  纯文字页通常可以用低得多的质量编码，照片页则保持高质量
+
+JPEG由可替换的编码后端（JPEG_CODECS）生成：Pillow总是可用，安装了
+PyTurboJPEG 或 simplejpeg 时可以直接调用 libjpeg-turbo；codec='auto' 时
+启动后用一张合成幻灯片测一次速度，选出满足质量要求的最快后端。
+lossless_text=True 时颜色很少的文字/线条页改用无损PNG（不比JPEG大时）。
+"""
+
+import functools
+import importlib
+import io
+import random
+import threading
+import time
+
+# Pillow的色度抽样参数：0 = 4:4:4，2 = 4:2:0
+SUBSAMPLING_444 = 0
+SUBSAMPLING_420 = 2
+SUBSAMPLING_NAMES = {SUBSAMPLING_444: '4:4:4', SUBSAMPLING_420: '4:2:0'}
+
+# SSIM常数（像素取值范围0-255）
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+
+# 颜色数不超过这个值的幻灯片视为文字/线条页，lossless_text 时尝试无损PNG
+LINE_ART_MAX_COLORS = 4096
+
+# 自动选择编码后端时，允许比Pillow同质量编码低多少PSNR（dB）
+CODEC_PSNR_TOLERANCE = 0.5
+# 自动选择编码后端时，输出允许比Pillow（霍夫曼表优化后）大多少（比例）；
+# 不做霍夫曼表优化的后端快一些，但文件通常大 5-10%
+CODEC_SIZE_TOLERANCE = 0.03
+# 耗时相差不超过这个比例的后端视为一样快，选输出更小的
+CODEC_TIME_TIE = 0.1
+
+
+class EncodeResult:
+    """一次编码的结果；format 为 'jpeg' 或 'png'"""
+
+    __slots__ = ('data', 'quality', 'subsampling', 'score', 'baseline_bytes', 'format')
+
+    def __init__(self, data, quality, subsampling, score=None, baseline_bytes=None,
+                 format='jpeg'):
+        self.data = data
+        self.quality = quality
+        self.subsampling = subsampling
+        self.score = score
+        self.baseline_bytes = baseline_bytes if baseline_bytes is not None else len(data)
+        self.format = format
+
+
+class EncodeStats:
+    """编码统计（线程安全）：张数、输出字节数、基准字节数、改用PNG的张数"""
+
+    def __init__(self):
+        self.slides = 0
+        self.bytes = 0
+        self.baseline_bytes = 0
+        self.lossless = 0
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        with self._lock:
+            self.slides += 1
+            self.bytes += len(result.data)
+            self.baseline_bytes += result.baseline_bytes
+            if result.format == 'png':
+                self.lossless += 1
+
+    @property
+    def saved_bytes(self):
+        return self.baseline_bytes - self.bytes
+
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name):
+    """按需导入可选依赖，未安装时返回None。
+    numpy（约0.1秒）和JPEG编码库只在第一次用到时加载，不拖慢命令行、服务和工作进程的启动"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+# 质量评估按水平条带处理，每次只把这么多行转换为浮点数组，
+# 4K/打印分辨率下峰值内存不随图片高度增长（须为SSIM窗口的整数倍）
+STRIP_ROWS = 256
+
+
+def _to_array(image):
+    """RGB图片转为uint8数组（不复制为浮点，按条带再转换）"""
+    numpy = optional_module('numpy')
+    return numpy.asarray(image, dtype=numpy.uint8)
+
+
+def _strips(height, rows=STRIP_ROWS):
+    for start in range(0, height, rows):
+        yield start, min(start + rows, height)
+
+
+def psnr(reference, candidate):
+    """峰值信噪比（dB），输入为同尺寸的RGB数组"""
+    numpy = optional_module('numpy')
+    squared_error = 0.0
+    for start, stop in _strips(reference.shape[0]):
+        diff = reference[start:stop].astype(numpy.float32) - candidate[start:stop]
+        squared_error += float(numpy.sum(diff * diff, dtype=numpy.float64))
+    mse = squared_error / reference.size
+    if mse == 0:
+        return float('inf')
+    return 10.0 * numpy.log10(255.0 ** 2 / mse)
+
+
+def _block_mean(array, block):
+    """每个 block×block 窗口内的均值，分两步沿行、列求和（比多轴归约快得多）"""
+    height, width, channels = array.shape
+    rows = array.reshape(height // block, block, width * channels).sum(axis=1)
+    blocks = rows.reshape(height // block, width // block, block, channels).sum(axis=2)
+    return blocks / (block * block)
+
+
+def _block_stats(array, block):
+    """每个窗口的均值和方差"""
+    mean = _block_mean(array, block)
+    var = _block_mean(array * array, block) - mean * mean
+    return mean, var
+
+
+def _ssim_strips(array, block):
+    """按条带切分并裁掉不足一个窗口的边缘，逐条返回浮点数组"""
+    numpy = optional_module('numpy')
+    height, width = array.shape[:2]
+    height -= height % block
+    width -= width % block
+    for start, stop in _strips(height):
+        yield array[start:stop, :width].astype(numpy.float32)
+
+
+def reference_stats(reference, block=8):
+    """参考图每个条带的窗口统计，对同一张图比较多个候选时只需计算一次"""
+    return [_block_stats(x, block) for x in _ssim_strips(reference, block)]
+
+
+def ssim(reference, candidate, block=8, stats=None):
+    """按 block×block 不重叠窗口计算的平均SSIM
+
+    对每个颜色通道分别计算并取最小值，这样色度抽样造成的彩色文字边缘
+    失真也会反映出来。全部用NumPy向量化完成，按条带处理以限制内存。
+    """
+    numpy = optional_module('numpy')
+    stats = stats if stats is not None else reference_stats(reference, block)
+    total = None
+    windows = 0
+    strips = zip(_ssim_strips(reference, block), _ssim_strips(candidate, block), stats)
+    for x, y, (mu_x, var_x) in strips:
+        mu_y, var_y = _block_stats(y, block)
+        cov = _block_mean(x * y, block) - mu_x * mu_y
+        ssim_map = ((2 * mu_x * mu_y + _SSIM_C1) * (2 * cov + _SSIM_C2)) / \
+                   ((mu_x * mu_x + mu_y * mu_y + _SSIM_C1) * (var_x + var_y + _SSIM_C2))
+        strip_sum = ssim_map.sum(axis=(0, 1), dtype=numpy.float64)
+        total = strip_sum if total is None else total + strip_sum
+        windows += ssim_map.shape[0] * ssim_map.shape[1]
+    if not windows:
+        return 1.0
+    return float((total / windows).min())
+
+
+METRICS = {'ssim': ssim, 'psnr': psnr}
+
+
+# ---- JPEG编码后端 ----
+
+class PillowJpegCodec:
+    """Pillow自带的JPEG编码（总是可用）"""
+
+    name = 'pillow'
+    requirement = 'Pillow'
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def encode(self, image, quality, subsampling=SUBSAMPLING_420, optimize=False):
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, subsampling=subsampling, optimize=optimize)
+        return buffer.getvalue()
+
+
+class TurboJpegCodec:
+    """通过PyTurboJPEG直接调用libjpeg-turbo（不支持霍夫曼表优化，optimize 被忽略）"""
+
+    name = 'turbojpeg'
+    requirement = 'PyTurboJPEG、numpy 和 libjpeg-turbo 动态库'
+    _usable = None
+
+    @classmethod
+    def available(cls):
+        if cls._usable is None:
+            try:
+                turbojpeg = optional_module('turbojpeg')
+                cls._usable = (turbojpeg is not None and optional_module('numpy') is not None
+                               and bool(turbojpeg.TurboJPEG()))
+            except Exception:
+                # 装了Python包但找不到动态库
+                cls._usable = False
+        return cls._usable
+
+    def __init__(self):
+        self._module = optional_module('turbojpeg')
+        self._numpy = optional_module('numpy')
+        self._jpeg = self._module.TurboJPEG()
+
+    def encode(self, image, quality, subsampling=SUBSAMPLING_420, optimize=False):
+        turbojpeg = self._module
+        sample = turbojpeg.TJSAMP_444 if subsampling == SUBSAMPLING_444 else turbojpeg.TJSAMP_420
+        return self._jpeg.encode(self._numpy.asarray(image), quality=quality,
+                                 pixel_format=turbojpeg.TJPF_RGB, jpeg_subsample=sample)
+
+
+class SimpleJpegCodec:
+    """simplejpeg（内置libjpeg-turbo，编码时释放GIL）"""
+
+    name = 'simplejpeg'
+    requirement = 'simplejpeg 和 numpy'
+
+    @classmethod
+    def available(cls):
+        return optional_module('simplejpeg') is not None and optional_module('numpy') is not None
+
+    def __init__(self):
+        self._module = optional_module('simplejpeg')
+        self._numpy = optional_module('numpy')
+
+    def encode(self, image, quality, subsampling=SUBSAMPLING_420, optimize=False):
+        sample = '444' if subsampling == SUBSAMPLING_444 else '420'
+        numpy = self._numpy
+        return self._module.encode_jpeg(numpy.ascontiguousarray(numpy.asarray(image)),
+                                      quality=quality, colorspace='RGB', colorsubsampling=sample)
+
+
+JPEG_CODECS = {codec.name: codec for codec in (PillowJpegCodec, TurboJpegCodec, SimpleJpegCodec)}
+
+# fastest_codec 的结果，按质量缓存（每个进程只测一次）
+_fastest_codecs = {}
+_fastest_lock = threading.Lock()
+
+
+def available_codecs():
+    """当前环境中可用的JPEG编码后端名称"""
+    return [name for name, codec in JPEG_CODECS.items() if codec.available()]
+
+
+def create_codec(name='pillow', quality=95):
+    """按名称创建JPEG编码后端；'auto' 选择最快的可用后端，指定的后端不可用时抛出 ImportError"""
+    if name == 'auto':
+        name = fastest_codec(quality)
+    if name not in JPEG_CODECS:
+        raise ValueError(f"未知的JPEG编码后端: {name}（可选: auto, {', '.join(JPEG_CODECS)}）")
+    codec = JPEG_CODECS[name]
+    if not codec.available():
+        raise ImportError(f"JPEG编码后端 {name} 不可用，需要安装 {codec.requirement}")
+    return codec()
+
+
+def benchmark_sample(width=1280, height=720, seed=0):
+    """测速用的合成幻灯片：白底、标题栏、若干行“文字”和一块照片似的区域"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, height // 8], fill=(46, 134, 171))
+    for y in range(height // 5, height * 9 // 10, max(4, height // 24)):
+        draw.rectangle([width // 12, y, width // 12 + rng.randint(width // 8, width // 3),
+                        y + max(2, height // 60)], fill=(40, 40, 40))
+    noise = bytes(rng.getrandbits(8) for _ in range(40 * 24 * 3))
+    photo = Image.frombytes("RGB", (40, 24), noise).resize((width // 2, height * 3 // 5),
+                                                           Image.BICUBIC)
+    image.paste(photo, (width * 9 // 20, height // 4))
+    return image
+
+
+def benchmark_codecs(quality=95, sample=None, repeat=3, optimize=True):
+    """对每个可用后端编码同一张图片，返回 [{name, seconds, bytes, psnr}]（seconds 取最快一次）
+
+    optimize 与实际编码相同（FixedJpegEncoder 总是优化霍夫曼表）；不支持优化的后端
+    会忽略它，其输出大小因此计入比较。
+    """
+    sample = sample or benchmark_sample()
+    reference = _to_array(sample) if optional_module('numpy') is not None else None
+    results = []
+    for name in available_codecs():
+        try:
+            codec = create_codec(name)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = codec.encode(sample, quality, optimize=optimize)
+                timings.append(time.perf_counter() - start)
+        except Exception:
+            continue
+        score = None
+        if reference is not None:
+            from PIL import Image
+
+            with Image.open(io.BytesIO(data)) as decoded:
+                score = psnr(reference, _to_array(decoded.convert("RGB")))
+        results.append({'name': name, 'seconds': min(timings), 'bytes': len(data),
+                        'psnr': float(score) if score is not None else None})
+    return results
+
+
+def fastest_codec(quality=95):
+    """在可用后端中选出最快的一个：按实际编码设置测速，同质量下PSNR不低于Pillow太多、
+    输出不比Pillow大太多；耗时相差不到 CODEC_TIME_TIE 的后端选输出更小的"""
+    with _fastest_lock:
+        if quality not in _fastest_codecs:
+            _fastest_codecs[quality] = _pick_codec(benchmark_codecs(quality))
+        return _fastest_codecs[quality]
+
+
+def _pick_codec(results):
+    """fastest_codec 的选择规则，results 为 benchmark_codecs 的结果"""
+    pillow = next((item for item in results if item['name'] == PillowJpegCodec.name), None)
+    eligible = results
+    if pillow is not None:
+        max_bytes = pillow['bytes'] * (1 + CODEC_SIZE_TOLERANCE)
+        floor = pillow['psnr'] - CODEC_PSNR_TOLERANCE if pillow['psnr'] is not None else None
+        eligible = [item for item in results if item['bytes'] <= max_bytes
+                    and (floor is None or item['psnr'] is None or item['psnr'] >= floor)]
+    if not eligible:
+        return PillowJpegCodec.name
+    fastest = min(item['seconds'] for item in eligible)
+    ties = [item for item in eligible if item['seconds'] <= fastest * (1 + CODEC_TIME_TIE)]
+    return min(ties, key=lambda item: (item['bytes'], item['seconds']))['name']
+
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class _Encoder:
+    """编码器的公共部分：JPEG编码后端、文字页无损PNG和统计"""
+
+    def __init__(self, codec='pillow', lossless_text=False, codec_quality=95):
+        self.codec = codec if not isinstance(codec, str) else create_codec(codec, codec_quality)
+        self.lossless_text = lossless_text
+        self.stats = EncodeStats()
+
+    def _common_settings(self):
+        settings = {}
+        # 默认的Pillow后端不写入，保持以前的缓存键
+        if self.codec.name != PillowJpegCodec.name:
+            settings['codec'] = self.codec.name
+        if self.lossless_text:
+            settings['lossless_text'] = LINE_ART_MAX_COLORS
+        return settings
+
+    def encode(self, image):
+        """编码RGB图片，返回 EncodeResult"""
+        result = self._encode(image)
+        if self.lossless_text and image.getcolors(LINE_ART_MAX_COLORS) is not None:
+            png = encode_png(image)
+            if len(png) <= len(result.data):
+                result = EncodeResult(png, None, None, baseline_bytes=result.baseline_bytes,
+                                      format='png')
+        self.stats.add(result)
+        return result
+
+
+class FixedJpegEncoder(_Encoder):
+    """固定质量的JPEG编码"""
+
+    name = 'jpeg'
+
+    def __init__(self, quality=95, codec='pillow', lossless_text=False):
+        super().__init__(codec, lossless_text, quality)
+        self.quality = quality
+
+    def settings(self):
+        """影响输出结果的参数（参与缓存键）"""
+        settings = {'encoder': self.name, 'quality': self.quality}
+        settings.update(self._common_settings())
+        return settings
+
+    def _encode(self, image):
+        data = self.codec.encode(image, self.quality, SUBSAMPLING_420, optimize=True)
+        return EncodeResult(data, self.quality, None)
+
+
+class AdaptiveJpegEncoder(_Encoder):
+    """逐张自适应质量的JPEG编码
+
+    对每种色度抽样二分查找满足阈值的最低质量，取字节数最小的组合；
+    都不满足时退回 max_quality 的4:4:4编码。
+    threshold 的含义取决于 metric：ssim 为0-1之间的相似度，psnr 为分贝数。
+    """
+
+    name = 'jpeg-adaptive'
+
+    def __init__(self, metric='ssim', threshold=0.98, min_quality=40, max_quality=95,
+                 subsamplings=(SUBSAMPLING_420, SUBSAMPLING_444), codec='pillow',
+                 lossless_text=False):
+        if optional_module('numpy') is None:
+            raise ImportError("自适应JPEG编码需要numpy，请先 pip install numpy")
+        if metric not in METRICS:
+            raise ValueError(f"未知的质量指标: {metric}（可选: {', '.join(sorted(METRICS))}）")
+        super().__init__(codec, lossless_text, max_quality)
+        self.metric = metric
+        self.threshold = threshold
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.subsamplings = tuple(subsamplings)
+
+    def settings(self):
+        settings = {
+            'encoder': self.name, 'metric': self.metric, 'threshold': self.threshold,
+            'min_quality': self.min_quality, 'max_quality': self.max_quality,
+            'subsamplings': list(self.subsamplings),
+        }
+        settings.update(self._common_settings())
+        return settings
+
+    def _encode_jpeg(self, image, quality, subsampling, optimize=False):
+        return self.codec.encode(image, quality, subsampling, optimize)
+
+    def _scorer(self, image):
+        """返回对候选编码打分的函数；SSIM的参考图窗口统计只计算一次"""
+        from PIL import Image
+
+        reference = _to_array(image)
+        if self.metric == 'ssim':
+            stats = reference_stats(reference)
+            compare = lambda candidate: ssim(reference, candidate, stats=stats)
+        else:
+            compare = lambda candidate: psnr(reference, candidate)
+
+        def score(data):
+            with Image.open(io.BytesIO(data)) as decoded:
+                return compare(_to_array(decoded.convert("RGB")))
+        return score
+
+    def _encode(self, image):
+        score_of = self._scorer(image)
+        # 基准：以前固定使用的 quality=95 编码大小，用于统计节省的字节数
+        baseline = self._encode_jpeg(image, 95, SUBSAMPLING_420, optimize=True)
+
+        best = None
+        for subsampling in self.subsamplings:
+            low, high = self.min_quality, self.max_quality
+            found = None
+            # 质量越高得分越高，二分查找满足阈值的最低质量
+            while low <= high:
+                quality = (low + high) // 2
+                data = self._encode_jpeg(image, quality, subsampling)
+                score = score_of(data)
+                if score >= self.threshold:
+                    found = (len(data), quality, score)
+                    high = quality - 1
+                else:
+                    low = quality + 1
+            if found and (best is None or found[0] < best[0]):
+                best = found + (subsampling,)
+
+        if best is None:
+            quality, subsampling = self.max_quality, SUBSAMPLING_444
+            data = self._encode_jpeg(image, quality, subsampling, optimize=True)
+            score = score_of(data)
+        else:
+            _, quality, score, subsampling = best
+            data = self._encode_jpeg(image, quality, subsampling, optimize=True)
+
+        return EncodeResult(data, quality, subsampling, score, len(baseline))
+
+
+def create_encoder(adaptive=False, **kwargs):
+    """按配置创建编码器；codec 为JPEG编码后端名称（见 JPEG_CODECS，'auto' 自动选择）"""
+    if adaptive:
+        return AdaptiveJpegEncoder(**kwargs)
+    return FixedJpegEncoder(**kwargs)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换过程的类型化事件
+SlideConverter 给出 events 回调时，在渲染、编码每张幻灯片后发出 SlideRendered /
+SlideEncoded，每个阶段（预检、打开演示文稿、写出文件等）结束时发出 StageTiming；
+异步接口（见 async_api）再补上日志、状态、进度和结束事件（ConversionDone /
+ConversionFailed）。事件可能来自渲染线程或编码线程，回调需要自己保证线程安全。
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class Event:
+    """事件基类；kind 为事件类型名，to_dict() 得到可序列化为JSON的字典"""
+
+    __slots__ = ()
+    kind = 'event'
+    # 结束事件之后不会再有同一个转换的事件
+    terminal = False
+
+    def to_dict(self):
+        record = {'kind': self.kind}
+        record.update((name, getattr(self, name)) for name in self.__slots__)
+        return record
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class LogMessage(Event):
+    """一行日志"""
+
+    __slots__ = ('message',)
+    kind = 'log'
+
+    def __init__(self, message):
+        self.message = message
+
+
+class StatusMessage(Event):
+    """简短的状态文本（例如“正在保存文件...”）"""
+
+    __slots__ = ('message',)
+    kind = 'status'
+
+    def __init__(self, message):
+        self.message = message
+
+
+class Progress(Event):
+    """已处理完（成功或失败）的幻灯片张数"""
+
+    __slots__ = ('completed', 'total')
+    kind = 'progress'
+
+    def __init__(self, completed, total):
+        self.completed = completed
+        self.total = total
+
+
+class SlideRendered(Event):
+    """渲染后端导出了一张幻灯片；seconds 为这次渲染的耗时"""
+
+    __slots__ = ('index', 'seconds', 'retry')
+    kind = 'slide_rendered'
+
+    def __init__(self, index, seconds, retry=False):
+        self.index = index
+        self.seconds = seconds
+        self.retry = retry
+
+
+class SlideEncoded(Event):
+    """一张幻灯片的编码结果；status 同 converter.encode_slide_data，bytes 为图片大小"""
+
+    __slots__ = ('index', 'status', 'bytes', 'retry')
+    kind = 'slide_encoded'
+
+    def __init__(self, index, status, bytes=0, retry=False):
+        self.index = index
+        self.status = status
+        self.bytes = bytes
+        self.retry = retry
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+
+class StageTiming(Event):
+    """一个阶段（tracing 中不属于单张幻灯片的 span）结束"""
+
+    __slots__ = ('stage', 'seconds')
+    kind = 'stage'
+
+    def __init__(self, stage, seconds):
+        self.stage = stage
+        self.seconds = seconds
+
+
+class ConversionDone(Event):
+    """转换成功结束"""
+
+    __slots__ = ('output', 'seconds')
+    kind = 'done'
+    terminal = True
+
+    def __init__(self, output, seconds):
+        self.output = output
+        self.seconds = seconds
+
+
+class ConversionFailed(Event):
+    """转换失败或被取消（cancelled 为True）"""
+
+    __slots__ = ('error', 'cancelled', 'seconds')
+    kind = 'failed'
+    terminal = True
+
+    def __init__(self, error, cancelled=False, seconds=None):
+        self.error = error
+        self.cancelled = cancelled
+        self.seconds = seconds
+
+
+class EventTracer:
+    """包装一个 Tracer（或 NullTracer），阶段级的 span 结束时另外发出 StageTiming
+
+    带 slide 属性的 span 属于单张幻灯片，由 SlideRendered / SlideEncoded 报告，不再重复发出。
+    """
+
+    def __init__(self, tracer, emit):
+        self.tracer = tracer
+        self.emit = emit
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            with self.tracer.span(name, **attrs):
+                yield
+        finally:
+            if 'slide' not in attrs:
+                self.emit(StageTiming(name, time.perf_counter() - start))
+
+    def __getattr__(self, name):
+        # enabled、summary_lines、write_jsonl 等直接交给被包装的 Tracer
+        return getattr(self.tracer, name)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程间传递渲染位图
+渲染分片进程把原始RGB像素写进共享内存中的一个槽位，只把槽位号和尺寸发给主进程，
+主进程直接从共享内存构造图片交给编码线程，不再经过“压缩PNG - 写文件 - 读文件 - 解压PNG”。
+槽位数量固定、循环使用，由主进程分配：派发渲染任务时附上一个空闲槽位，
+没有空闲槽位时这张幻灯片仍用PNG文件传递，渲染端不会等待。
+
+需要 multiprocessing.shared_memory（Python 3.8+），不可用时 available() 返回False。
+"""
+
+from collections import deque
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+def available():
+    """当前Python是否支持共享内存传递"""
+    return shared_memory is not None
+
+
+def _attach(name):
+    """打开已有的共享内存，由创建方负责释放"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数；spawn 出的子进程与主进程共用同一个
+        # resource_tracker，重复登记同一个名字没有影响，主进程 unlink 时一并注销
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameRing:
+    """共享内存中固定数量、固定大小的位图槽位
+
+    主进程 create 后用 acquire / release 管理空闲槽位，把 handle() 发给渲染进程，
+    渲染进程 attach 后用 write 把图片写入分配给它的槽位，主进程 read 读出。
+    """
+
+    def __init__(self, memory, slot_bytes, slots, owner):
+        self.memory = memory
+        self.slot_bytes = slot_bytes
+        self.slots = slots
+        self.owner = owner
+        self._free = deque(range(slots)) if owner else None
+
+    @classmethod
+    def create(cls, slot_bytes, slots):
+        memory = shared_memory.SharedMemory(create=True, size=slot_bytes * slots)
+        return cls(memory, slot_bytes, slots, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        name, slot_bytes, slots = handle
+        return cls(_attach(name), slot_bytes, slots, owner=False)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def handle(self):
+        """可以发给子进程的描述（共享内存名、槽位大小、槽位数）"""
+        return (self.memory.name, self.slot_bytes, self.slots)
+
+    def acquire(self):
+        """取一个空闲槽位，没有时返回None（主进程）"""
+        return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        """归还槽位（主进程）"""
+        self._free.append(slot)
+
+    def write(self, slot, image):
+        """把图片的RGB像素写入槽位，返回 (宽, 高)；槽位放不下时返回None（渲染进程）"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        width, height = image.size
+        size = width * height * 3
+        if size > self.slot_bytes:
+            return None
+        offset = slot * self.slot_bytes
+        self.memory.buf[offset:offset + size] = image.tobytes()
+        return (width, height)
+
+    def read(self, slot, width, height):
+        """从槽位读出图片（复制为独立的图片），随后归还槽位（主进程）"""
+        from PIL import Image
+
+        offset = slot * self.slot_bytes
+        view = self.memory.buf[offset:offset + width * height * 3]
+        try:
+            return Image.frombytes('RGB', (width, height), view)
+        finally:
+            view.release()
+            self.release(slot)
+
+    def close(self):
+        try:
+            self.memory.close()
+        except BufferError:
+            pass
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复幻灯片图片检测
+逐步展开的动画页、反复出现的章节页渲染出来往往是同一张图：
+精确匹配比较导出位图的文件哈希，可选的感知比较允许缩略图有少量差异
+"""
+
+import hashlib
+import threading
+from collections import deque
+
+from job_manifest import file_sha256
+
+# 缩略图边长：32×32 个灰度格子
+THUMBNAIL_SIZE = 32
+# 灰度相差超过这个值的格子才算不同（0-255），吸收抗锯齿和JPEG噪声
+CELL_THRESHOLD = 24
+# 感知比较只和最近这么多张不同的图片比较：逐步展开的动画页总是相邻出现，
+# 相隔很远但完全相同的页（如章节页）由精确匹配处理
+RECENT_LIMIT = 64
+
+
+def thumbnail(image, size=THUMBNAIL_SIZE):
+    """缩小为 size×size 的灰度缩略图，返回像素字节"""
+    from PIL import Image
+
+    return image.convert("L").resize((size, size), Image.BILINEAR).tobytes()
+
+
+def thumbnail_distance(a, b, threshold=CELL_THRESHOLD):
+    """两张缩略图中明显不同的格子数
+
+    幻灯片大部分是纯色背景，按格子计数比dHash之类的位哈希更能区分“多了一行字”。
+    """
+    return sum(1 for x, y in zip(a, b) if abs(x - y) > threshold)
+
+
+class DuplicateDetector:
+    """记录已出现的幻灯片图片，判断新图片是否与之前的某一张重复（线程安全）
+
+    tolerance 为缩略图中允许不同的格子数（共 THUMBNAIL_SIZE² 个）；
+    None 表示只做精确匹配。容差大于0时相近但不完全相同的幻灯片会共用同一张图，
+    属于有损去重。
+    """
+
+    def __init__(self, tolerance=None):
+        self.tolerance = tolerance
+        self._exact = {}
+        self._recent = deque(maxlen=RECENT_LIMIT)
+        self._lock = threading.Lock()
+
+    def match(self, index, source):
+        """与之前登记过的图片比较，重复时返回那一张的序号，否则登记本张并返回None
+
+        source 为图片文件路径或已解码的图片（PIL.Image），同一个检测器中只用其中一种。
+        """
+        in_memory = not isinstance(source, str)
+        exact = hashlib.sha256(source.tobytes()).hexdigest() if in_memory else file_sha256(source)
+        with self._lock:
+            if exact in self._exact:
+                return self._exact[exact]
+
+        thumb = None
+        if self.tolerance is not None:
+            if in_memory:
+                thumb = thumbnail(source)
+            else:
+                from PIL import Image
+
+                with Image.open(source) as image:
+                    thumb = thumbnail(image)
+
+        with self._lock:
+            if exact in self._exact:
+                return self._exact[exact]
+            if thumb is not None:
+                for other_thumb, other_index in reversed(self._recent):
+                    if thumbnail_distance(thumb, other_thumb) <= self.tolerance:
+                        return other_index
+                self._recent.append((thumb, index))
+            self._exact[exact] = index
+        return None
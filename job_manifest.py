@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可续传的转换任务
+每个任务有固定的工作目录和 manifest.json，记录输入文件哈希、转换设置和每张幻灯片的状态；
+转换中途失败或进程被杀掉后，再次转换同一文件只需补做未完成的幻灯片
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from render_cache import app_cache_root
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# 超过这个天数未更新的任务目录视为已放弃，启动时清理
+STALE_JOB_DAYS = 7
+
+
+def default_jobs_dir():
+    """默认任务工作目录的根目录"""
+    return os.path.join(app_cache_root(), 'jobs')
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cleanup_stale_jobs(jobs_dir, max_age_days=STALE_JOB_DAYS):
+    """删除长期未更新的任务目录"""
+    if not os.path.isdir(jobs_dir):
+        return
+    deadline = time.time() - max_age_days * 86400
+    for name in os.listdir(jobs_dir):
+        job_dir = os.path.join(jobs_dir, name)
+        manifest_path = os.path.join(job_dir, MANIFEST_NAME)
+        try:
+            updated = os.path.getmtime(manifest_path if os.path.exists(manifest_path) else job_dir)
+        except OSError:
+            continue
+        if updated < deadline:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+class JobManifest:
+    """一个转换任务的工作目录和进度清单（线程安全）
+
+    幻灯片状态：'done' 表示JPG已生成并通过校验，'failed' 表示本轮失败；
+    不在清单中的幻灯片视为未完成。
+    """
+
+    def __init__(self, work_dir, data):
+        self.work_dir = work_dir
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open_for(cls, input_path, settings, jobs_dir=None):
+        """打开（或新建）输入文件对应的任务
+
+        工作目录由输入文件路径和设置决定；输入文件内容变化或设置不同时，
+        旧进度作废并从头开始。
+        """
+        jobs_dir = jobs_dir or default_jobs_dir()
+        cleanup_stale_jobs(jobs_dir)
+        input_path = os.path.abspath(input_path)
+        settings_json = json.dumps(settings, sort_keys=True)
+        job_id = hashlib.sha256(
+            (os.path.normcase(input_path) + '\n' + settings_json).encode('utf-8')
+        ).hexdigest()[:24]
+        work_dir = os.path.join(jobs_dir, job_id)
+        input_hash = file_sha256(input_path)
+
+        data = None
+        manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+            if data and (data.get('version') != MANIFEST_VERSION
+                         or data.get('input_sha256') != input_hash
+                         or data.get('settings') != json.loads(settings_json)):
+                data = None
+            if data is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        os.makedirs(work_dir, exist_ok=True)
+        if data is None:
+            data = {
+                'version': MANIFEST_VERSION,
+                'input_path': input_path,
+                'input_sha256': input_hash,
+                'settings': json.loads(settings_json),
+                'slide_count': None,
+                'slide_size': None,
+                'slides': {},
+                'created': time.time(),
+            }
+        manifest = cls(work_dir, data)
+        manifest.save()
+        return manifest
+
+    @property
+    def slide_count(self):
+        return self.data.get('slide_count')
+
+    @property
+    def slide_size(self):
+        """上次记录的幻灯片尺寸（磅）"""
+        size = self.data.get('slide_size')
+        return tuple(size) if size else None
+
+    def set_slide_info(self, slide_count, slide_size):
+        """记录页数和尺寸；页数与上次记录不一致时丢弃旧进度并返回False"""
+        kept = True
+        with self._lock:
+            if self.data['slide_count'] not in (None, slide_count):
+                self.data['slides'] = {}
+                kept = False
+            self.data['slide_count'] = slide_count
+            self.data['slide_size'] = list(slide_size)
+        self.save()
+        return kept
+
+    def completed_slides(self):
+        """已完成且图片文件仍存在的幻灯片序号"""
+        with self._lock:
+            done = [int(i) for i, state in self.data['slides'].items() if state == 'done']
+        return {i for i in done if os.path.exists(self.slide_path(i))}
+
+    def slide_path(self, index):
+        return os.path.join(self.work_dir, f"slide_{index:03d}.jpg")
+
+    def mark(self, index, state):
+        """更新一张幻灯片的状态并立即落盘（检查点）"""
+        with self._lock:
+            self.data['slides'][str(index)] = state
+        self.save()
+
+    def save(self):
+        """原子写入 manifest.json"""
+        with self._lock:
+            self.data['updated'] = time.time()
+            content = json.dumps(self.data, ensure_ascii=False, indent=1)
+            path = os.path.join(self.work_dir, MANIFEST_NAME)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+    def discard(self):
+        """任务完成后删除工作目录"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
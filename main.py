@@ -8,12 +8,54 @@ PPT转换为图片幻灯片工具 - 背景版本（最终GUI版）
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
-import tempfile
-import shutil
-from PIL import Image
-import win32com.client
 import threading
 import queue
+import time
+
+from converter import ConversionCancelled, SlideConverter, make_output_path
+from render_cache import RenderCache, app_cache_root
+from renderer_pool import RendererPool
+from renderers import PowerPointRenderer
+
+# 界面上的分辨率选项 -> renderers.RESOLUTION_PRESETS 中的预设名
+RESOLUTION_CHOICES = [
+    ("标准（约1280像素宽）", 'standard'),
+    ("投影仪（1920像素宽）", 'projector'),
+    ("4K大屏（3840像素宽）", '4k'),
+    ("打印（300 dpi）", 'print'),
+]
+
+# 日志框最多保留的行数，更早的日志只保存在日志文件中
+LOG_VIEW_LINES = 2000
+# 保留最近多少个日志文件
+LOG_FILES_KEPT = 20
+# 消息队列的处理间隔（毫秒），每次把积累的日志合并为一次插入
+QUEUE_POLL_MS = 100
+
+
+def open_log_file():
+    """在本地数据目录下创建本次运行的完整日志文件，并清理较早的日志"""
+    log_dir = os.path.join(app_cache_root(), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    old_logs = sorted(name for name in os.listdir(log_dir) if name.endswith('.log'))
+    for name in old_logs[:max(0, len(old_logs) - LOG_FILES_KEPT + 1)]:
+        try:
+            os.remove(os.path.join(log_dir, name))
+        except OSError:
+            pass
+    path = os.path.join(log_dir, time.strftime('gui-%Y%m%d-%H%M%S.log'))
+    return open(path, 'a', encoding='utf-8')
+
+
+def format_duration(seconds):
+    """秒数格式化为 m:ss 或 h:mm:ss"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
 
 class PPTToImageSlidesGUI:
     def __init__(self):
@@ -32,6 +74,21 @@ class PPTToImageSlidesGUI:
         # 消息队列用于线程间通信
         self.message_queue = queue.Queue()
 
+        # 完整日志写入文件，日志框只保留最近的部分
+        try:
+            self.log_file = open_log_file()
+        except OSError:
+            self.log_file = None
+
+        # 当前任务的进度起点（时间, 已完成张数），用于计算速度和剩余时间
+        self.progress_origin = None
+
+        # 常驻转换线程及其任务队列
+        self.conversion_jobs = queue.Queue()
+        self.conversion_worker = None
+        # 设置后当前转换在下一张幻灯片之前停止
+        self.cancel_event = threading.Event()
+
         # 创建GUI界面
         self.create_widgets()
 
@@ -138,6 +195,17 @@ class PPTToImageSlidesGUI:
                               width=12, height=1)
         select_btn.pack(side=tk.RIGHT)
         
+        # 输出分辨率
+        resolution_frame = tk.Frame(file_frame)
+        resolution_frame.pack(fill=tk.X, pady=5)
+        tk.Label(resolution_frame, text="🖼 输出分辨率：",
+                font=("Microsoft YaHei", 10)).pack(side=tk.LEFT)
+        self.resolution_var = tk.StringVar(value=RESOLUTION_CHOICES[0][0])
+        resolution_box = ttk.Combobox(resolution_frame, textvariable=self.resolution_var,
+                                      values=[label for label, _ in RESOLUTION_CHOICES],
+                                      state='readonly', width=24)
+        resolution_box.pack(side=tk.LEFT)
+        
         # 转换按钮区域
         convert_frame = tk.Frame(self.root)
         convert_frame.pack(pady=20)
@@ -165,6 +233,12 @@ class PPTToImageSlidesGUI:
                                font=("Microsoft YaHei", 9), fg="#666666")
         status_label.pack(anchor=tk.W)
         
+        # 已完成张数、速度和预计剩余时间
+        self.progress_var = tk.StringVar(value="")
+        progress_label = tk.Label(progress_frame, textvariable=self.progress_var,
+                                 font=("Microsoft YaHei", 9), fg="#666666")
+        progress_label.pack(anchor=tk.W)
+        
         # 日志区域
         log_frame = tk.LabelFrame(self.root, text="📋 转换日志", 
                                  font=("Microsoft YaHei", 10, "bold"))
@@ -190,6 +264,8 @@ class PPTToImageSlidesGUI:
         
         # 初始化日志
         self.log("PPT转图片幻灯片工具已启动")
+        if self.log_file is not None:
+            self.log(f"完整日志保存在: {self.log_file.name}")
         self.log("请选择要转换的PPT文件")
         
     def log(self, message):
@@ -204,34 +280,94 @@ class PPTToImageSlidesGUI:
         """更新进度条到队列"""
         self.message_queue.put(('progress', action))
         
+    def update_slide_progress(self, completed, total):
+        """幻灯片完成进度（可在任意线程调用）"""
+        self.message_queue.put(('slide_progress', (completed, total)))
+        
     def process_queue(self):
-        """处理消息队列"""
+        """处理消息队列：日志合并为一次插入，进度只取最新的一条"""
+        log_lines = []
+        slide_progress = None
         try:
             while True:
                 msg_type, msg_data = self.message_queue.get_nowait()
                 
                 if msg_type == 'log':
-                    self.log_text.insert(tk.END, f"{msg_data}\n")
-                    self.log_text.see(tk.END)
+                    log_lines.append(msg_data)
                     
                 elif msg_type == 'status':
                     self.status_var.set(msg_data)
                     
                 elif msg_type == 'progress':
                     if msg_data == 'start':
+                        self.progress.config(mode='indeterminate', value=0)
                         self.progress.start(10)
                     elif msg_data == 'stop':
                         self.progress.stop()
                         
+                elif msg_type == 'slide_progress':
+                    slide_progress = msg_data
+                        
                 elif msg_type == 'conversion_complete':
+                    # 先显示完成前的日志和进度
+                    self.append_log(log_lines)
+                    log_lines = []
+                    if slide_progress:
+                        self.show_slide_progress(*slide_progress)
+                        slide_progress = None
                     success, output_file = msg_data
                     self.on_conversion_complete(success, output_file)
                     
         except queue.Empty:
             pass
         
-        # 每100ms检查一次队列
-        self.root.after(100, self.process_queue)
+        self.append_log(log_lines)
+        if slide_progress:
+            self.show_slide_progress(*slide_progress)
+        
+        self.root.after(QUEUE_POLL_MS, self.process_queue)
+        
+    def append_log(self, lines):
+        """一次性追加多行日志，日志框超过 LOG_VIEW_LINES 行时删除最早的部分"""
+        if not lines:
+            return
+        text = '\n'.join(lines) + '\n'
+        if self.log_file is not None:
+            try:
+                stamp = time.strftime('%H:%M:%S')
+                self.log_file.write(''.join(f"{stamp} {line}\n" for line in lines))
+                self.log_file.flush()
+            except (OSError, ValueError):
+                self.log_file = None
+        
+        # 用户向上翻看日志时不自动滚动到底部
+        at_bottom = self.log_text.yview()[1] >= 0.999
+        self.log_text.insert(tk.END, text)
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > LOG_VIEW_LINES:
+            self.log_text.delete('1.0', f"{line_count - LOG_VIEW_LINES + 1}.0")
+        if at_bottom:
+            self.log_text.see(tk.END)
+        
+    def show_slide_progress(self, completed, total):
+        """确定进度条并显示速度和预计剩余时间"""
+        now = time.monotonic()
+        if self.progress_origin is None:
+            self.progress_origin = (now, completed)
+            self.progress.stop()
+            self.progress.config(mode='determinate')
+        self.progress.config(maximum=max(1, total), value=completed)
+        
+        text = f"已完成 {completed}/{total} 张幻灯片"
+        origin_time, origin_completed = self.progress_origin
+        elapsed = now - origin_time
+        done_since = completed - origin_completed
+        if done_since > 0 and elapsed > 0:
+            rate = done_since / elapsed
+            text += f" · {rate:.1f} 张/秒"
+            if completed < total:
+                text += f" · 预计剩余 {format_duration((total - completed) / rate)}"
+        self.progress_var.set(text)
         
     def select_file(self):
         """选择PPT文件"""
@@ -258,61 +394,88 @@ class PPTToImageSlidesGUI:
             self.convert_btn.config(state=tk.NORMAL)
         
     def start_conversion(self):
-        """开始转换（在新线程中）"""
+        """开始转换（在后台线程中）"""
         if not self.selected_file:
             messagebox.showerror("错误", "请先选择PPT文件")
             return
             
-        # 自动生成输出文件路径，与原PPT在同一目录
-        input_dir = os.path.dirname(self.selected_file)
-        input_basename = os.path.splitext(os.path.basename(self.selected_file))[0]
-        output_file = os.path.join(input_dir, f"{input_basename}_image.pptx")
-        
-        # 如果文件已存在，生成不重复的文件名
-        counter = 1
-        while os.path.exists(output_file):
-            output_file = os.path.join(input_dir, f"{input_basename}_image({counter}).pptx")
-            counter += 1
+        # 自动生成输出文件路径，与原PPT在同一目录，已存在时生成不重复的文件名
+        output_file = make_output_path(self.selected_file)
         
         self.log(f"输出文件路径: {output_file}")
             
-        # 禁用转换按钮
-        self.convert_btn.config(state=tk.DISABLED)
+        # 转换期间按钮改为取消
+        self.cancel_event.clear()
+        self.convert_btn.config(text="⏹ 取消转换", command=self.cancel_conversion)
         self.update_status("正在转换...")
+        self.progress_origin = None
+        self.progress_var.set("")
         self.update_progress('start')
         
-        # 在新线程中执行转换
-        conversion_thread = threading.Thread(
-            target=self.convert_in_thread,
-            args=(self.selected_file, output_file)
-        )
-        conversion_thread.daemon = True
-        conversion_thread.start()
+        # 交给常驻转换线程执行，复用已启动的PowerPoint
+        self.ensure_conversion_worker()
+        resolution = dict(RESOLUTION_CHOICES).get(self.resolution_var.get(), 'standard')
+        self.conversion_jobs.put((self.selected_file, output_file, resolution))
         
-    def convert_in_thread(self, input_ppt, output_ppt):
-        """在线程中执行转换，需初始化COM"""
+    def cancel_conversion(self):
+        """请求取消当前转换（当前幻灯片处理完后停止）"""
+        self.cancel_event.set()
+        self.convert_btn.config(state=tk.DISABLED)
+        self.update_status("正在取消...")
+        self.log("正在取消转换，当前幻灯片处理完后停止...")
+
+    def ensure_conversion_worker(self):
+        """按需启动常驻转换线程"""
+        if self.conversion_worker is not None and self.conversion_worker.is_alive():
+            return
+        self.conversion_worker = threading.Thread(target=self.conversion_loop)
+        self.conversion_worker.daemon = True
+        self.conversion_worker.start()
+        
+    def conversion_loop(self):
+        """常驻转换线程：初始化一次COM，在多次转换之间保持PowerPoint实例"""
+        import pythoncom
+        pythoncom.CoInitialize()
+        pool = RendererPool(PowerPointRenderer.name, size=1, log=self.log)
         try:
-            import pythoncom
-            pythoncom.CoInitialize()
-            try:
-                success = self.convert_ppt_to_image_slides(input_ppt, output_ppt)
-                self.message_queue.put(('conversion_complete', (success, output_ppt)))
-            except Exception as e:
-                self.log(f"转换过程发生异常: {e}")
-                self.message_queue.put(('conversion_complete', (False, output_ppt)))
+            cache = RenderCache()
+        except OSError as cache_error:
+            self.log(f"渲染缓存不可用: {cache_error}")
+            cache = None
+        try:
+            while True:
+                job = self.conversion_jobs.get()
+                if job is None:
+                    break
+                input_ppt, output_ppt, resolution = job
+                try:
+                    with pool.lease() as renderer:
+                        success = self.convert_ppt_to_image_slides(input_ppt, output_ppt,
+                                                                   renderer, cache, resolution)
+                        if not success:
+                            pool.mark_failed(renderer)
+                    self.message_queue.put(('conversion_complete', (success, output_ppt)))
+                except ConversionCancelled:
+                    self.message_queue.put(('conversion_complete', (None, output_ppt)))
+                except Exception as e:
+                    self.log(f"转换过程发生异常: {e}")
+                    self.message_queue.put(('conversion_complete', (False, output_ppt)))
         finally:
+            pool.close()
             try:
-                import pythoncom
                 pythoncom.CoUninitialize()
             except:
                 pass
         
     def on_conversion_complete(self, success, output_file):
-        """转换完成回调"""
+        """转换完成回调；success 为None表示已取消"""
         self.update_progress('stop')
-        self.convert_btn.config(state=tk.NORMAL)
-        
-        if success:
+        self.convert_btn.config(text="🚀 开始转换", command=self.start_conversion, state=tk.NORMAL)
+
+        if success is None:
+            self.update_status("已取消")
+            self.log("转换已取消，已完成的幻灯片保存在断点进度中，再次转换将从断点继续")
+        elif success:
             self.update_status("转换完成！")
             self.log("=" * 50)
             self.log("🎉 转换成功完成！")
@@ -327,422 +490,39 @@ class PPTToImageSlidesGUI:
             self.log("❌ 转换失败，请检查上面的日志信息")
             messagebox.showerror("转换失败", "转换过程中发生错误，请查看日志获取详细信息")
     
-    def verify_background_set(self, slide):
-        """验证幻灯片背景是否成功设置"""
-        try:
-            # 检查背景填充类型
-            fill_type = slide.Background.Fill.Type
-            # 如果是图片填充类型，说明背景设置成功
-            if fill_type == 6:  # msoFillPicture = 6
-                return True
-            
-            # 备用验证：检查是否有背景相关的形状
-            try:
-                if slide.Shapes.Count > 0:
-                    # 检查是否有图片形状
-                    for i in range(1, slide.Shapes.Count + 1):
-                        shape = slide.Shapes(i)
-                        if hasattr(shape, 'Type') and shape.Type == 13:  # msoShapeTypePicture = 13
-                            return True
-                return False
-            except:
-                return False
-                
-        except Exception as e:
-            # 如果验证过程出错，假设设置失败
-            return False
-    
-    def validate_image_file(self, image_path):
-        """验证图片文件的有效性"""
-        try:
-            # 检查文件是否存在
-            if not os.path.exists(image_path):
-                return False
-                
-            # 检查文件大小（空文件或太小的文件可能有问题）
-            file_size = os.path.getsize(image_path)
-            if file_size < 1000:  # 小于1KB的图片文件可能有问题
-                return False
-                
-            # 尝试用PIL打开图片验证其有效性
-            with Image.open(image_path) as img:
-                # 验证图片尺寸
-                width, height = img.size
-                if width < 10 or height < 10:  # 尺寸太小的图片可能有问题
-                    return False
-                    
-                # 验证图片模式
-                if img.mode not in ['RGB', 'RGBA', 'L', 'P']:
-                    return False
-                    
-            return True
-            
-        except Exception as e:
-            return False
-    
-    def convert_ppt_to_image_slides(self, input_ppt, output_ppt):
+    def convert_ppt_to_image_slides(self, input_ppt, output_ppt, renderer=None, cache=None,
+                                    resolution=None):
         """转换PPT为图片幻灯片（背景模式）"""
-        temp_dir = None
-        powerpoint = None
-        
-        try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix="ppt_to_image_")
-            self.log(f"创建临时目录: {temp_dir}")
-            
-            # 1. 启动PowerPoint（修复版本兼容性问题）
-            try:
-                powerpoint = win32com.client.Dispatch("PowerPoint.Application")
-                self.log("PowerPoint COM接口创建成功")
-                
-                # 尝试设置PowerPoint属性（某些版本可能不支持隐藏窗口）
-                try:
-                    powerpoint.DisplayAlerts = False  # 禁用警告对话框
-                    self.log("已禁用PowerPoint警告对话框")
-                except Exception as alert_error:
-                    self.log(f"设置DisplayAlerts失败: {alert_error}")
-                
-                # 谨慎处理Visible属性（某些版本不允许隐藏）
-                try:
-                    # 先尝试获取当前状态
-                    current_visible = powerpoint.Visible
-                    self.log(f"PowerPoint当前可见状态: {current_visible}")
-                    
-                    # 如果当前不可见，尝试设置为可见（避免兼容性问题）
-                    if not current_visible:
-                        powerpoint.Visible = True
-                        self.log("PowerPoint窗口已设置为可见")
-                    
-                except Exception as visible_error:
-                    self.log(f"设置Visible属性失败，使用默认设置: {visible_error}")
-                
-                self.log("PowerPoint COM接口初始化完成")
-                
-            except Exception as pp_error:
-                self.log(f"PowerPoint初始化失败: {pp_error}")
-                return False
-            
-            # 2. 打开原PPT
-            presentation = powerpoint.Presentations.Open(os.path.abspath(input_ppt))
-            slide_count = presentation.Slides.Count
-            self.log(f"成功打开PPT，共 {slide_count} 张幻灯片")
-            
-            # 获取幻灯片尺寸信息
-            slide_width = presentation.PageSetup.SlideWidth
-            slide_height = presentation.PageSetup.SlideHeight
-            self.log(f"幻灯片尺寸: {slide_width:.1f} x {slide_height:.1f} 点")
-            
-            # 3. 导出为图片
-            self.log("开始导出幻灯片为图片...")
-            image_files = []
-            
-            for i in range(1, slide_count + 1):
-                png_path = os.path.join(temp_dir, f"slide_{i:03d}_tmp.png")  # 临时PNG
-                jpg_path = os.path.join(temp_dir, f"slide_{i:03d}.jpg")
-                self.log(f"导出幻灯片 {i}/{slide_count}: slide_{i:03d}.jpg")
-
-                try:
-                    presentation.Slides(i).Export(png_path, "PNG")
-
-                    # 验证临时PNG图片
-                    if self.validate_image_file(png_path):
-                        # 转为JPG
-                        try:
-                            with Image.open(png_path) as img:
-                                rgb_img = img.convert("RGB")
-                                rgb_img.save(jpg_path, "JPG", quality=95, optimize=True)
-                            # 验证JPG
-                            if self.validate_image_file(jpg_path):
-                                image_files.append(jpg_path)
-                                self.update_status(f"已导出 {i}/{slide_count} 张幻灯片")
-                                self.log(f"✓ 幻灯片 {i} JPG 转换成功")
-                            else:
-                                self.log(f"✗ 幻灯片 {i} JPG 转换失败")
-                        except Exception as imgconv_e:
-                            self.log(f"✗ 幻灯片 {i} PNG转JPG失败: {imgconv_e}")
-                    else:
-                        self.log(f"✗ 幻灯片 {i} PNG临时文件导出失败或文件无效")
-                        # 尝试重新导出一次
-                        try:
-                            import time
-                            time.sleep(0.5)
-                            presentation.Slides(i).Export(png_path, "PNG")
-                            if self.validate_image_file(png_path):
-                                with Image.open(png_path) as img:
-                                    rgb_img = img.convert("RGB")
-                                    rgb_img.save(jpg_path, "JPG", quality=95, optimize=True)
-                                if self.validate_image_file(jpg_path):
-                                    image_files.append(jpg_path)
-                                    self.log(f"✓ 幻灯片 {i} 重新导出并转JPG成功")
-                                else:
-                                    self.log(f"✗ 幻灯片 {i} 重新导出转JPG仍然失败")
-                            else:
-                                self.log(f"✗ 幻灯片 {i} 重新导出PNG临时文件仍然失败")
-                        except Exception as retry_e:
-                            self.log(f"✗ 幻灯片 {i} 重新导出时发生异常: {retry_e}")
-
-                except Exception as e:
-                    self.log(f"导出幻灯片 {i} 失败: {e}")
-                    continue
-
-            if not image_files:
-                self.log("错误：没有成功导出任何图片")
-                return False
-                
-            self.log(f"成功导出 {len(image_files)} 张JPG图片")
-            presentation.Close()
-            
-            # 4. 重新打开PPT作为模板，设置背景
-            self.log("重新打开PPT，设置JPG图片为背景...")
-            template_presentation = powerpoint.Presentations.Open(os.path.abspath(input_ppt))
-            
-            # 确保模板幻灯片数量与图片数量匹配
-            template_slide_count = template_presentation.Slides.Count
-            image_count = len(image_files)
-            self.log(f"模板幻灯片数量: {template_slide_count}, JPG图片数量: {image_count}")
-            
-            if template_slide_count != image_count:
-                self.log(f"警告：幻灯片数量({template_slide_count})与图片数量({image_count})不匹配")
-                # 如果模板幻灯片少于图片数量，添加幻灯片
-                while template_presentation.Slides.Count < image_count:
-                    # 复制最后一张幻灯片
-                    last_slide = template_presentation.Slides(template_presentation.Slides.Count)
-                    new_slide = last_slide.Duplicate()
-                    self.log(f"添加了新幻灯片，当前总数: {template_presentation.Slides.Count}")
-            
-            # 处理每张幻灯片
-            processed_count = 0
-            for i, image_file in enumerate(image_files, 1):
-                if i <= template_presentation.Slides.Count:
-                    slide = template_presentation.Slides(i)
-                    
-                    try:
-                        self.log(f"处理幻灯片 {i}/{len(image_files)} (JPG)...")
-                        self.update_status(f"设置JPG背景 {i}/{len(image_files)}")
-                        
-                        # 关键修复：设置FollowMasterBackground为False
-                        try:
-                            slide.FollowMasterBackground = False
-                            self.log(f"✓ 幻灯片 {i} 已禁用跟随母版背景")
-                        except Exception as e:
-                            self.log(f"设置FollowMasterBackground失败: {e}")
-                        
-                        # 设置为空白版式（避免占位符文本）
-                        try:
-                            slide.Layout = 12  # ppLayoutBlank = 12
-                            self.log(f"✓ 幻灯片 {i} 已设置为空白版式")
-                        except Exception as e:
-                            self.log(f"设置空白版式失败: {e}")
-                        
-                        # 彻底清空幻灯片内容（包括占位符）
-                        try:
-                            shape_count = slide.Shapes.Count
-                            deleted_count = 0
-                            # 从后往前删除所有形状，包括占位符
-                            for j in range(shape_count, 0, -1):
-                                try:
-                                    shape = slide.Shapes(j)
-                                    # 删除所有形状，包括占位符
-                                    shape.Delete()
-                                    deleted_count += 1
-                                except:
-                                    pass
-                            self.log(f"清空了 {deleted_count} 个元素（包括占位符）")
-                        except Exception as e:
-                            self.log(f"清空幻灯片内容时出错: {e}")
-                        
-                        # 设置背景图片
-                        background_set = False
-                        abs_image_path = os.path.abspath(image_file)
+        converter = SlideConverter(renderer=renderer or PowerPointRenderer.name,
+                                   log=self.log, status=self.update_status, cache=cache,
+                                   resume=True, resolution=resolution,
+                                   progress=self.update_slide_progress,
+                                   cancel_event=self.cancel_event)
+        return converter.convert(input_ppt, output_ppt)
 
-                        # 方法1：使用UserPicture设置JPG背景
-                        try:
-                            slide.Background.Fill.UserPicture(abs_image_path)
-                            # 等待一下让设置生效
-                            import time
-                            time.sleep(0.1)
-                            background_set = self.verify_background_set(slide)
-                            if background_set:
-                                self.log(f"✓ 方法1成功：幻灯片 {i} JPG背景设置完成")
-                            else:
-                                self.log(f"方法1设置JPG后验证失败")
-                        except Exception as e:
-                            self.log(f"方法1失败：{e}")
-                        
-                        # 如果UserPicture失败，使用备用方案
-                        if not background_set:
-                            try:
-                                # 获取幻灯片尺寸
-                                slide_width = template_presentation.PageSetup.SlideWidth
-                                slide_height = template_presentation.PageSetup.SlideHeight
-                                
-                                # 添加图片铺满整个幻灯片
-                                picture = slide.Shapes.AddPicture(abs_image_path, False, True, 0, 0, slide_width, slide_height)
-                                # 将图片移到最底层（作为背景）
-                                try:
-                                    picture.ZOrder(0)  # 发送到底层
-                                except:
-                                    pass
-                                background_set = True
-                                self.log(f"✓ 备用方案成功：幻灯片 {i} JPG图片作为背景添加完成")
-                            except Exception as e:
-                                self.log(f"备用方案失败：{e}")
-                        
-                        # 确保没有其他内容（最终检查）
-                        if background_set:
-                            try:
-                                # 检查是否有新的占位符或形状被意外添加
-                                current_shape_count = slide.Shapes.Count
-                                if current_shape_count > 1:  # 应该只有背景图片
-                                    for j in range(current_shape_count, 1, -1):  # 保留第一个形状（背景）
-                                        try:
-                                            shape = slide.Shapes(j)
-                                            # 删除任何额外的形状（包括可能重新出现的占位符）
-                                            shape.Delete()
-                                            self.log(f"删除了额外的形状/占位符")
-                                        except:
-                                            pass
-                            except Exception as e:
-                                self.log(f"最终清理时出错: {e}")
-                        
-                        if background_set:
-                            processed_count += 1
-                            self.log(f"✓ 幻灯片 {i} 处理完成，仅保留纯净JPG背景")
-                        else:
-                            self.log(f"✗ 幻灯片 {i} 所有JPG背景设置方法都失败")
-
-                    except Exception as e:
-                        self.log(f"✗ 处理幻灯片 {i} 时发生严重错误: {e}")
-                        continue
-            
-            if processed_count == 0:
-                self.log("错误：没有成功处理任何幻灯片")
-                return False
-            
-            # 5. 保存新PPT（改进的错误处理）
-            self.log("保存处理后的PPT...")
-            self.update_status("正在保存文件...")
-            
-            save_success = False
-            try:
-                # 确保保存路径目录存在
-                output_dir = os.path.dirname(os.path.abspath(output_ppt))
-                if not os.path.exists(output_dir):
-                    os.makedirs(output_dir)
-                
-                # 尝试保存
-                abs_output_path = os.path.abspath(output_ppt)
-                self.log(f"保存到: {abs_output_path}")
-                
-                template_presentation.SaveAs(abs_output_path)
-                save_success = True
-                self.log("PPT保存成功")
-                
-            except Exception as save_error:
-                self.log(f"保存失败，尝试备用保存方法: {save_error}")
-                try:
-                    # 备用保存方法：使用ExportAsFixedFormat
-                    backup_path = output_ppt.replace('.pptx', '_backup.pptx')
-                    template_presentation.SaveAs(os.path.abspath(backup_path))
-                    save_success = True
-                    self.log(f"备用保存成功: {backup_path}")
-                except Exception as backup_error:
-                    self.log(f"备用保存也失败: {backup_error}")
-            
-            # 安全关闭演示文稿
-            try:
-                if save_success:
-                    # 等待保存完成
-                    import time
-                    time.sleep(0.5)
-                
-                # 尝试关闭演示文稿
-                template_presentation.Close()
-                self.log("演示文稿已关闭")
-                
-            except Exception as close_error:
-                self.log(f"关闭演示文稿时出错（可能已经关闭）: {close_error}")
-                # 尝试强制关闭
-                try:
-                    powerpoint.Presentations.Close()
-                except:
-                    pass
-            
-            if save_success:
-                self.log(f"成功处理 {processed_count} 张幻灯片")
-                self.log("PPT转换完成")
-                return True
-            else:
-                self.log("保存失败，转换未完成")
-                return False
-            
-        except Exception as e:
-            self.log(f"转换过程发生错误: {e}")
-            import traceback
-            self.log("详细错误信息:")
-            self.log(traceback.format_exc())
-            return False
-            
-        finally:
-            # 改进的资源清理
-            self.log("开始清理资源...")
-            
-            # 1. 安全关闭所有演示文稿
-            try:
-                if 'powerpoint' in locals() and powerpoint:
-                    # 关闭所有打开的演示文稿
-                    presentations_count = powerpoint.Presentations.Count
-                    self.log(f"发现 {presentations_count} 个打开的演示文稿")
-                    
-                    for i in range(presentations_count, 0, -1):
-                        try:
-                            presentation = powerpoint.Presentations(i)
-                            presentation.Close()
-                            self.log(f"已关闭演示文稿 {i}")
-                        except Exception as close_err:
-                            self.log(f"关闭演示文稿 {i} 失败: {close_err}")
-                    
-                    # 等待一下再退出PowerPoint
-                    import time
-                    time.sleep(0.5)
-                    
-            except Exception as cleanup_error:
-                self.log(f"清理演示文稿时出错: {cleanup_error}")
-            
-            # 2. 安全退出PowerPoint
-            try:
-                if 'powerpoint' in locals() and powerpoint:
-                    powerpoint.Quit()
-                    self.log("PowerPoint COM接口已关闭")
-                    
-                    # 释放COM对象引用
-                    del powerpoint
-                    
-            except Exception as quit_error:
-                self.log(f"退出PowerPoint时出错: {quit_error}")
-            
-            # 3. 清理临时目录
-            if 'temp_dir' in locals() and temp_dir and os.path.exists(temp_dir):
-                try:
-                    # 等待一下确保文件不被占用
-                    import time
-                    time.sleep(0.5)
-                    shutil.rmtree(temp_dir)
-                    self.log(f"清理临时目录: {temp_dir}")
-                except Exception as e:
-                    self.log(f"清理临时目录失败: {e}")
-                    # 尝试强制清理
-                    try:
-                        import subprocess
-                        subprocess.run(['rmdir', '/s', '/q', temp_dir], shell=True, check=False)
-                        self.log("强制清理临时目录完成")
-                    except:
-                        self.log("强制清理也失败，临时文件可能需要手动删除")
-            
-            self.log("资源清理完成")
-        
     def on_closing(self):
         """程序关闭时的处理"""
+        # 通知转换线程退出并关闭PowerPoint
+        if self.conversion_worker is not None and self.conversion_worker.is_alive():
+            self.cancel_event.set()
+            self.conversion_jobs.put(None)
+            self.conversion_worker.join(timeout=5)
+        if self.log_file is not None:
+            # 写入队列中剩余的日志
+            lines = []
+            try:
+                while True:
+                    msg_type, msg_data = self.message_queue.get_nowait()
+                    if msg_type == 'log':
+                        lines.append(msg_data)
+            except queue.Empty:
+                pass
+            stamp = time.strftime('%H:%M:%S')
+            try:
+                self.log_file.write(''.join(f"{stamp} {line}\n" for line in lines))
+                self.log_file.close()
+            except (OSError, ValueError):
+                pass
         self.root.quit()
         self.root.destroy()
         
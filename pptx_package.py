@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+只读访问PPTX压缩包（不需要PowerPoint）
+提供幻灯片顺序、幻灯片尺寸和各部件之间的关系
+"""
+
+import posixpath
+import re
+import zipfile
+
+PRESENTATION_PART = 'ppt/presentation.xml'
+
+_REL_RE = re.compile(r'<Relationship\b([^>]*)/?>')
+_ATTR_RE = re.compile(r'(\w+)="([^"]*)"')
+_SLD_ID_RE = re.compile(r'<p:sldId\b[^>]*\br:id="([^"]+)"')
+_SLD_SZ_RE = re.compile(r'<p:sldSz\b[^>]*\bcx="(\d+)"[^>]*\bcy="(\d+)"')
+
+
+def rels_part_name(part_name):
+    """部件对应的 .rels 文件路径"""
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', name + '.rels')
+
+
+class PptxPackage:
+    """PPTX压缩包的轻量只读视图，可作为上下文管理器使用"""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self._rels_cache = {}
+        self._slide_parts = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    def has_part(self, part_name):
+        try:
+            self.zip.getinfo(part_name)
+            return True
+        except KeyError:
+            return False
+
+    def read(self, part_name):
+        return self.zip.read(part_name)
+
+    def read_text(self, part_name):
+        return self.read(part_name).decode('utf-8', 'replace')
+
+    def relationships(self, part_name):
+        """返回 {rId: (类型, 目标部件路径, 是否外部)}，目标已解析为包内绝对路径"""
+        if part_name in self._rels_cache:
+            return self._rels_cache[part_name]
+
+        rels = {}
+        rels_name = rels_part_name(part_name)
+        if self.has_part(rels_name):
+            base_dir = posixpath.dirname(part_name)
+            for match in _REL_RE.finditer(self.read_text(rels_name)):
+                attrs = dict(_ATTR_RE.findall(match.group(1)))
+                rid = attrs.get('Id')
+                target = attrs.get('Target', '')
+                external = attrs.get('TargetMode') == 'External'
+                if not external:
+                    if target.startswith('/'):
+                        target = target.lstrip('/')
+                    else:
+                        target = posixpath.normpath(posixpath.join(base_dir, target))
+                rels[rid] = (attrs.get('Type', '').rsplit('/', 1)[-1], target, external)
+
+        self._rels_cache[part_name] = rels
+        return rels
+
+    @property
+    def slide_parts(self):
+        """按放映顺序排列的幻灯片部件路径"""
+        if self._slide_parts is None:
+            rels = self.relationships(PRESENTATION_PART)
+            xml = self.read_text(PRESENTATION_PART)
+            self._slide_parts = [
+                rels[rid][1] for rid in _SLD_ID_RE.findall(xml) if rid in rels
+            ]
+        return self._slide_parts
+
+    @property
+    def slide_count(self):
+        return len(self.slide_parts)
+
+    def slide_size(self):
+        """幻灯片尺寸（EMU），缺失时返回None"""
+        match = _SLD_SZ_RE.search(self.read_text(PRESENTATION_PART))
+        if not match:
+            return None
+        return int(match.group(1)), int(match.group(2))
+
+
+def read_slide_size(pptx_path):
+    """从源PPTX读取幻灯片尺寸（EMU），读取失败返回None"""
+    try:
+        with PptxPackage(pptx_path) as package:
+            return package.slide_size()
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+纯Python的图片背景PPTX写入器
+直接按OOXML规范生成zip包，每张幻灯片只有一张图片背景，不需要PowerPoint
+"""
+
+import hashlib
+import os
+import re
+import threading
+import zipfile
+import tempfile
+
+from job_manifest import file_sha256
+
+# 1磅 = 12700 EMU
+EMU_PER_POINT = 12700
+
+# 默认16:9幻灯片尺寸（EMU）
+DEFAULT_SLIDE_WIDTH = 12192000
+DEFAULT_SLIDE_HEIGHT = 6858000
+
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+RT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+IMAGE_CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+
+CUSTOM_PROPERTIES_PART = 'docProps/custom.xml'
+CUSTOM_PROPERTIES_TYPE = 'application/vnd.openxmlformats-officedocument.custom-properties+xml'
+
+# 自定义文档属性：每张幻灯片对应的原幻灯片内容键（见 render_cache.slide_content_keys），
+# 用于只更新内容有变化的幻灯片（见 deck_patch）
+SOURCE_KEYS_PROPERTY = 'SourceSlideKeys'
+# 只保存内容键的前16个十六进制字符；'-' 表示未知
+SOURCE_KEY_LENGTH = 16
+UNKNOWN_SOURCE_KEY = '-'
+
+_SOURCE_KEYS_RE = re.compile(
+    rf'<property\b[^>]*\bname="{SOURCE_KEYS_PROPERTY}"[^>]*>\s*<vt:lpwstr>([^<]*)</vt:lpwstr>')
+
+# 新建文件的默认权限（mkstemp 创建的临时文件总是 0600，替换前改为按 umask 的权限）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def replace_output(tmp_path, output_path):
+    """用同目录的临时文件替换 output_path：目标已存在时沿用其权限，否则按 umask 取默认权限"""
+    try:
+        mode = os.stat(output_path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, output_path)
+
+
+# 图片文件头 -> 扩展名；编码器可能对部分幻灯片输出PNG，工作目录中的文件名却固定为 .jpg
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+)
+
+
+def image_extension(data):
+    """按文件头判断图片格式，返回扩展名；无法识别时返回None"""
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    return None
+
+
+def file_image_extension(path):
+    """图片文件的实际格式；文件头无法识别时按扩展名"""
+    with open(path, 'rb') as f:
+        ext = image_extension(f.read(16))
+    return ext or os.path.splitext(path)[1].lower().lstrip('.')
+
+
+def custom_properties_xml(source_keys):
+    """记录原幻灯片内容键的 docProps/custom.xml"""
+    keys = ' '.join((key or UNKNOWN_SOURCE_KEY)[:SOURCE_KEY_LENGTH] for key in source_keys)
+    return (
+        f'{XML_HEADER}<Properties '
+        'xmlns="http://schemas.openxmlformats.org/officeDocument/2006/custom-properties" '
+        'xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes">'
+        '<property fmtid="{D5CDD505-2E9C-101B-9397-08002B2CF9AE}" pid="2" '
+        f'name="{SOURCE_KEYS_PROPERTY}"><vt:lpwstr>{keys}</vt:lpwstr></property></Properties>'
+    )
+
+
+def parse_source_keys(xml):
+    """从 docProps/custom.xml 读出原幻灯片内容键列表（未知的为None），没有记录时返回None"""
+    match = _SOURCE_KEYS_RE.search(xml)
+    if not match:
+        return None
+    return [None if key == UNKNOWN_SOURCE_KEY else key for key in match.group(1).split()]
+
+
+def short_source_key(key):
+    """内容键在输出文件中保存的形式"""
+    return key[:SOURCE_KEY_LENGTH] if key else None
+
+
+def points_to_emu(points):
+    """磅转换为EMU"""
+    return int(round(points * EMU_PER_POINT))
+
+
+def escape(text):
+    """转义XML文本中的 &、<、>（与 xml.sax.saxutils.escape 相同；
+    后者会连带导入 urllib.request，启动时多花约30毫秒）"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _relationships(rels):
+    """生成.rels文件内容，rels为 (rId, 类型, 目标) 列表"""
+    items = ''.join(
+        f'<Relationship Id="{rid}" Type="{rtype}" Target="{escape(target)}"/>'
+        for rid, rtype, target in rels
+    )
+    return f'{XML_HEADER}<Relationships xmlns="{NS_REL}">{items}</Relationships>'
+
+
+_EMPTY_SP_TREE = (
+    '<p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+    '<p:grpSpPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/>'
+    '<a:chOff x="0" y="0"/><a:chExt cx="0" cy="0"/></a:xfrm></p:grpSpPr></p:spTree>'
+)
+
+
+def _slide_xml(image_rid):
+    """只有图片背景、没有任何形状的幻灯片"""
+    return (
+        f'{XML_HEADER}<p:sld xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}">'
+        '<p:cSld><p:bg><p:bgPr>'
+        f'<a:blipFill dpi="0" rotWithShape="1"><a:blip r:embed="{image_rid}"/>'
+        '<a:srcRect/><a:stretch><a:fillRect/></a:stretch></a:blipFill>'
+        '<a:effectLst/></p:bgPr></p:bg>'
+        f'{_EMPTY_SP_TREE}</p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>'
+    )
+
+
+SLIDE_MASTER_XML = (
+    f'{XML_HEADER}<p:sldMaster xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}">'
+    '<p:cSld><p:bg><p:bgRef idx="1001"><a:schemeClr val="bg1"/></p:bgRef></p:bg>'
+    f'{_EMPTY_SP_TREE}</p:cSld>'
+    '<p:clrMap bg1="lt1" tx1="dk1" bg2="lt2" tx2="dk2" accent1="accent1" accent2="accent2" '
+    'accent3="accent3" accent4="accent4" accent5="accent5" accent6="accent6" '
+    'hlink="hlink" folHlink="folHlink"/>'
+    '<p:sldLayoutIdLst><p:sldLayoutId id="2147483649" r:id="rId1"/></p:sldLayoutIdLst>'
+    '<p:txStyles><p:titleStyle/><p:bodyStyle/><p:otherStyle/></p:txStyles>'
+    '</p:sldMaster>'
+)
+
+SLIDE_LAYOUT_XML = (
+    f'{XML_HEADER}<p:sldLayout xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}" '
+    'type="blank" preserve="1">'
+    f'<p:cSld name="Blank">{_EMPTY_SP_TREE}</p:cSld>'
+    '<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sldLayout>'
+)
+
+
+def _theme_xml():
+    """最小但完整的Office主题（PowerPoint要求母版必须关联主题）"""
+    colors = [
+        ('dk1', '<a:sysClr val="windowText" lastClr="000000"/>'),
+        ('lt1', '<a:sysClr val="window" lastClr="FFFFFF"/>'),
+        ('dk2', '<a:srgbClr val="44546A"/>'),
+        ('lt2', '<a:srgbClr val="E7E6E6"/>'),
+        ('accent1', '<a:srgbClr val="4472C4"/>'),
+        ('accent2', '<a:srgbClr val="ED7D31"/>'),
+        ('accent3', '<a:srgbClr val="A5A5A5"/>'),
+        ('accent4', '<a:srgbClr val="FFC000"/>'),
+        ('accent5', '<a:srgbClr val="5B9BD5"/>'),
+        ('accent6', '<a:srgbClr val="70AD47"/>'),
+        ('hlink', '<a:srgbClr val="0563C1"/>'),
+        ('folHlink', '<a:srgbClr val="954F72"/>'),
+    ]
+    clr_scheme = ''.join(f'<a:{name}>{value}</a:{name}>' for name, value in colors)
+    solid = '<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>'
+    line = f'<a:ln w="6350">{solid}</a:ln>'
+    effect = '<a:effectStyle><a:effectLst/></a:effectStyle>'
+    return (
+        f'{XML_HEADER}<a:theme xmlns:a="{NS_A}" name="Office Theme"><a:themeElements>'
+        f'<a:clrScheme name="Office">{clr_scheme}</a:clrScheme>'
+        '<a:fontScheme name="Office">'
+        '<a:majorFont><a:latin typeface="Calibri Light"/><a:ea typeface=""/><a:cs typeface=""/></a:majorFont>'
+        '<a:minorFont><a:latin typeface="Calibri"/><a:ea typeface=""/><a:cs typeface=""/></a:minorFont>'
+        '</a:fontScheme>'
+        '<a:fmtScheme name="Office">'
+        f'<a:fillStyleLst>{solid * 3}</a:fillStyleLst>'
+        f'<a:lnStyleLst>{line * 3}</a:lnStyleLst>'
+        f'<a:effectStyleLst>{effect * 3}</a:effectStyleLst>'
+        f'<a:bgFillStyleLst>{solid * 3}</a:bgFillStyleLst>'
+        '</a:fmtScheme></a:themeElements></a:theme>'
+    )
+
+
+PRES_PROPS_XML = f'{XML_HEADER}<p:presentationPr xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}"/>'
+VIEW_PROPS_XML = f'{XML_HEADER}<p:viewPr xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}"/>'
+TABLE_STYLES_XML = (
+    f'{XML_HEADER}<a:tblStyleLst xmlns:a="{NS_A}" def="{{5C22544A-7EE6-4342-B048-85BDC9FD1C3A}}"/>'
+)
+
+
+class ImageSlideDeckWriter:
+    """把一组图片写成每页一张背景图的PPTX
+
+    用法：
+        writer = ImageSlideDeckWriter(slide_width, slide_height)  # EMU
+        writer.add_slide("slide_001.jpg")
+        writer.save("output.pptx")
+
+    内容完全相同的图片只写入一个媒体部件，由引用它的各张幻灯片共用。
+    source_keys 为每张幻灯片对应的原幻灯片内容键时，一并记录在自定义文档属性中。
+    """
+
+    def __init__(self, slide_width=DEFAULT_SLIDE_WIDTH, slide_height=DEFAULT_SLIDE_HEIGHT):
+        self.slide_width = int(slide_width)
+        self.slide_height = int(slide_height)
+        self.source_keys = None
+        # 每张幻灯片对应的媒体序号（media 的下标）
+        self.slides = []
+        # 去重后的图片文件及其实际格式
+        self.media = []
+        self._media_exts = []
+        self._media_index = {}
+
+    def add_slide(self, image_path):
+        """追加一张以 image_path 为背景的幻灯片（格式按文件头判断）"""
+        ext = file_image_extension(image_path)
+        if ext not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f"不支持的图片格式: {image_path}")
+        key = (ext, file_sha256(image_path))
+        if key not in self._media_index:
+            self._media_index[key] = len(self.media)
+            self.media.append(image_path)
+            self._media_exts.append(ext)
+        self.slides.append(self._media_index[key])
+
+    @property
+    def slide_count(self):
+        return len(self.slides)
+
+    @property
+    def shared_slide_count(self):
+        """与前面某张幻灯片共用图片的幻灯片数"""
+        return len(self.slides) - len(self.media)
+
+    def save(self, output_path):
+        """写出PPTX；先写同目录临时文件再替换，避免留下半个文件"""
+        if not self.slides:
+            raise ValueError("没有任何幻灯片图片")
+
+        output_path = os.path.abspath(output_path)
+        output_dir = os.path.dirname(output_path)
+        os.makedirs(output_dir, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(prefix='.pptx_writer_', suffix='.tmp', dir=output_dir)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                self._write_package(zf)
+            replace_output(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return output_path
+
+    def _write_package(self, zf):
+        media_names = []
+        for index, (image_path, ext) in enumerate(zip(self.media, self._media_exts), 1):
+            media_names.append(f'image{index}.{ext}')
+            # 图片本身已压缩，直接存储以节省时间
+            zf.write(image_path, f'ppt/media/{media_names[-1]}', compress_type=zipfile.ZIP_STORED)
+        self._write_deck_parts(zf, media_names)
+
+    def _write_deck_parts(self, zf, media_names):
+        """写出媒体以外的所有部件；media_names 为 self.media 对应的 ppt/media 下的文件名"""
+        count = len(self.slides)
+        image_exts = {name.rsplit('.', 1)[1] for name in media_names}
+
+        for index, media_index in enumerate(self.slides, 1):
+            zf.writestr(f'ppt/slides/slide{index}.xml', _slide_xml('rId2'))
+            zf.writestr(f'ppt/slides/_rels/slide{index}.xml.rels', _relationships([
+                ('rId1', f'{RT}/slideLayout', '../slideLayouts/slideLayout1.xml'),
+                ('rId2', f'{RT}/image', f'../media/{media_names[media_index]}'),
+            ]))
+
+        has_keys = self.source_keys is not None and len(self.source_keys) == count
+        zf.writestr('[Content_Types].xml', self._content_types_xml(count, image_exts, has_keys))
+        package_rels = [
+            ('rId1', f'{RT}/officeDocument', 'ppt/presentation.xml'),
+            ('rId2', 'http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties',
+             'docProps/core.xml'),
+            ('rId3', f'{RT}/extended-properties', 'docProps/app.xml'),
+        ]
+        if has_keys:
+            package_rels.append(('rId4', f'{RT}/custom-properties', CUSTOM_PROPERTIES_PART))
+            zf.writestr(CUSTOM_PROPERTIES_PART, custom_properties_xml(self.source_keys))
+        zf.writestr('_rels/.rels', _relationships(package_rels))
+        zf.writestr('docProps/core.xml', (
+            f'{XML_HEADER}<cp:coreProperties '
+            'xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+            'xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>Image Slides</dc:title>'
+            '</cp:coreProperties>'
+        ))
+        zf.writestr('docProps/app.xml', (
+            f'{XML_HEADER}<Properties '
+            'xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+            f'<Application>PPT to Image Slides</Application><Slides>{count}</Slides></Properties>'
+        ))
+
+        zf.writestr('ppt/presentation.xml', self._presentation_xml(count))
+        pres_rels = [
+            ('rId1', f'{RT}/slideMaster', 'slideMasters/slideMaster1.xml'),
+            ('rId2', f'{RT}/theme', 'theme/theme1.xml'),
+            ('rId3', f'{RT}/presProps', 'presProps.xml'),
+            ('rId4', f'{RT}/viewProps', 'viewProps.xml'),
+            ('rId5', f'{RT}/tableStyles', 'tableStyles.xml'),
+        ]
+        pres_rels += [
+            (f'rId{index + 5}', f'{RT}/slide', f'slides/slide{index}.xml')
+            for index in range(1, count + 1)
+        ]
+        zf.writestr('ppt/_rels/presentation.xml.rels', _relationships(pres_rels))
+
+        zf.writestr('ppt/slideMasters/slideMaster1.xml', SLIDE_MASTER_XML)
+        zf.writestr('ppt/slideMasters/_rels/slideMaster1.xml.rels', _relationships([
+            ('rId1', f'{RT}/slideLayout', '../slideLayouts/slideLayout1.xml'),
+            ('rId2', f'{RT}/theme', '../theme/theme1.xml'),
+        ]))
+        zf.writestr('ppt/slideLayouts/slideLayout1.xml', SLIDE_LAYOUT_XML)
+        zf.writestr('ppt/slideLayouts/_rels/slideLayout1.xml.rels', _relationships([
+            ('rId1', f'{RT}/slideMaster', '../slideMasters/slideMaster1.xml'),
+        ]))
+        zf.writestr('ppt/theme/theme1.xml', _theme_xml())
+        zf.writestr('ppt/presProps.xml', PRES_PROPS_XML)
+        zf.writestr('ppt/viewProps.xml', VIEW_PROPS_XML)
+        zf.writestr('ppt/tableStyles.xml', TABLE_STYLES_XML)
+
+    def _presentation_xml(self, count):
+        slide_ids = ''.join(
+            f'<p:sldId id="{255 + index}" r:id="rId{index + 5}"/>'
+            for index in range(1, count + 1)
+        )
+        return (
+            f'{XML_HEADER}<p:presentation xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}" '
+            'saveSubsetFonts="1">'
+            '<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+            f'<p:sldIdLst>{slide_ids}</p:sldIdLst>'
+            f'<p:sldSz cx="{self.slide_width}" cy="{self.slide_height}"/>'
+            '<p:notesSz cx="6858000" cy="9144000"/>'
+            '</p:presentation>'
+        )
+
+    def _content_types_xml(self, count, image_exts, custom_properties=False):
+        defaults = [
+            ('rels', 'application/vnd.openxmlformats-package.relationships+xml'),
+            ('xml', 'application/xml'),
+        ]
+        defaults += [(ext, IMAGE_CONTENT_TYPES[ext]) for ext in sorted(image_exts)]
+        pml = 'application/vnd.openxmlformats-officedocument.presentationml'
+        overrides = [
+            ('/ppt/presentation.xml', f'{pml}.presentation.main+xml'),
+            ('/ppt/slideMasters/slideMaster1.xml', f'{pml}.slideMaster+xml'),
+            ('/ppt/slideLayouts/slideLayout1.xml', f'{pml}.slideLayout+xml'),
+            ('/ppt/theme/theme1.xml', 'application/vnd.openxmlformats-officedocument.theme+xml'),
+            ('/ppt/presProps.xml', f'{pml}.presProps+xml'),
+            ('/ppt/viewProps.xml', f'{pml}.viewProps+xml'),
+            ('/ppt/tableStyles.xml', f'{pml}.tableStyles+xml'),
+            ('/docProps/core.xml', 'application/vnd.openxmlformats-package.core-properties+xml'),
+            ('/docProps/app.xml', 'application/vnd.openxmlformats-officedocument.extended-properties+xml'),
+        ]
+        if custom_properties:
+            overrides.append((f'/{CUSTOM_PROPERTIES_PART}', CUSTOM_PROPERTIES_TYPE))
+        overrides += [
+            (f'/ppt/slides/slide{index}.xml', f'{pml}.slide+xml')
+            for index in range(1, count + 1)
+        ]
+        items = ''.join(f'<Default Extension="{ext}" ContentType="{ct}"/>' for ext, ct in defaults)
+        items += ''.join(f'<Override PartName="{name}" ContentType="{ct}"/>' for name, ct in overrides)
+        return (
+            f'{XML_HEADER}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'{items}</Types>'
+        )
+
+
+class StreamingDeckWriter(ImageSlideDeckWriter):
+    """边转换边写出的PPTX：每张图片编码完成后立即写入输出zip
+
+    图片数据不经过临时文件，占用的内存和磁盘与幻灯片数量无关；
+    幻灯片可以按任意顺序、从多个线程加入，save() 时按序号排列。
+    输出先写到同目录的临时文件，save() 成功后才替换目标文件，出错时调用 abort()。
+
+    用法：
+        writer = StreamingDeckWriter("output.pptx", slide_width, slide_height)  # EMU
+        writer.add_image(1, jpeg_bytes)
+        writer.share_image(2, 1)   # 第2张与第1张使用同一张图片
+        writer.save()
+    """
+
+    def __init__(self, output_path, slide_width=DEFAULT_SLIDE_WIDTH,
+                 slide_height=DEFAULT_SLIDE_HEIGHT):
+        super().__init__(slide_width, slide_height)
+        self.output_path = os.path.abspath(output_path)
+        output_dir = os.path.dirname(self.output_path)
+        os.makedirs(output_dir, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(prefix='.pptx_writer_', suffix='.tmp',
+                                              dir=output_dir)
+        os.close(fd)
+        self._zip = zipfile.ZipFile(self._tmp_path, 'w', zipfile.ZIP_DEFLATED)
+        self._slide_media = {}
+        self._media_names = []
+        self._lock = threading.Lock()
+
+    def add_image(self, index, data, ext=None):
+        """把第 index 张幻灯片的图片数据写入输出（线程安全）；ext 为None时按文件头判断"""
+        ext = ext or image_extension(data) or 'jpg'
+        if ext not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f"不支持的图片格式: {ext}")
+        key = (ext, hashlib.sha256(data).hexdigest())
+        with self._lock:
+            if key not in self._media_index:
+                media_index = len(self._media_names)
+                name = f'image{media_index + 1}.{ext}'
+                # 图片本身已压缩，直接存储
+                self._zip.writestr(f'ppt/media/{name}', data, compress_type=zipfile.ZIP_STORED)
+                self._media_index[key] = media_index
+                self._media_names.append(name)
+            self._slide_media[index] = self._media_index[key]
+
+    def share_image(self, index, original):
+        """第 index 张幻灯片使用第 original 张的图片"""
+        with self._lock:
+            self._slide_media[index] = self._slide_media[original]
+
+    def has_image(self, index):
+        with self._lock:
+            return index in self._slide_media
+
+    @property
+    def slide_count(self):
+        return len(self._slide_media)
+
+    @property
+    def shared_slide_count(self):
+        return len(self._slide_media) - len(self._media_names)
+
+    def add_slide(self, image_path):
+        raise TypeError("StreamingDeckWriter 使用 add_image 按序号加入图片")
+
+    def save(self, output_path=None):
+        """写出其余部件并替换目标文件"""
+        if output_path is not None and os.path.abspath(output_path) != self.output_path:
+            raise ValueError("StreamingDeckWriter 的输出路径在创建时指定")
+        with self._lock:
+            if not self._slide_media:
+                self.abort()
+                raise ValueError("没有任何幻灯片图片")
+            self.slides = [self._slide_media[i] for i in sorted(self._slide_media)]
+            self.media = list(self._media_names)
+            try:
+                self._write_deck_parts(self._zip, self._media_names)
+                self._zip.close()
+                replace_output(self._tmp_path, self.output_path)
+            except BaseException:
+                self.abort()
+                raise
+        return self.output_path
+
+    def abort(self):
+        """放弃输出，删除临时文件"""
+        try:
+            self._zip.close()
+        except Exception:
+            pass
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
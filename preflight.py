@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+不启动渲染后端的预检
+直接读取PPTX压缩包得到页数、幻灯片尺寸、隐藏页、媒体清单、每张幻灯片的内容键
+（与渲染缓存的键相同）和是否有可见内容，并估计渲染耗时。启动PowerPoint、打开演示文稿
+之前就能据此排队、拒绝过大的演示文稿、查询渲染缓存。只读XML和关系文件，
+媒体只取压缩包目录中的大小；内容键需要对引用的部件（包括媒体）算一次哈希，
+只在给出转换设置时计算。
+
+示例：
+    python preflight.py 讲义.pptx
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+
+from pptx_package import PptxPackage
+from pptx_writer import EMU_PER_POINT
+from render_cache import package_content_keys
+from render_check import package_content_flags
+
+# 这些关系指向的部件计入幻灯片的媒体
+_MEDIA_REL_TYPES = {'image', 'media', 'video', 'audio', 'oleObject', 'package'}
+
+_HIDDEN_RE = re.compile(rb'<p:sld\b[^>]*\bshow="(0|false)"')
+
+# 估计渲染代价：每张幻灯片 1 个单位，引用的媒体每 MB 再加 MEDIA_COST_PER_MB 个单位
+MEDIA_COST_PER_MB = 0.25
+
+# 各渲染后端打开演示文稿的大致耗时和每个代价单位的大致耗时（秒），只用于估计
+RENDERER_TIMINGS = {
+    'powerpoint': {'open': 3.0, 'unit': 0.25},
+    'libreoffice': {'open': 5.0, 'unit': 0.15},
+    'fake': {'open': 0.05, 'unit': 0.01},
+}
+
+
+class PreflightError(Exception):
+    """文件不是可读取的PPTX（例如旧格式 .ppt 或压缩包损坏）"""
+
+
+class SlideInfo:
+    """一张幻灯片的预检结果"""
+
+    __slots__ = ('index', 'part', 'hidden', 'has_content', 'media_count', 'media_bytes',
+                 'content_key')
+
+    def __init__(self, index, part, hidden, has_content, media_count, media_bytes, content_key):
+        self.index = index
+        self.part = part
+        self.hidden = hidden
+        self.has_content = has_content
+        self.media_count = media_count
+        self.media_bytes = media_bytes
+        self.content_key = content_key
+
+    @property
+    def cost(self):
+        return 1.0 + self.media_bytes / 1024 / 1024 * MEDIA_COST_PER_MB
+
+    def to_dict(self):
+        return {
+            'index': self.index, 'hidden': self.hidden, 'has_content': self.has_content,
+            'media_count': self.media_count, 'media_bytes': self.media_bytes,
+            'content_key': self.content_key, 'cost': round(self.cost, 3),
+        }
+
+
+class DeckInfo:
+    """整份演示文稿的预检结果；slide_size 单位为EMU"""
+
+    def __init__(self, path, file_bytes, slide_size, slides, media, seconds):
+        self.path = path
+        self.file_bytes = file_bytes
+        self.slide_size = slide_size
+        self.slides = slides
+        # 包中全部媒体部件 {路径: 解压后大小}
+        self.media = media
+        # 预检本身的耗时
+        self.seconds = seconds
+
+    @property
+    def slide_count(self):
+        return len(self.slides)
+
+    @property
+    def slide_size_points(self):
+        return (self.slide_size[0] / EMU_PER_POINT, self.slide_size[1] / EMU_PER_POINT)
+
+    @property
+    def hidden_count(self):
+        return sum(1 for slide in self.slides if slide.hidden)
+
+    @property
+    def media_bytes(self):
+        return sum(self.media.values())
+
+    @property
+    def content_keys(self):
+        return [slide.content_key for slide in self.slides]
+
+    @property
+    def content_flags(self):
+        return [slide.has_content for slide in self.slides]
+
+    @property
+    def cost(self):
+        return sum(slide.cost for slide in self.slides)
+
+    def estimated_seconds(self, renderer_name=None):
+        """按 RENDERER_TIMINGS 粗略估计的转换耗时"""
+        timings = RENDERER_TIMINGS.get(renderer_name, RENDERER_TIMINGS['powerpoint'])
+        return timings['open'] + self.cost * timings['unit']
+
+    def to_dict(self, slides=False):
+        width, height = self.slide_size_points
+        result = {
+            'path': self.path,
+            'file_bytes': self.file_bytes,
+            'slide_count': self.slide_count,
+            'hidden_count': self.hidden_count,
+            'slide_size': {'width': round(width, 2), 'height': round(height, 2)},
+            'media_count': len(self.media),
+            'media_bytes': self.media_bytes,
+            'cost': round(self.cost, 3),
+            'estimated_seconds': {name: round(self.estimated_seconds(name), 1)
+                                  for name in RENDERER_TIMINGS},
+            'preflight_seconds': round(self.seconds, 4),
+        }
+        if slides:
+            result['slides'] = [slide.to_dict() for slide in self.slides]
+        return result
+
+
+def _slide_media(package, slide_part, sizes):
+    """幻灯片直接引用的媒体部件 (个数, 字节数)"""
+    targets = {target for rtype, target, external in package.relationships(slide_part).values()
+               if rtype in _MEDIA_REL_TYPES and not external}
+    return len(targets), sum(sizes.get(target, 0) for target in targets)
+
+
+def preflight(pptx_path, settings=None):
+    """读取PPTX的元数据；settings 为影响输出的转换设置（参与内容键，见 render_cache），
+    为None时不计算内容键（content_key 为None）
+
+    文件不是可读取的PPTX时抛出 PreflightError。
+    """
+    start = time.perf_counter()
+    pptx_path = os.path.abspath(pptx_path)
+    try:
+        package = PptxPackage(pptx_path)
+    except (OSError, zipfile.BadZipFile) as e:
+        raise PreflightError(f"无法读取PPTX: {e}")
+    with package:
+        try:
+            slide_parts = package.slide_parts
+            slide_size = package.slide_size()
+            sizes = {info.filename: info.file_size for info in package.zip.infolist()}
+            if settings is not None:
+                keys = package_content_keys(package, settings)
+            else:
+                keys = [None] * len(slide_parts)
+            flags = package_content_flags(package)
+            slides = []
+            for index, part in enumerate(slide_parts, 1):
+                head = package.read(part)[:2048]
+                media_count, media_bytes = _slide_media(package, part, sizes)
+                slides.append(SlideInfo(index, part, bool(_HIDDEN_RE.search(head)),
+                                        flags[index - 1], media_count, media_bytes,
+                                        keys[index - 1]))
+        except KeyError as e:
+            raise PreflightError(f"PPTX缺少必需的部件: {e}")
+    if slide_size is None:
+        raise PreflightError("PPTX中没有幻灯片尺寸")
+    media = {name: size for name, size in sizes.items() if name.startswith('ppt/media/')}
+    return DeckInfo(pptx_path, os.path.getsize(pptx_path), slide_size, slides, media,
+                    time.perf_counter() - start)
+
+
+def try_preflight(pptx_path, settings=None):
+    """同 preflight，文件不是可读取的PPTX时返回None"""
+    try:
+        return preflight(pptx_path, settings)
+    except PreflightError:
+        return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("用法: python preflight.py 文件.pptx [--slides]", file=sys.stderr)
+        return 2
+    show_slides = '--slides' in argv
+    status = 0
+    reports = []
+    for path in (arg for arg in argv if arg != '--slides'):
+        try:
+            info = preflight(path, {} if show_slides else None)
+            reports.append(info.to_dict(slides=show_slides))
+        except (PreflightError, OSError) as e:
+            reports.append({'path': path, 'error': str(e)})
+            status = 1
+    json.dump(reports if len(reports) > 1 else reports[0], sys.stdout, ensure_ascii=False,
+              indent=2)
+    sys.stdout.write('\n')
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按内容寻址的幻灯片渲染缓存
+每张幻灯片的键 = 幻灯片XML + 其引用的版式/母版/主题/媒体等部件 + 渲染设置 的哈希，
+修改一页后重新转换时只有这一页需要重新渲染。缓存有容量上限，按最近使用淘汰。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+from pptx_package import PptxPackage
+
+# 默认缓存容量上限（字节）
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+# 这些关系不影响幻灯片本身的渲染结果，不计入哈希
+_IGNORED_REL_TYPES = {'notesSlide', 'slide', 'comments', 'commentAuthors', 'tags'}
+
+# 幻灯片中含有页码域时，渲染结果依赖其在演示文稿中的位置
+_SLIDE_NUMBER_MARKER = b'type="slidenum"'
+
+
+def app_cache_root():
+    """本工具的本地数据根目录：Windows在LOCALAPPDATA下，其他系统在 ~/.cache 下"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ppt-to-image-slides')
+
+
+def default_cache_dir():
+    """默认渲染缓存目录"""
+    return os.path.join(app_cache_root(), 'render-cache')
+
+
+def slide_content_keys(pptx_path, settings):
+    """计算每张幻灯片的缓存键（按放映顺序）
+
+    settings 为影响渲染/编码结果的设置（可JSON序列化的字典）。
+    文件不是PPTX（例如 .ppt）或无法解析时返回None。
+    """
+    try:
+        package = PptxPackage(pptx_path)
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+    with package:
+        try:
+            return package_content_keys(package, settings)
+        except KeyError:
+            return None
+
+
+def package_content_keys(package, settings):
+    """slide_content_keys 的实现，package 为已打开的 PptxPackage；缺少必需部件时抛出 KeyError"""
+    slide_parts = package.slide_parts
+    slide_size = package.slide_size()
+
+    settings_blob = json.dumps(
+        {'settings': settings, 'slide_size': slide_size}, sort_keys=True
+    ).encode('utf-8')
+    part_digests = {}
+
+    def part_digest(part_name):
+        # 部件本身的哈希，版式、母版、主题等在幻灯片之间共享，只算一次
+        if part_name not in part_digests:
+            try:
+                data = package.read(part_name)
+            except KeyError:
+                data = b''
+            part_digests[part_name] = hashlib.sha256(data).digest()
+        return part_digests[part_name]
+
+    keys = []
+    for index, slide_part in enumerate(slide_parts, 1):
+        digest = hashlib.sha256(settings_blob)
+        # 沿关系遍历该幻灯片依赖的所有部件，按路径排序保证稳定
+        seen = set()
+        pending = [slide_part]
+        while pending:
+            part_name = pending.pop()
+            if part_name in seen:
+                continue
+            seen.add(part_name)
+            for rtype, target, external in package.relationships(part_name).values():
+                if external:
+                    digest.update(f'external:{rtype}:{target}'.encode('utf-8'))
+                elif rtype not in _IGNORED_REL_TYPES:
+                    pending.append(target)
+        for part_name in sorted(seen):
+            digest.update(part_name.encode('utf-8'))
+            digest.update(part_digest(part_name))
+
+        if _SLIDE_NUMBER_MARKER in package.read(slide_part):
+            digest.update(f'slide-number:{index}'.encode('utf-8'))
+        keys.append(digest.hexdigest())
+    return keys
+
+
+class RenderCache:
+    """磁盘上的幻灯片图片缓存（多进程共享同一目录是安全的）
+
+    文件按键的前两位分子目录存放；命中时刷新修改时间，
+    超出容量时删除修改时间最早的文件（LRU）。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key, ext='.jpg'):
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def _entries(self):
+        """遍历缓存文件：(路径, 大小, 修改时间)"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def read(self, key):
+        """命中时返回缓存的图片数据，否则返回None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def get(self, key, dest_path):
+        """命中时把缓存图片写到 dest_path 并返回True"""
+        data = self.read(key)
+        if data is None:
+            return False
+        with open(dest_path, 'wb') as f:
+            f.write(data)
+        return True
+
+    def put(self, key, image_path):
+        """把图片文件存入缓存"""
+        self._store(key, lambda tmp_path: shutil.copyfile(image_path, tmp_path))
+
+    def put_data(self, key, data):
+        """把内存中的图片数据存入缓存"""
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        self._store(key, write)
+
+    def copy(self, source_key, key):
+        """让 key 使用与 source_key 相同的缓存图片（内容相同的幻灯片）"""
+        source = self._path(source_key)
+        if os.path.exists(source):
+            self._store(key, lambda tmp_path: shutil.copyfile(source, tmp_path))
+
+    def _store(self, key, write):
+        """先由 write(临时路径) 写临时文件，再原子替换为缓存文件"""
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path, None)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            write(tmp_path)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._total_bytes += size
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """删除最久未使用的文件，直到总大小降到上限的90%"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._total_bytes = total
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._total_bytes = 0
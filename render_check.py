@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染结果检查
+PowerPoint偶尔会导出整页空白（或全透明）的图片，v2.0.1 时遇到的空白页就是这种情况。
+对解码后的位图做一次灰度直方图统计（有NumPy时用NumPy），得到方差和主色占比；
+再结合原幻灯片是否有内容判断是否需要重新渲染
+"""
+
+import zipfile
+import xml.etree.ElementTree as ET
+
+from encoders import optional_module
+from pptx_package import PptxPackage
+
+NS_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+NS_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+# 主色（出现最多的灰度值）占比达到这个值即视为空白页；
+# 白底上只有一行小字的幻灯片通常在 0.97-0.99 之间
+BLANK_DOMINANT_FRACTION = 0.999
+# 灰度方差不超过这个值（所有像素都在均值附近一两级以内，只有抗锯齿或压缩噪声）
+# 也视为空白页；浅灰色文字在白底上占 2% 时方差约为 12
+BLANK_MAX_VARIANCE = 2.0
+
+# 本身就可见的图形元素
+_VISIBLE_SHAPES = {f'{NS_P}pic', f'{NS_P}graphicFrame', f'{NS_P}cxnSp', f'{NS_P}contentPart'}
+
+# 渲染出来不是纯色的背景填充（图片、渐变、图案）
+_PATTERNED_FILLS = {f'{NS_A}blipFill', f'{NS_A}gradFill', f'{NS_A}pattFill'}
+
+# 形状的填充或线条有颜色
+_FILLS = _PATTERNED_FILLS | {f'{NS_A}solidFill', f'{NS_A}grpFill'}
+
+
+def _paint(properties, style_ref):
+    """填充或线条是否可见：properties 为 spPr 或 a:ln，显式的 noFill / 填充优先，
+    没有时看形状样式（p:style 中 fillRef / lnRef 的 idx 为0表示不绘制）"""
+    if properties is not None:
+        for child in properties:
+            if child.tag == f'{NS_A}noFill':
+                return False
+            if child.tag in _FILLS:
+                return True
+    return style_ref is not None and style_ref.get('idx', '0') != '0'
+
+
+def _shape_visible(shape):
+    """p:sp 是否会画出东西：有文字，或者填充、线条可见"""
+    if ''.join(t.text or '' for t in shape.iter(f'{NS_A}t')).strip():
+        return True
+    if shape.find(f'{NS_P}nvSpPr/{NS_P}nvPr/{NS_P}ph') is not None:
+        # 空占位符在放映和导出时不显示
+        return False
+    sp_pr = shape.find(f'{NS_P}spPr')
+    style = shape.find(f'{NS_P}style')
+    fill_ref = style.find(f'{NS_A}fillRef') if style is not None else None
+    line_ref = style.find(f'{NS_A}lnRef') if style is not None else None
+    line = sp_pr.find(f'{NS_A}ln') if sp_pr is not None else None
+    return _paint(sp_pr, fill_ref) or _paint(line, line_ref)
+
+
+class ImageStats:
+    """灰度直方图统计"""
+
+    __slots__ = ('pixels', 'mean', 'variance', 'dominant_fraction')
+
+    def __init__(self, histogram):
+        total = sum(histogram)
+        self.pixels = total
+        if not total:
+            self.mean = self.variance = 0.0
+            self.dominant_fraction = 1.0
+            return
+        mean = sum(value * count for value, count in enumerate(histogram)) / total
+        self.mean = mean
+        self.variance = sum(count * (value - mean) ** 2
+                            for value, count in enumerate(histogram)) / total
+        self.dominant_fraction = max(histogram) / total
+
+    @property
+    def blank(self):
+        return (self.dominant_fraction >= BLANK_DOMINANT_FRACTION
+                or self.variance <= BLANK_MAX_VARIANCE)
+
+
+def gray_histogram(image):
+    """256级灰度直方图（一次遍历）"""
+    gray = image if image.mode == 'L' else image.convert('L')
+    numpy = optional_module('numpy')
+    if numpy is not None:
+        return numpy.bincount(numpy.asarray(gray).ravel(), minlength=256).tolist()
+    return gray.histogram()
+
+
+def image_stats(image):
+    return ImageStats(gray_histogram(image))
+
+
+def check_render(image, expect_content=True):
+    """检查已解码的幻灯片位图，正常返回None，否则返回原因
+
+    expect_content 表示原幻灯片上有可见内容（见 package_content_flags）；只有纯色背景、
+    没有图形的幻灯片渲染成纯色是正常的，不做检查。
+    """
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        alpha = image.getchannel('A') if image.mode != 'P' else image.convert('RGBA').getchannel('A')
+        if alpha.getextrema() == (0, 0):
+            return '图片完全透明'
+    if not expect_content:
+        return None
+    stats = image_stats(image)
+    if stats.blank:
+        return (f"图片几乎是纯色（主色占 {stats.dominant_fraction:.2%}，"
+                f"灰度方差 {stats.variance:.2f}）")
+    return None
+
+
+def _has_visible_content(root):
+    """幻灯片自身的形状树中是否有会被渲染出来的内容
+
+    纯色背景（或引用主题背景的 bgRef）不算：只有这样的背景时渲染结果本来就是纯色。
+    """
+    background = root.find(f'{NS_P}cSld/{NS_P}bg/{NS_P}bgPr')
+    if background is not None and any(child.tag in _PATTERNED_FILLS for child in background):
+        return True
+    sp_tree = root.find(f'{NS_P}cSld/{NS_P}spTree')
+    if sp_tree is None:
+        return False
+    for element in sp_tree.iter():
+        if element.tag in _VISIBLE_SHAPES:
+            return True
+        if element.tag == f'{NS_P}sp' and _shape_visible(element):
+            # 没有文字、填充和线条的形状（例如空文本框）画不出任何东西
+            return True
+    return False
+
+
+def slide_content_flags(pptx_path):
+    """按放映顺序返回每张幻灯片是否有自身的可见内容；无法解析（如 .ppt）时返回None"""
+    try:
+        with PptxPackage(pptx_path) as package:
+            return package_content_flags(package)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def package_content_flags(package):
+    """slide_content_flags 的实现，package 为已打开的 PptxPackage"""
+    flags = []
+    for part in package.slide_parts:
+        try:
+            flags.append(_has_visible_content(ET.fromstring(package.read(part))))
+        except ET.ParseError:
+            flags.append(True)
+    return flags
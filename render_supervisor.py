@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染后端看门狗
+PowerPoint的 Export / Open 偶尔会无限期卡住，以前只能等用户结束进程。
+SupervisedRenderer 把后端的每次调用放到专用线程中执行并设置期限：超时后
+结束卡住的后端进程（BaseRenderer.kill），重新创建后端、重新打开演示文稿，
+按指数退避加随机抖动（Backoff）等待后重试这次调用。
+固定时长的等待也改为按需轮询（wait_until / remove_tree）：条件一满足就继续，
+只在条件迟迟不满足时才逐渐放慢。
+"""
+
+import concurrent.futures
+import queue
+import random
+import shutil
+import threading
+import time
+
+from renderers import BaseRenderer, RendererError
+
+# 各类后端调用的期限（秒）：创建后端、打开演示文稿、渲染一张幻灯片、关闭演示文稿或退出后端
+DEFAULT_TIMEOUTS = {'create': 120, 'open': 600, 'slide': 120, 'close': 60}
+# 批量渲染每多一张幻灯片，期限增加单张期限的这个比例（批量渲染每张比逐张快得多，
+# 按张数直接累加的话，一整份演示文稿的导出卡住要很久才能发现）
+BULK_TIMEOUT_FACTOR = 0.1
+# 一次调用因后端卡住或崩溃而重建后端、重试的次数
+RESTARTS_PER_CALL = 2
+# 结束后端进程后等待卡住的调用返回的时间（秒），超时后放弃该线程
+KILL_GRACE = 10
+# 删除临时目录时等待文件句柄释放的最长时间（秒）
+CLEANUP_TIMEOUT = 5.0
+
+
+class RenderTimeout(RendererError):
+    """渲染后端调用超过期限，重建后端后仍然失败"""
+
+
+class Backoff:
+    """指数退避加随机抖动
+
+    第 n 次（从0开始）重试前等待 base * factor**n 秒，不超过 max_delay，
+    再乘以 [1-jitter, 1] 之间的随机数，多个进程同时重试时不会步调一致。
+    """
+
+    def __init__(self, base=0.1, factor=2.0, max_delay=5.0, jitter=0.5, rng=None):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base * self.factor ** attempt)
+        return delay * (1 - self.jitter * self.rng.random())
+
+    def wait(self, attempt, cancel_event=None):
+        """等待第 attempt 次重试前的时间；cancel_event 被设置时提前返回。返回等待的秒数"""
+        delay = self.delay(attempt)
+        if cancel_event is not None:
+            cancel_event.wait(delay)
+        else:
+            time.sleep(delay)
+        return delay
+
+
+def wait_until(predicate, timeout, interval=0.01, max_interval=0.25):
+    """轮询 predicate() 直到为真，间隔从 interval 起逐次加倍（不超过 max_interval）；
+    timeout 秒内未满足时返回False"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if predicate():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
+def remove_tree(path, timeout=CLEANUP_TIMEOUT):
+    """删除目录；文件仍被占用（Windows下后端刚关闭时常见）时轮询重试，最多 timeout 秒。
+    删除成功（或目录已不存在）时返回True"""
+    def attempt():
+        try:
+            shutil.rmtree(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        return True
+    return wait_until(attempt, timeout)
+
+
+class _CallThread:
+    """在专用线程中依次执行调用（COM对象只能在创建它的线程中使用）"""
+
+    def __init__(self, name, com=False):
+        self.com = com
+        self._calls = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        if self.com:
+            import pythoncom
+            pythoncom.CoInitialize()
+        try:
+            while True:
+                item = self._calls.get()
+                if item is None:
+                    break
+                func, args, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            if self.com:
+                pythoncom.CoUninitialize()
+
+    def call(self, timeout, func, *args):
+        """执行 func(*args) 并等待结果；超过 timeout 秒抛出 concurrent.futures.TimeoutError"""
+        future = concurrent.futures.Future()
+        self._calls.put((func, args, future))
+        return future.result(timeout)
+
+    def stop(self):
+        self._calls.put(None)
+
+
+class SupervisedRenderer(BaseRenderer):
+    """给渲染后端加上调用期限的包装，对外与被包装的后端相同
+
+    factory 创建被包装的后端（不带看门狗）；timeouts 覆盖 DEFAULT_TIMEOUTS 中的期限。
+    普通的渲染错误原样抛出（由转换流程重试）；调用超时或后端进程已退出时
+    结束并重建后端、重新打开演示文稿，最多重试 restarts 次，仍失败时抛出 RenderTimeout。
+    """
+
+    def __init__(self, factory, name, log=None, timeouts=None, restarts=RESTARTS_PER_CALL,
+                 backoff=None):
+        super().__init__(log=log)
+        self.factory = factory
+        self.name = name
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.restarts = restarts
+        self.backoff = backoff or Backoff(base=0.5, max_delay=10.0)
+        # 本实例重建后端的次数
+        self.restart_count = 0
+        self.renderer = None
+        self._thread = None
+        self._spawn()
+
+    # ---- 后端线程管理 ----
+
+    def _spawn(self):
+        """在新线程中创建后端"""
+        self._thread = _CallThread(f"renderer-{self.name}", com=self.name == 'powerpoint')
+        try:
+            self.renderer = self._thread.call(self.timeouts['create'], self.factory)
+        except concurrent.futures.TimeoutError:
+            self._thread.stop()
+            self._thread = None
+            raise RenderTimeout(f"创建渲染后端 {self.name} 超过 {self.timeouts['create']} 秒")
+        except BaseException:
+            self._thread.stop()
+            self._thread = None
+            raise
+        self.supports_frames = self.renderer.supports_frames
+        self.supports_bulk = self.renderer.supports_bulk
+        self.renderer.set_resolution(self.dpi, self.target_width)
+
+    def _kill(self):
+        """结束当前后端（可能正卡在某个调用中）并丢弃其线程"""
+        renderer, thread = self.renderer, self._thread
+        self.renderer = self._thread = None
+        if thread is None:
+            return
+        if renderer is not None:
+            try:
+                renderer.kill()
+            except Exception as kill_error:
+                self.log(f"结束渲染后端时出错: {kill_error}")
+        thread.stop()
+        if not wait_until(lambda: not thread.thread.is_alive(), KILL_GRACE):
+            self.log("卡住的渲染调用在结束后端后仍未返回，放弃该线程")
+
+    def _restart(self, attempt):
+        """重建后端；已打开演示文稿（知道页数）时重新打开"""
+        self._kill()
+        self.restart_count += 1
+        self.backoff.wait(attempt)
+        self._spawn()
+        if self.deck_path and self.slide_count:
+            self._thread.call(self.timeouts['open'], self.renderer.open, self.deck_path)
+            if self.renderer.slide_count != self.slide_count:
+                raise RendererError(f"重新打开后页数为 {self.renderer.slide_count}，"
+                                    f"原为 {self.slide_count}")
+
+    def _call(self, action, timeout, method, *args):
+        """在后端线程中调用 self.renderer.<method>(*args)，超时或后端退出时重建后重试"""
+        for attempt in range(self.restarts + 1):
+            try:
+                if self.renderer is None:
+                    self._restart(attempt)
+                return self._thread.call(timeout, getattr(self.renderer, method), *args)
+            except concurrent.futures.TimeoutError:
+                self.log(f"渲染后端{action}超过 {timeout:g} 秒无响应，结束并重新启动后端")
+                self._kill()
+            except RendererError:
+                raise
+            except Exception as call_error:
+                if self._backend_alive():
+                    raise
+                self.log(f"渲染后端在{action}时退出（{call_error}），重新启动后端")
+                self._kill()
+        raise RenderTimeout(f"渲染后端{action}失败，已重新启动 {self.restarts} 次")
+
+    def _backend_alive(self):
+        if self.renderer is None:
+            return False
+        try:
+            return self._thread.call(self.timeouts['close'], self.renderer.is_alive)
+        except Exception:
+            return False
+
+    # ---- 渲染后端接口 ----
+
+    def set_resolution(self, dpi=None, target_width=None):
+        super().set_resolution(dpi, target_width)
+        if self.renderer is not None:
+            self.renderer.set_resolution(self.dpi, self.target_width)
+
+    def is_alive(self):
+        return self._backend_alive()
+
+    def _open(self, deck_path):
+        self._call('打开演示文稿', self.timeouts['open'], 'open', deck_path)
+        self.slide_count = self.renderer.slide_count
+        self.slide_size = self.renderer.slide_size
+
+    def prefetch(self, indices):
+        if self.renderer is not None:
+            self.renderer.bulk_enabled = self.bulk_enabled
+            self._call('预告幻灯片', self.timeouts['slide'], 'prefetch', indices)
+
+    def _slide_timeout(self, index):
+        # 这次调用触发批量渲染时要渲染一整批
+        slides = self.renderer.expected_slides(index) if self.renderer is not None else 1
+        if slides <= 1:
+            return self.timeouts['slide']
+        return self.timeouts['slide'] * (1 + BULK_TIMEOUT_FACTOR * slides)
+
+    def render_slide(self, index, output_path):
+        return self._call(f'导出幻灯片 {index} ', self._slide_timeout(index),
+                          'render_slide', index, output_path)
+
+    def render_frame(self, index):
+        return self._call(f'导出幻灯片 {index} ', self._slide_timeout(index),
+                          'render_frame', index)
+
+    def _close(self):
+        if self.renderer is None:
+            return
+        try:
+            self._thread.call(self.timeouts['close'], self.renderer.close)
+        except concurrent.futures.TimeoutError:
+            self.log(f"关闭演示文稿超过 {self.timeouts['close']} 秒无响应，结束后端")
+            self._kill()
+
+    def shutdown(self):
+        super().shutdown()
+        if self.renderer is None:
+            return
+        try:
+            self._thread.call(self.timeouts['close'], self.renderer.shutdown)
+        except concurrent.futures.TimeoutError:
+            self.log(f"退出渲染后端超过 {self.timeouts['close']} 秒无响应，强制结束")
+            self._kill()
+        finally:
+            if self._thread is not None:
+                self._thread.stop()
+            self.renderer = self._thread = None
+
+    def kill(self):
+        self._kill()
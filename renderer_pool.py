@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染后端实例池
+保持若干个已启动的渲染后端，按任务租用；租用前做健康检查，
+完成指定数量的任务或出错后回收重建，退出时统一关闭
+"""
+
+import atexit
+import threading
+from contextlib import contextmanager
+
+from renderers import create_renderer
+
+# 每个实例最多处理的任务数，之后重建以释放后端可能累积的内存
+DEFAULT_MAX_JOBS = 50
+
+
+class _PooledRenderer:
+    """池中的一个实例及其使用记录"""
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.jobs = 0
+        self.failed = False
+
+
+class RendererPool:
+    """渲染后端实例池（线程安全）
+
+    用法：
+        pool = RendererPool('powerpoint', size=1)
+        with pool.lease() as renderer:
+            if not SlideConverter(renderer=renderer).convert(src, dst):
+                pool.mark_failed(renderer)
+        pool.close()
+
+    注意：PowerPoint的COM对象属于创建它的线程，使用PowerPoint后端时
+    整个池只能在同一个（已CoInitialize的）线程中使用。
+    """
+
+    def __init__(self, renderer_name=None, size=1, max_jobs=DEFAULT_MAX_JOBS, log=None,
+                 **renderer_kwargs):
+        self.renderer_name = renderer_name
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.log = log or (lambda message: None)
+        self.renderer_kwargs = renderer_kwargs
+        self._idle = []
+        self._leased = {}
+        self._total = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        atexit.register(self.close)
+
+    def _new_instance(self):
+        renderer = create_renderer(self.renderer_name, log=self.log, **self.renderer_kwargs)
+        self.log(f"渲染后端实例已创建: {renderer.name}")
+        return _PooledRenderer(renderer)
+
+    def acquire(self, timeout=None):
+        """租用一个健康的实例，池满且无空闲实例时等待"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("渲染后端实例池已关闭")
+                if self._idle:
+                    item = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    item = None
+                    break
+                if not self._condition.wait(timeout):
+                    raise TimeoutError("等待渲染后端实例超时")
+
+        if item is not None and not self._is_healthy(item):
+            self.log("渲染后端实例健康检查失败，重新创建")
+            # 名额留给新实例，不用释放
+            self._shutdown(item)
+            item = None
+
+        if item is None:
+            try:
+                return self._new_instance()
+            except BaseException:
+                with self._condition:
+                    self._total -= 1
+                    self._condition.notify()
+                raise
+        return item
+
+    def release(self, item, failed=False):
+        """归还实例；出错或达到任务上限的实例会被回收"""
+        item.jobs += 1
+        failed = failed or item.failed
+        retire = failed or item.jobs >= self.max_jobs
+        if retire:
+            reason = "出错" if failed else f"已处理 {item.jobs} 个任务"
+            self.log(f"回收渲染后端实例（{reason}）")
+        else:
+            try:
+                item.renderer.close()
+            except Exception as close_error:
+                self.log(f"关闭演示文稿失败，回收实例: {close_error}")
+                retire = True
+        with self._condition:
+            if retire or self._closed:
+                retire = True
+                self._total -= 1
+            else:
+                self._idle.append(item)
+            self._condition.notify()
+        if retire:
+            self._shutdown(item)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """以上下文管理器形式租用实例，异常或调用 mark_failed 后自动回收"""
+        item = self.acquire(timeout)
+        self._leased[id(item.renderer)] = item
+        try:
+            yield item.renderer
+        except BaseException:
+            self._leased.pop(id(item.renderer), None)
+            self.release(item, failed=True)
+            raise
+        self._leased.pop(id(item.renderer), None)
+        self.release(item)
+
+    def mark_failed(self, renderer):
+        """标记租用中的实例本次任务失败，归还时回收而不是复用"""
+        item = self._leased.get(id(renderer))
+        if item is not None:
+            item.failed = True
+
+    def _is_healthy(self, item):
+        try:
+            return item.renderer.is_alive()
+        except Exception:
+            return False
+
+    def _shutdown(self, item):
+        """退出实例的后端（不持有锁：PowerPoint的Quit可能要几秒，期间其他线程照常租用）
+
+        PowerPoint同时被其他实例池使用时只关闭本实例的演示文稿，由最后一个使用者退出程序
+        （见 PowerPointRenderer.shutdown）。
+        """
+        try:
+            item.renderer.shutdown()
+        except Exception as shutdown_error:
+            self.log(f"关闭渲染后端实例时出错: {shutdown_error}")
+
+    def close(self):
+        """关闭池中所有空闲实例；正在使用的实例归还时关闭"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._condition.notify_all()
+        for item in idle:
+            self._shutdown(item)
+        atexit.unregister(self.close)
@@ -0,0 +1,762 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+幻灯片渲染后端
+统一接口：打开演示文稿 -> 报告页数和尺寸 -> 把第i页渲染为位图文件
+
+- PowerPointRenderer：Windows下通过COM调用PowerPoint
+- LibreOfficeRenderer：无界面LibreOffice先转PDF，再用poppler逐页栅格化
+- FakeRenderer：按幻灯片内容生成确定性的合成图片，用于测试和基准
+
+支持批量渲染的后端（supports_bulk）在 prefetch 得知要渲染哪些幻灯片后，
+一次调用渲染一整批（PowerPoint整份导出，pdftoppm一次栅格化一段连续页），
+之后的 render_slide / render_frame 直接取用结果；重试时再逐张渲染。
+"""
+
+import hashlib
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+from collections import deque
+
+from pptx_package import PptxPackage
+from pptx_writer import EMU_PER_POINT
+
+# 默认栅格化分辨率，与PowerPoint默认导出一致（13.33英寸宽 -> 1280像素）
+DEFAULT_DPI = 96
+
+# 输出分辨率预设：dpi 随幻灯片尺寸缩放，width 固定输出像素宽度（高度按比例）
+RESOLUTION_PRESETS = {
+    'standard': {'dpi': DEFAULT_DPI},   # PowerPoint默认导出，16:9约1280像素宽
+    'projector': {'width': 1920},       # 1080p投影仪
+    '4k': {'width': 3840},              # 报告厅4K大屏
+    'print': {'dpi': 300},              # 打印讲义
+}
+
+
+def resolve_resolution(preset=None, dpi=None, width=None):
+    """把预设名、dpi 和目标宽度合并为 (dpi, width)；显式给出的 dpi/width 优先于预设"""
+    if preset:
+        if preset not in RESOLUTION_PRESETS:
+            raise ValueError(f"未知的分辨率预设: {preset}（可选: {', '.join(RESOLUTION_PRESETS)}）")
+        if dpi is None and width is None:
+            dpi = RESOLUTION_PRESETS[preset].get('dpi')
+            width = RESOLUTION_PRESETS[preset].get('width')
+    if width is not None:
+        return None, int(width)
+    return (dpi or DEFAULT_DPI), None
+
+
+# 每批最多渲染的张数，以及一批图片的像素总数上限（批量结果在被取用前占用内存或临时空间）
+BULK_CHUNK = 16
+BULK_MAX_PIXELS = 64 * 1000 * 1000
+
+# 要渲染的幻灯片少于这个数时不值得批量渲染（例如只更新几张）
+BULK_MIN_SLIDES = 4
+
+# 批量导出的文件名中的页码（PowerPoint 为“幻灯片12.PNG”/“Slide12.PNG”，pdftoppm 为“page-012.ppm”）
+_PAGE_NUMBER_RE = re.compile(r'(\d+)\.(png|ppm)$', re.IGNORECASE)
+
+
+def numbered_pages(directory):
+    """批量导出目录中的文件，按文件名末尾的页码返回 {页码: 路径}"""
+    pages = {}
+    for name in os.listdir(directory):
+        match = _PAGE_NUMBER_RE.search(name)
+        if match:
+            pages[int(match.group(1))] = os.path.join(directory, name)
+    return pages
+
+
+class RendererError(Exception):
+    """渲染后端不可用或渲染失败"""
+
+
+class BaseRenderer:
+    """渲染后端基类
+
+    子类实现 _open / _render_slide / _close，并在 _open 中设置
+    slide_count 和 slide_size（单位：磅）。渲染页码从1开始。
+    输出尺寸由 dpi 决定；设置了 target_width 时固定为该像素宽度。
+    能直接得到内存中位图的后端设置 supports_frames 并实现 _render_frame，
+    转换流程因此可以省去临时PNG的压缩和解压。
+    能一次渲染多页的后端设置 supports_bulk 并实现 _render_bulk；
+    bulk_enabled 为False时总是逐张渲染。
+    single_instance 为True的后端所有实例驱动同一个进程，不能并行使用多个实例。
+    """
+
+    name = 'base'
+    supports_frames = False
+    supports_bulk = False
+    single_instance = False
+
+    def __init__(self, dpi=DEFAULT_DPI, log=None):
+        self.dpi = dpi
+        self.target_width = None
+        self.log = log or (lambda message: None)
+        self.deck_path = None
+        self.slide_count = 0
+        self.slide_size = (0.0, 0.0)
+        self.bulk_enabled = True
+        # 已预告、尚未批量渲染的幻灯片，以及已批量渲染、尚未取用的结果（文件路径或图片）
+        self._bulk_queue = deque()
+        self._bulk_ready = {}
+        self._bulk_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def open(self, deck_path):
+        """打开演示文稿，已打开的会先关闭"""
+        if self.deck_path:
+            self.close()
+        self.deck_path = os.path.abspath(deck_path)
+        self._open(self.deck_path)
+
+    def render_slide(self, index, output_path):
+        """把第 index 页渲染为PNG文件"""
+        if not 1 <= index <= self.slide_count:
+            raise RendererError(f"幻灯片序号越界: {index}/{self.slide_count}")
+        rendered = self._take_bulk(index)
+        if rendered is None:
+            self._render_slide(index, output_path)
+        elif isinstance(rendered, str) and rendered.lower().endswith('.png'):
+            os.replace(rendered, output_path)
+        else:
+            image = self._load_bulk(rendered)
+            image.save(output_path, "PNG")
+        return output_path
+
+    def render_frame(self, index):
+        """把第 index 页渲染为内存中的RGB图片（PIL.Image），仅 supports_frames 的后端可用"""
+        if not 1 <= index <= self.slide_count:
+            raise RendererError(f"幻灯片序号越界: {index}/{self.slide_count}")
+        rendered = self._take_bulk(index)
+        if rendered is None:
+            return self._render_frame(index)
+        return self._load_bulk(rendered)
+
+    def prefetch(self, indices):
+        """预告接下来要按顺序渲染的幻灯片
+
+        能并行渲染的后端（见 sharded_renderer）据此提前开始；支持批量渲染的后端
+        据此在第一次取用时一次渲染一批。每张预告的幻灯片只从批量结果中取用一次，
+        之后（例如结果无效需要重试）再取同一张时逐张渲染。
+        """
+        self._discard_bulk()
+        indices = sorted(indices)
+        if self.supports_bulk and self.bulk_enabled and self._bulk_worthwhile(indices):
+            self._bulk_queue = deque(indices)
+
+    def _bulk_worthwhile(self, indices):
+        return len(indices) >= BULK_MIN_SLIDES
+
+    def _bulk_chunk_size(self):
+        """每批张数：不超过 BULK_CHUNK，且一批的像素总数不超过 BULK_MAX_PIXELS"""
+        width, height = self.pixel_size()
+        return max(1, min(BULK_CHUNK, BULK_MAX_PIXELS // max(1, width * height)))
+
+    def _next_bulk_batch(self, index):
+        """从预告队列中取出包含 index 的下一批（连续的页码）"""
+        while self._bulk_queue and self._bulk_queue[0] < index:
+            self._bulk_queue.popleft()
+        batch = []
+        limit = self._bulk_chunk_size()
+        while (self._bulk_queue and len(batch) < limit
+               and (not batch or self._bulk_queue[0] == batch[-1] + 1)):
+            batch.append(self._bulk_queue.popleft())
+        return batch
+
+    def _take_bulk(self, index):
+        """取出第 index 页的批量渲染结果；不在批量计划中或批量渲染失败时返回None"""
+        if index not in self._bulk_ready:
+            if not self._bulk_queue or index not in self._bulk_queue:
+                return None
+            batch = self._next_bulk_batch(index)
+            if self._bulk_dir is None:
+                self._bulk_dir = tempfile.mkdtemp(prefix="ppt_bulk_")
+            try:
+                self._bulk_ready.update(self._render_bulk(batch))
+            except Exception as bulk_error:
+                # 后端不支持或导出失败：之后全部逐张渲染
+                self.log(f"批量渲染第 {batch[0]}-{batch[-1]} 页失败，改为逐张渲染: {bulk_error}")
+                self._discard_bulk()
+                return None
+        return self._bulk_ready.pop(index, None)
+
+    def _load_bulk(self, rendered):
+        """把批量渲染结果（文件路径或图片）读成RGB图片，并删除文件"""
+        if not isinstance(rendered, str):
+            return rendered if rendered.mode == 'RGB' else rendered.convert('RGB')
+        from PIL import Image
+
+        try:
+            with Image.open(rendered) as image:
+                return image.convert('RGB')
+        finally:
+            os.remove(rendered)
+
+    def _discard_bulk(self):
+        """丢弃未取用的批量结果和临时目录"""
+        self._bulk_queue = deque()
+        self._bulk_ready = {}
+        if self._bulk_dir:
+            shutil.rmtree(self._bulk_dir, ignore_errors=True)
+            self._bulk_dir = None
+
+    def close(self):
+        """关闭当前演示文稿，保留后端进程以便复用"""
+        if self.deck_path:
+            try:
+                self._discard_bulk()
+                self._close()
+            finally:
+                self.deck_path = None
+                self.slide_count = 0
+
+    def shutdown(self):
+        """关闭演示文稿并释放后端进程"""
+        self.close()
+
+    def kill(self):
+        """强制结束后端进程，让卡住的调用返回；由看门狗（见 render_supervisor）在另一个线程调用"""
+
+    def expected_slides(self, index):
+        """render_slide / render_frame(index) 这次调用要渲染的张数：
+        结果已批量渲染好时为0，会触发批量渲染时为剩余的预告张数（上限），否则为1"""
+        if index in self._bulk_ready:
+            return 0
+        if index in self._bulk_queue:
+            return len(self._bulk_queue)
+        return 1
+
+    def is_alive(self):
+        """后端是否仍可用，供实例池做健康检查"""
+        return True
+
+    def set_resolution(self, dpi=None, target_width=None):
+        """设置输出分辨率，对之后渲染的幻灯片生效"""
+        self.dpi, self.target_width = resolve_resolution(dpi=dpi, width=target_width)
+
+    @property
+    def effective_dpi(self):
+        """实际使用的dpi（固定宽度时按幻灯片宽度换算）"""
+        if self.target_width and self.slide_size[0]:
+            return self.target_width * 72.0 / self.slide_size[0]
+        return self.dpi
+
+    def pixel_size(self):
+        """输出像素尺寸"""
+        width, height = self.slide_size
+        if self.target_width and width:
+            return (self.target_width, max(1, int(round(height * self.target_width / width))))
+        return (int(round(width * self.dpi / 72.0)), int(round(height * self.dpi / 72.0)))
+
+    def _open(self, deck_path):
+        raise NotImplementedError
+
+    def _render_slide(self, index, output_path):
+        raise NotImplementedError
+
+    def _render_frame(self, index):
+        raise NotImplementedError
+
+    def _render_bulk(self, indices):
+        """一次渲染 indices（连续的页码）到 self._bulk_dir，返回 {页码: 文件路径或图片}"""
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class PowerPointRenderer(BaseRenderer):
+    """通过COM接口驱动PowerPoint；必须在调用线程中完成CoInitialize"""
+
+    name = 'powerpoint'
+    supports_bulk = True
+    # PowerPoint是单实例COM服务器：每次 Dispatch 得到的都是同一个进程
+    single_instance = True
+
+    # 本进程中已启动（持有 Application）的实例数，以及PowerPoint是否由本进程启动；
+    # 只有最后一个实例在PowerPoint由本进程启动时才退出程序，
+    # 否则会关掉其他实例（或用户自己）正在使用的演示文稿
+    _users = 0
+    _owned = False
+    _users_lock = threading.Lock()
+
+    def __init__(self, dpi=DEFAULT_DPI, log=None):
+        super().__init__(dpi, log)
+        self.application = None
+        self.presentation = None
+        # PowerPoint进程号，卡住时据此结束进程
+        self.pid = None
+        # 是否计入 _users；看门狗放弃本实例时提前退出计数
+        self._counted = False
+        # 看门狗放弃了本实例（PowerPoint被共用，不能结束进程）
+        self._abandoned = False
+
+    def start(self):
+        """启动PowerPoint（修复版本兼容性问题）"""
+        if self.application is not None:
+            return
+        try:
+            import win32com.client
+        except ImportError as e:
+            raise RendererError(f"缺少pywin32，无法使用PowerPoint渲染: {e}")
+
+        try:
+            win32com.client.GetActiveObject("PowerPoint.Application")
+            already_running = True
+        except Exception:
+            already_running = False
+        try:
+            self.application = win32com.client.Dispatch("PowerPoint.Application")
+        except Exception as e:
+            raise RendererError(f"PowerPoint初始化失败: {e}")
+        with PowerPointRenderer._users_lock:
+            if PowerPointRenderer._users == 0:
+                PowerPointRenderer._owned = not already_running
+            PowerPointRenderer._users += 1
+        self._counted = True
+        self.log("PowerPoint COM接口创建成功")
+        try:
+            import win32process
+            _, self.pid = win32process.GetWindowThreadProcessId(self.application.HWND)
+        except Exception as pid_error:
+            self.log(f"无法获取PowerPoint进程号，卡住时无法强制结束: {pid_error}")
+
+        # 尝试设置PowerPoint属性（某些版本可能不支持隐藏窗口）
+        try:
+            self.application.DisplayAlerts = False  # 禁用警告对话框
+            self.log("已禁用PowerPoint警告对话框")
+        except Exception as alert_error:
+            self.log(f"设置DisplayAlerts失败: {alert_error}")
+
+        # 谨慎处理Visible属性（某些版本不允许隐藏）
+        try:
+            current_visible = self.application.Visible
+            self.log(f"PowerPoint当前可见状态: {current_visible}")
+            if not current_visible:
+                self.application.Visible = True
+                self.log("PowerPoint窗口已设置为可见")
+        except Exception as visible_error:
+            self.log(f"设置Visible属性失败，使用默认设置: {visible_error}")
+
+        self.log("PowerPoint COM接口初始化完成")
+
+    def is_alive(self):
+        if self._abandoned:
+            return False
+        if self.application is None:
+            return True
+        try:
+            self.application.Version
+            return True
+        except Exception:
+            return False
+
+    def _open(self, deck_path):
+        self.start()
+        self.presentation = self.application.Presentations.Open(deck_path, ReadOnly=True)
+        self.slide_count = self.presentation.Slides.Count
+        self.slide_size = (self.presentation.PageSetup.SlideWidth,
+                           self.presentation.PageSetup.SlideHeight)
+
+    def _render_slide(self, index, output_path):
+        # 显式指定 ScaleWidth/ScaleHeight，否则分辨率取决于注册表中的导出设置
+        width, height = self.pixel_size()
+        self.presentation.Slides(index).Export(output_path, "PNG", width, height)
+
+    def _bulk_worthwhile(self, indices):
+        # Presentation.Export 只能导出整份演示文稿，只渲染少数几张时逐张更快
+        return len(indices) >= max(BULK_MIN_SLIDES, self.slide_count // 2)
+
+    def _next_bulk_batch(self, index):
+        batch = list(self._bulk_queue)
+        self._bulk_queue.clear()
+        return batch
+
+    def _render_bulk(self, indices):
+        # 一次COM调用导出所有幻灯片（文件名随语言版本不同，如 幻灯片1.PNG / Slide1.PNG）
+        folder = tempfile.mkdtemp(prefix="export_", dir=self._bulk_dir)
+        width, height = self.pixel_size()
+        self.presentation.Export(folder, "PNG", width, height)
+        pages = numbered_pages(folder)
+        if len(pages) != self.slide_count:
+            raise RendererError(f"导出了 {len(pages)} 张图片，演示文稿有 {self.slide_count} 张幻灯片")
+        wanted = set(indices)
+        for page, path in pages.items():
+            if page not in wanted:
+                os.remove(path)
+        return {page: path for page, path in pages.items() if page in wanted}
+
+    def _close(self):
+        if self.presentation is not None:
+            try:
+                self.presentation.Close()
+            finally:
+                self.presentation = None
+
+    def _release_user(self):
+        """不再使用PowerPoint；返回是否应当退出程序（最后一个使用者且由本进程启动）"""
+        with PowerPointRenderer._users_lock:
+            if not self._counted:
+                return False
+            self._counted = False
+            PowerPointRenderer._users -= 1
+            last = PowerPointRenderer._users == 0
+            return last and PowerPointRenderer._owned
+
+    def _shared(self):
+        """PowerPoint是否还被本进程的其他实例或用户使用"""
+        with PowerPointRenderer._users_lock:
+            return PowerPointRenderer._users > 1 or not PowerPointRenderer._owned
+
+    def shutdown(self):
+        super().shutdown()
+        if self.application is None:
+            return
+        if not self._release_user():
+            self.log("PowerPoint仍被其他转换或用户使用，只关闭本实例的演示文稿，不退出程序")
+            self.application = None
+            self.pid = None
+            return
+        # 关闭所有残留的演示文稿后再退出
+        try:
+            for i in range(self.application.Presentations.Count, 0, -1):
+                try:
+                    self.application.Presentations(i).Close()
+                except Exception as close_err:
+                    self.log(f"关闭演示文稿 {i} 失败: {close_err}")
+        except Exception as cleanup_error:
+            self.log(f"清理演示文稿时出错: {cleanup_error}")
+        try:
+            self.application.Quit()
+            self.log("PowerPoint COM接口已关闭")
+        except Exception as quit_error:
+            self.log(f"退出PowerPoint时出错: {quit_error}")
+        finally:
+            self.application = None
+            self.pid = None
+
+    def kill(self):
+        # PowerPoint是单实例程序，结束进程会一并关闭其他转换和用户自己的演示文稿，
+        # 这时只关闭本实例的演示文稿，并把本实例标记为不可用
+        if self._shared():
+            self.log("PowerPoint仍被其他转换或用户使用，不结束进程，只关闭本实例的演示文稿")
+            self._abandoned = True
+            self._release_user()
+            if self.deck_path:
+                threading.Thread(target=self._close_elsewhere, args=(self.deck_path,),
+                                 name="powerpoint-close", daemon=True).start()
+            return
+        if self.pid:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+                self.log(f"已结束PowerPoint进程 {self.pid}")
+            except OSError as kill_error:
+                self.log(f"结束PowerPoint进程失败: {kill_error}")
+
+
+    def _close_elsewhere(self, deck_path):
+        """在新线程中另取一个COM接口关闭 deck_path（原线程可能正卡在调用中）；
+        PowerPoint本身卡住时这里也会等，所以放在独立的后台线程"""
+        import pythoncom
+        import win32com.client
+
+        pythoncom.CoInitialize()
+        try:
+            application = win32com.client.Dispatch("PowerPoint.Application")
+            for i in range(application.Presentations.Count, 0, -1):
+                presentation = application.Presentations(i)
+                if os.path.normcase(presentation.FullName) == os.path.normcase(deck_path):
+                    presentation.Close()
+                    self.log(f"已关闭卡住的演示文稿: {deck_path}")
+                    break
+        except Exception as close_error:
+            self.log(f"关闭卡住的演示文稿失败: {close_error}")
+        finally:
+            pythoncom.CoUninitialize()
+
+
+class LibreOfficeRenderer(BaseRenderer):
+    """无界面LibreOffice渲染：整份演示文稿转一次PDF，再用pdftoppm逐页栅格化
+
+    每个实例使用独立的用户配置目录，多个实例可以并行运行。
+    open 也接受已经转换好的PDF（分片渲染时由主进程统一转换一次，各分片只栅格化）。
+    render_frame 让pdftoppm把未压缩的PPM写到标准输出，不经过PNG文件；
+    批量渲染时一次pdftoppm调用栅格化一段连续页，同样输出未压缩的PPM。
+    """
+
+    name = 'libreoffice'
+    supports_frames = True
+    supports_bulk = True
+
+    def __init__(self, dpi=DEFAULT_DPI, log=None, soffice=None, timeout=600):
+        super().__init__(dpi, log)
+        self.soffice = soffice or shutil.which('soffice') or shutil.which('libreoffice')
+        self.pdftoppm = shutil.which('pdftoppm')
+        self.pdfinfo = shutil.which('pdfinfo')
+        self.timeout = timeout
+        self.profile_dir = None
+        self.work_dir = None
+        self.pdf_path = None
+        # 正在运行的 soffice / poppler 进程
+        self._process = None
+
+    def is_alive(self):
+        return bool(self.soffice) and os.path.exists(self.soffice)
+
+    def _run(self, args, binary=False):
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._process = process
+        try:
+            stdout, stderr = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise RendererError(f"{os.path.basename(args[0])} 超过 {self.timeout} 秒未完成")
+        finally:
+            self._process = None
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', 'replace').strip()
+            raise RendererError(f"{os.path.basename(args[0])} 执行失败: {message}")
+        return stdout if binary else stdout.decode('utf-8', 'replace')
+
+    def kill(self):
+        process = self._process
+        if process is not None:
+            process.kill()
+
+    def convert_to_pdf(self, deck_path, out_dir):
+        """用LibreOffice把演示文稿转换为 out_dir 中的PDF，返回PDF路径"""
+        if not self.soffice:
+            raise RendererError("未找到LibreOffice（soffice），无法使用LibreOffice渲染")
+        # 用户配置目录在实例生命周期内复用：首次启动初始化配置最耗时
+        if self.profile_dir is None:
+            self.profile_dir = tempfile.mkdtemp(prefix="ppt_lo_profile_")
+        profile_url = 'file:///' + self.profile_dir.replace('\\', '/').lstrip('/')
+        self._run([
+            self.soffice, f'-env:UserInstallation={profile_url}',
+            '--headless', '--norestore', '--convert-to', 'pdf',
+            '--outdir', out_dir, deck_path,
+        ])
+        base_name = os.path.splitext(os.path.basename(deck_path))[0]
+        pdf_path = os.path.join(out_dir, base_name + '.pdf')
+        if not os.path.exists(pdf_path):
+            raise RendererError("LibreOffice未生成PDF")
+        return pdf_path
+
+    def _open(self, deck_path):
+        if not (self.pdftoppm and self.pdfinfo):
+            raise RendererError("未找到poppler工具（pdftoppm/pdfinfo），无法栅格化PDF")
+        if deck_path.lower().endswith('.pdf'):
+            # 已转换好的PDF由提供方负责删除
+            self.pdf_path = deck_path
+        else:
+            self.work_dir = tempfile.mkdtemp(prefix="ppt_lo_render_")
+            self.pdf_path = self.convert_to_pdf(deck_path, self.work_dir)
+
+        info = self._run([self.pdfinfo, self.pdf_path])
+        pages = re.search(r'^Pages:\s+(\d+)', info, re.MULTILINE)
+        size = re.search(r'^Page size:\s+([\d.]+) x ([\d.]+) pts', info, re.MULTILINE)
+        if not pages:
+            raise RendererError("无法读取PDF页数")
+        self.slide_count = int(pages.group(1))
+        if size:
+            self.slide_size = (float(size.group(1)), float(size.group(2)))
+
+    def _render_slide(self, index, output_path):
+        prefix = os.path.splitext(output_path)[0]
+        width, height = self.pixel_size()
+        self._run([
+            self.pdftoppm, '-png', '-scale-to-x', str(width), '-scale-to-y', str(height),
+            '-f', str(index), '-l', str(index), '-singlefile', self.pdf_path, prefix,
+        ])
+        if prefix + '.png' != output_path:
+            os.replace(prefix + '.png', output_path)
+
+    def _render_frame(self, index):
+        import io
+        from PIL import Image
+
+        width, height = self.pixel_size()
+        # 不给输出文件名时pdftoppm把PPM写到标准输出
+        data = self._run([
+            self.pdftoppm, '-scale-to-x', str(width), '-scale-to-y', str(height),
+            '-f', str(index), '-l', str(index), '-singlefile', self.pdf_path,
+        ], binary=True)
+        with Image.open(io.BytesIO(data)) as image:
+            return image.convert('RGB')
+
+    def _render_bulk(self, indices):
+        # 输出文件名为 page-页码.ppm，页码位数随PDF总页数补零
+        folder = tempfile.mkdtemp(prefix="pages_", dir=self._bulk_dir)
+        width, height = self.pixel_size()
+        self._run([
+            self.pdftoppm, '-scale-to-x', str(width), '-scale-to-y', str(height),
+            '-f', str(indices[0]), '-l', str(indices[-1]), self.pdf_path,
+            os.path.join(folder, 'page'),
+        ])
+        return numbered_pages(folder)
+
+    def _close(self):
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+        self.pdf_path = None
+
+    def shutdown(self):
+        super().shutdown()
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+class FakeRenderer(BaseRenderer):
+    """确定性的假渲染器
+
+    按幻灯片XML的哈希生成合成图片：内容相同的幻灯片得到相同的图片，
+    引用了图片素材的幻灯片生成类似照片的纹理，其余生成类似文字的条纹。
+    render_delay 模拟每张幻灯片的栅格化耗时，call_delay 模拟每次调用后端的固定开销
+    （COM往返、启动外部进程，批量渲染时每批只有一次），单位为秒。
+    hang_slides 中的幻灯片第一次渲染时卡住，直到 kill()，用于模拟PowerPoint导出卡死。
+    """
+
+    name = 'fake'
+    supports_frames = True
+    supports_bulk = True
+
+    def __init__(self, dpi=DEFAULT_DPI, log=None, render_delay=0.0, call_delay=0.0,
+                 hang_slides=()):
+        super().__init__(dpi, log)
+        self.render_delay = render_delay
+        self.call_delay = call_delay
+        # 模拟卡住的幻灯片在同一进程的所有实例之间共用，重建后端后不再卡住
+        self.hang_slides = hang_slides if isinstance(hang_slides, set) else set(hang_slides)
+        self.slides = []
+        self._killed = threading.Event()
+
+    def _open(self, deck_path):
+        with PptxPackage(deck_path) as package:
+            for part in package.slide_parts:
+                has_media = any(rtype in ('image', 'media', 'video')
+                                for rtype, _, _ in package.relationships(part).values())
+                digest = hashlib.sha256(package.read(part)).digest()
+                self.slides.append((digest, has_media))
+            size = package.slide_size()
+        self.slide_count = len(self.slides)
+        if size:
+            self.slide_size = (size[0] / EMU_PER_POINT, size[1] / EMU_PER_POINT)
+        else:
+            self.slide_size = (960.0, 540.0)
+
+    def _simulate_delay(self, indices):
+        hung = self.hang_slides.intersection(indices)
+        if hung:
+            self.hang_slides.difference_update(hung)
+            self._killed.wait()
+        elif self.call_delay or self.render_delay:
+            self._killed.wait(self.call_delay + self.render_delay * len(indices))
+        if self._killed.is_set():
+            raise RendererError("渲染后端已被结束")
+
+    def _render_slide(self, index, output_path):
+        self._simulate_delay([index])
+        self.render_image(index).save(output_path, "PNG")
+
+    def _render_frame(self, index):
+        self._simulate_delay([index])
+        return self.render_image(index)
+
+    def _render_bulk(self, indices):
+        self._simulate_delay(indices)
+        return {index: self.render_image(index) for index in indices}
+
+    def kill(self):
+        self._killed.set()
+
+    def render_image(self, index):
+        """生成第 index 页的合成图片（PIL.Image）"""
+        from PIL import Image, ImageDraw
+
+        digest, has_media = self.slides[index - 1]
+        rng = random.Random(digest)
+        width, height = self.pixel_size()
+        image = Image.new("RGB", (width, height), (255, 255, 255))
+        draw = ImageDraw.Draw(image)
+
+        # 标题栏
+        draw.rectangle([0, 0, width, height // 8], fill=(46, 134, 171))
+
+        if has_media:
+            # 低分辨率噪声放大后得到平滑的“照片”纹理
+            noise_w, noise_h = max(1, width // 16), max(1, height // 16)
+            noise = bytes(rng.getrandbits(8) for _ in range(noise_w * noise_h * 3))
+            photo = Image.frombytes("RGB", (noise_w, noise_h), noise)
+            box = (width // 10, height // 5, width * 9 // 10, height * 9 // 10)
+            image.paste(photo.resize((box[2] - box[0], box[3] - box[1]), Image.BICUBIC), box[:2])
+        else:
+            # 若干行长度随机的深色条纹模拟文字
+            line_height = max(4, height // 24)
+            y = height // 5
+            while y < height * 9 // 10:
+                line_width = rng.randint(width // 4, width * 8 // 10)
+                draw.rectangle([width // 10, y, width // 10 + line_width, y + line_height // 2],
+                               fill=(40, 40, 40))
+                y += line_height
+        return image
+
+    def _close(self):
+        self.slides = []
+
+
+RENDERERS = {
+    PowerPointRenderer.name: PowerPointRenderer,
+    LibreOfficeRenderer.name: LibreOfficeRenderer,
+    FakeRenderer.name: FakeRenderer,
+}
+
+
+def default_renderer_name():
+    """Windows下默认使用PowerPoint，其他系统使用LibreOffice"""
+    return PowerPointRenderer.name if os.name == 'nt' else LibreOfficeRenderer.name
+
+
+def parallel_limit(name, requested):
+    """同一渲染后端最多可以同时使用的实例数：单实例后端（PowerPoint）为1，其余为 requested"""
+    renderer_class = RENDERERS.get(name or default_renderer_name())
+    if renderer_class is not None and renderer_class.single_instance:
+        return 1
+    return max(1, requested)
+
+
+def create_renderer(name=None, supervise=True, timeouts=None, **kwargs):
+    """按名称创建渲染后端
+
+    supervise 为True时加上看门狗（见 render_supervisor.SupervisedRenderer）：调用超过
+    timeouts 中的期限时结束并重建后端。分片渲染自己管理渲染进程，各分片进程中的后端
+    再各自加看门狗。
+    """
+    name = name or default_renderer_name()
+    if name == 'sharded':
+        # 分片渲染在各子进程中再按名称创建后端，延迟导入避免循环引用
+        from sharded_renderer import ShardedRenderer
+        return ShardedRenderer(**kwargs)
+    try:
+        renderer_class = RENDERERS[name]
+    except KeyError:
+        raise RendererError(f"未知的渲染后端: {name}（可选: {', '.join(sorted(RENDERERS))}）")
+    if supervise:
+        from render_supervisor import SupervisedRenderer
+        return SupervisedRenderer(lambda: renderer_class(**kwargs), name, log=kwargs.get('log'),
+                                  timeouts=timeouts)
+    return renderer_class(**kwargs)
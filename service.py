@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PPT转图片幻灯片工具 - 转换服务
+常驻运行，通过本地HTTP接口或投递目录接收任务，按优先级排队（同优先级时各用户轮流），
+由固定数量的工作线程转换，可查询任务状态、进度和结果。适合部门共用一台转换机。
+
+示例：
+    python service.py --port 8765 --workers 2 --drop-dir D:\\转换投递
+
+HTTP接口（请求和响应均为JSON，上传和下载除外）：
+    POST   /jobs?name=讲义.pptx&user=张三&priority=5   请求体为PPT文件内容，返回任务信息
+    GET    /jobs                                       全部任务
+    GET    /jobs/<id>                                  任务状态和进度
+    GET    /jobs/<id>/log                              任务日志
+    GET    /jobs/<id>/result                           下载转换结果
+    DELETE /jobs/<id>                                  取消任务（进行中的任务在下一张幻灯片前停止）
+    GET    /health                                     服务状态
+
+投递目录：放入 <目录>/xxx.pptx 或 <目录>/<用户名>/xxx.pptx，文件大小稳定后自动提交，
+结果写入 <目录>/out/<用户名>/，失败时写入同名的 .failed.txt。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, quote, urlparse
+
+from cli import (add_conversion_arguments, create_converter, create_renderer_pool,
+                 is_convertible, is_output_name, options_from_args)
+from converter import ConversionCancelled, make_output_path
+from preflight import try_preflight
+from renderers import parallel_limit
+from render_cache import RenderCache, app_cache_root
+from tracing import Tracer
+
+DEFAULT_PORT = 8765
+# 单个上传文件的大小上限（字节）
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+# 保留的已结束任务数量，超出后删除最早的任务及其文件
+JOB_HISTORY = 500
+# 每个任务保留的日志行数
+JOB_LOG_LINES = 500
+# 投递目录的扫描间隔（秒）
+DROP_POLL_SECONDS = 2.0
+# 投递目录中存放结果的子目录
+DROP_OUTPUT_DIR = 'out'
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+STATE_NAMES = {'done': '完成', 'failed': '失败', 'cancelled': '已取消'}
+
+
+def default_spool_dir():
+    """默认的任务文件目录（上传的PPT和转换结果）"""
+    return os.path.join(app_cache_root(), 'service')
+
+
+class Job:
+    """一个转换任务"""
+
+    def __init__(self, input_path, output_path, user, priority, source, work_dir=None,
+                 on_finished=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.input_path = input_path
+        self.output_path = output_path
+        self.name = os.path.basename(input_path)
+        self.user = user
+        self.priority = priority
+        self.source = source
+        # 任务专用目录（上传或投递的文件放在这里），任务记录淘汰时一并删除
+        self.work_dir = work_dir
+        # 任务结束后在工作线程中调用 on_finished(job)；须在入队前设置
+        self.on_finished = on_finished
+        # 进行中的任务被取消时设置，转换在下一张幻灯片之前停止
+        self.cancel_event = threading.Event()
+        self.state = 'queued'
+        self.progress = (0, 0)
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.output_bytes = None
+        # 提交时的预检结果（.ppt 等无法预检时为None）
+        self.slides = None
+        self.estimated_seconds = None
+        self.lines = deque(maxlen=JOB_LOG_LINES)
+
+    def log(self, message):
+        self.lines.append(message)
+
+    def set_progress(self, completed, total):
+        self.progress = (completed, total)
+
+    def to_dict(self):
+        completed, total = self.progress
+        return {
+            'id': self.id,
+            'name': self.name,
+            'user': self.user,
+            'priority': self.priority,
+            'source': self.source,
+            'state': self.state,
+            'progress': {'completed': completed, 'total': total},
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'output_bytes': self.output_bytes,
+            'slides': self.slides,
+            'estimated_seconds': self.estimated_seconds,
+            'cancel_requested': self.cancel_event.is_set(),
+            'log_tail': list(self.lines)[-5:] if self.state == 'failed' else [],
+        }
+
+
+class JobQueue:
+    """按优先级取任务的队列（线程安全）
+
+    优先级高的先执行；同优先级时本轮已开始任务最少的用户优先，
+    避免一个人一次提交几十份文件把其他人排到后面；再按提交顺序。
+    队列清空时重新开始计数。
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._queued = []
+        self._started_per_user = {}
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def submit(self, job):
+        with self._condition:
+            self._jobs[job.id] = job
+            self._queued.append(job)
+            stale_dirs = self._trim_history()
+            self._condition.notify()
+        # 删除目录可能较慢，不占着队列的锁
+        for work_dir in stale_dirs:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return job
+
+    def next_job(self):
+        """阻塞直到有任务可执行，返回任务；队列关闭后返回None（排队中的任务不再执行）"""
+        with self._condition:
+            while not self._queued or self._closed:
+                if self._closed:
+                    return None
+                self._condition.wait()
+            job = min(self._queued, key=lambda item: (
+                -item.priority, self._started_per_user.get(item.user, 0), item.created))
+            self._queued.remove(job)
+            if not self._queued:
+                self._started_per_user.clear()
+            else:
+                self._started_per_user[job.user] = self._started_per_user.get(job.user, 0) + 1
+            job.state = 'running'
+            job.started = time.time()
+            return job
+
+    def finish(self, job, state):
+        with self._condition:
+            job.state = state
+            job.finished = time.time()
+
+    def cancel(self, job_id):
+        """取消任务：排队中的直接取消，进行中的请求转换在下一张幻灯片之前停止
+        （停止后状态变为 cancelled）。返回任务，不存在时返回None，已结束时抛出 ValueError"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == 'running':
+                job.cancel_event.set()
+                return job
+            if job.state != 'queued':
+                raise ValueError(f"任务状态为 {job.state}，无法取消")
+            self._queued.remove(job)
+            job.state = 'cancelled'
+            job.finished = time.time()
+            return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._condition:
+            return list(self._jobs.values())
+
+    def position(self, job):
+        """排队中的任务前面大约还有多少个任务（按优先级和提交时间估计）"""
+        with self._condition:
+            if job.state != 'queued':
+                return None
+            return sum(1 for item in self._queued
+                       if (-item.priority, item.created) < (-job.priority, job.created))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _trim_history(self):
+        """已结束的任务超过上限时删除最早的记录（需持有锁），返回应删除的任务目录"""
+        finished = [job for job in self._jobs.values() if job.state in FINISHED_STATES]
+        stale_dirs = []
+        for job in sorted(finished, key=lambda item: item.finished)[:-JOB_HISTORY or None]:
+            del self._jobs[job.id]
+            if job.work_dir:
+                stale_dirs.append(job.work_dir)
+        return stale_dirs
+
+
+class ConversionService:
+    """任务队列 + 固定数量的工作线程
+
+    每个工作线程有自己的渲染后端实例池（PowerPoint的COM对象只能在创建它的线程中使用），
+    转换选项与命令行相同（见 cli.default_options）。
+    """
+
+    def __init__(self, renderer_name, options, workers=1, spool_dir=None, log=None,
+                 verbose=False):
+        self.renderer_name = renderer_name
+        self.options = options
+        self.log = log or (lambda message: None)
+        self.workers = max(1, workers)
+        if not options['shards'] and parallel_limit(renderer_name, self.workers) < self.workers:
+            # 各工作线程的PowerPoint是同一个进程，一个任务退出或结束它会连累其他任务
+            self.log(f"渲染后端 {renderer_name} 只能单实例运行，工作线程数由 {self.workers} 改为 1")
+            self.workers = 1
+        self.spool_dir = spool_dir or default_spool_dir()
+        self.verbose = verbose
+        self.queue = JobQueue()
+        self.cache = RenderCache(*options['cache']) if options['cache'] else None
+        self._threads = []
+        self.started = time.time()
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"convert-{index + 1}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.log(f"转换服务已启动：{self.workers} 个工作线程，渲染后端 {self.renderer_name}")
+
+    def stop(self, timeout=None):
+        """不再接收新任务，等待正在转换的任务完成"""
+        self.queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _new_work_dir(self):
+        work_dir = os.path.join(self.spool_dir, uuid.uuid4().hex[:12])
+        os.makedirs(work_dir)
+        return work_dir
+
+    def submit_upload(self, name, stream, length, user, priority):
+        """把上传的文件保存到任务目录并提交"""
+        name = os.path.basename(name.replace('\\', '/')).strip()
+        if name and is_output_name(name):
+            raise ValueError("文件名是本工具的输出格式（xxx_image.pptx），不再转换；请改名后上传")
+        if not name or not is_convertible(name):
+            raise ValueError("只接受 .ppt / .pptx 文件")
+        if length > MAX_UPLOAD_BYTES:
+            raise ValueError(f"文件超过上限 {MAX_UPLOAD_BYTES // 1024 // 1024} MB")
+        work_dir = self._new_work_dir()
+        input_path = os.path.join(work_dir, name)
+        remaining = length
+        with open(input_path, 'wb') as f:
+            while remaining > 0:
+                chunk = stream.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise ValueError("上传的文件不完整")
+        job = Job(input_path, make_output_path(input_path), user, priority, 'http', work_dir)
+        try:
+            self._preflight(job)
+        except ValueError:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        self.log(f"收到任务 {job.id}：{name}（{user}，优先级 {priority}）")
+        return self.queue.submit(job)
+
+    def submit_file(self, input_path, output_path, user, priority, source, work_dir=None,
+                    on_finished=None):
+        """提交已在本地的文件；超过页数上限时抛出 ValueError
+        on_finished(job) 在任务结束后由工作线程调用"""
+        job = Job(input_path, output_path, user, priority, source, work_dir, on_finished)
+        self._preflight(job)
+        self.log(f"收到任务 {job.id}：{job.name}（{user}，优先级 {priority}）")
+        return self.queue.submit(job)
+
+    def _preflight(self, job):
+        """不启动渲染后端读取页数并估计耗时；超过页数上限时抛出 ValueError"""
+        info = try_preflight(job.input_path)
+        if info is None:
+            return
+        max_slides = self.options['max_slides']
+        if max_slides is not None and info.slide_count > max_slides:
+            raise ValueError(f"演示文稿有 {info.slide_count} 张幻灯片，超过上限 {max_slides} 张")
+        job.slides = info.slide_count
+        job.estimated_seconds = round(info.estimated_seconds(self.renderer_name), 1)
+        job.set_progress(0, info.slide_count)
+
+    def _worker_loop(self):
+        if self.renderer_name == 'powerpoint' and not self.options['shards']:
+            import pythoncom
+            pythoncom.CoInitialize()
+        pool = create_renderer_pool(self.renderer_name, self.options, self.log)
+        try:
+            while True:
+                job = self.queue.next_job()
+                if job is None:
+                    break
+                self._run(pool, job)
+        finally:
+            pool.close()
+
+    def _run(self, pool, job):
+        self.log(f"开始转换任务 {job.id}：{job.name}")
+
+        def log(message):
+            job.log(message)
+            if self.verbose:
+                self.log(f"[{job.id}] {message}")
+
+        trace_dir = self.options['trace_dir']
+        tracer = Tracer() if trace_dir else None
+        success = cancelled = False
+        try:
+            with pool.lease() as renderer:
+                converter = create_converter(renderer, self.options, log, self.cache, tracer,
+                                             progress=job.set_progress,
+                                             cancel_event=job.cancel_event)
+                try:
+                    success = converter.convert(job.input_path, job.output_path)
+                except ConversionCancelled:
+                    cancelled = True
+                if not success and not cancelled:
+                    pool.mark_failed(renderer)
+        except Exception as e:
+            log(f"转换过程发生异常: {e}")
+        if tracer is not None:
+            tracer.write_chrome_trace(os.path.join(trace_dir, job.id + '.trace.json'))
+            tracer.write_jsonl(os.path.join(trace_dir, job.id + '.spans.jsonl'))
+        if success and os.path.exists(job.output_path):
+            job.output_bytes = os.path.getsize(job.output_path)
+        state = 'done' if success else 'cancelled' if cancelled else 'failed'
+        self.queue.finish(job, state)
+        self.log(f"任务 {job.id} {STATE_NAMES[state]}：{job.finished - job.started:.1f} 秒")
+        if job.on_finished:
+            job.on_finished(job)
+
+    def status(self):
+        jobs = self.queue.jobs()
+        counts = {}
+        for job in jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return {
+            'renderer': self.renderer_name,
+            'workers': self.workers,
+            'uptime': round(time.time() - self.started, 1),
+            'jobs': counts,
+        }
+
+
+class DropFolderWatcher:
+    """定期扫描投递目录，把大小不再变化的PPT文件提交为任务
+
+    根目录下的文件属于用户 'drop'，一级子目录名即用户名；
+    文件提交时移动到任务目录，结果写到 out/<用户名>/ 下。
+    """
+
+    def __init__(self, service, drop_dir, priority=0, interval=DROP_POLL_SECONDS):
+        self.service = service
+        self.drop_dir = os.path.abspath(drop_dir)
+        self.output_root = os.path.join(self.drop_dir, DROP_OUTPUT_DIR)
+        self.priority = priority
+        self.interval = interval
+        self._sizes = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="drop-folder", daemon=True)
+        os.makedirs(self.output_root, exist_ok=True)
+
+    def start(self):
+        self._thread.start()
+        self.service.log(f"监视投递目录: {self.drop_dir}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _candidates(self):
+        """(路径, 用户名) 列表"""
+        found = []
+        for entry in os.scandir(self.drop_dir):
+            if entry.is_file():
+                found.append((entry.path, 'drop'))
+            elif entry.is_dir() and entry.name != DROP_OUTPUT_DIR:
+                found.extend((sub.path, entry.name) for sub in os.scandir(entry.path)
+                             if sub.is_file())
+        return [(path, user) for path, user in found if is_convertible(path)]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except OSError as scan_error:
+                self.service.log(f"扫描投递目录失败: {scan_error}")
+            self._stop.wait(self.interval)
+
+    def scan(self):
+        """扫描一次；两次扫描间大小和修改时间都没变的文件视为已复制完成"""
+        sizes = {}
+        for path, user in self._candidates():
+            stat = os.stat(path)
+            sizes[path] = (stat.st_size, stat.st_mtime)
+            if self._sizes.get(path) != sizes[path]:
+                continue
+            work_dir = self.service._new_work_dir()
+            input_path = os.path.join(work_dir, os.path.basename(path))
+            try:
+                # 移走后不会被重复提交；文件仍被占用（还在复制）时下次再试
+                shutil.move(path, input_path)
+            except OSError:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                continue
+            del sizes[path]
+            output_dir = os.path.join(self.output_root, user)
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = make_output_path(input_path, output_dir)
+            try:
+                self.service.submit_file(input_path, output_path, user, self.priority,
+                                         'drop', work_dir, self._write_failure_note)
+            except ValueError as rejected:
+                self._write_note(output_path, f"{os.path.basename(input_path)} 未转换：{rejected}\n")
+                shutil.rmtree(work_dir, ignore_errors=True)
+                continue
+        self._sizes = sizes
+
+    def _write_failure_note(self, job):
+        if job.state != 'failed':
+            return
+        self._write_note(job.output_path, f"{job.name} 转换失败（任务 {job.id}）\n\n"
+                                          + '\n'.join(job.lines) + '\n')
+
+    def _write_note(self, output_path, text):
+        note_path = os.path.splitext(output_path)[0] + '.failed.txt'
+        try:
+            with open(note_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        except OSError as note_error:
+            self.service.log(f"写入失败说明出错: {note_error}")
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP接口，self.server.service 为 ConversionService"""
+
+    server_version = 'ppt-to-image-slides'
+
+    def log_message(self, format, *args):
+        self.server.service.log(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _route(self):
+        """返回 (路径段列表, 查询参数)"""
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def _job_payload(self, job):
+        payload = job.to_dict()
+        payload['position'] = self.server.service.queue.position(job)
+        return payload
+
+    def do_GET(self):
+        service = self.server.service
+        parts, _ = self._route()
+        if parts == ['health']:
+            return self._send_json(200, service.status())
+        if parts == ['jobs']:
+            jobs = sorted(service.queue.jobs(), key=lambda item: item.created)
+            return self._send_json(200, {'jobs': [self._job_payload(job) for job in jobs]})
+        if len(parts) < 2 or parts[0] != 'jobs':
+            return self._send_error(404, "未知的路径")
+        job = service.queue.get(parts[1])
+        if job is None:
+            return self._send_error(404, "任务不存在")
+        if len(parts) == 2:
+            return self._send_json(200, self._job_payload(job))
+        if parts[2:] == ['log']:
+            return self._send_json(200, {'id': job.id, 'lines': list(job.lines)})
+        if parts[2:] == ['result']:
+            if job.state != 'done' or not os.path.exists(job.output_path):
+                return self._send_error(409, f"任务状态为 {job.state}，没有可下载的结果")
+            return self._send_file(job.output_path)
+        return self._send_error(404, "未知的路径")
+
+    def _send_file(self, path):
+        name = os.path.basename(path)
+        self.send_response(200)
+        self.send_header('Content-Type',
+                         'application/vnd.openxmlformats-officedocument.presentationml.presentation')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(name)}")
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_POST(self):
+        parts, query = self._route()
+        if parts != ['jobs']:
+            return self._send_error(404, "未知的路径")
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            priority = int(query.get('priority', 0))
+        except ValueError:
+            return self._send_error(400, "Content-Length 或 priority 不是整数")
+        if length <= 0:
+            return self._send_error(411, "需要在请求体中上传PPT文件")
+        user = query.get('user') or self.client_address[0]
+        try:
+            job = self.server.service.submit_upload(query.get('name', ''), self.rfile, length,
+                                                    user, priority)
+        except ValueError as e:
+            self.close_connection = True
+            return self._send_error(400, str(e))
+        return self._send_json(201, self._job_payload(job))
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            return self._send_error(404, "未知的路径")
+        try:
+            job = self.server.service.queue.cancel(parts[1])
+        except ValueError as e:
+            return self._send_error(409, str(e))
+        if job is None:
+            return self._send_error(404, "任务不存在")
+        return self._send_json(200, self._job_payload(job))
+
+
+def create_server(service, host='127.0.0.1', port=DEFAULT_PORT):
+    server = _HTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="PPT转图片幻灯片转换服务：HTTP接口 + 投递目录，任务排队后由固定数量的工作线程转换")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="监听地址（默认只接受本机连接；部门共用时设为 0.0.0.0）")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="监听端口（默认: %(default)s）")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="同时转换的任务数（每个工作线程一个渲染后端实例，默认1；"
+                             "PowerPoint只能单实例运行，总是1）")
+    parser.add_argument('--drop-dir', help="投递目录：放入的PPT文件自动转换，结果写到其中的 out/ 子目录")
+    parser.add_argument('--drop-priority', type=int, default=0, help="投递目录任务的优先级")
+    parser.add_argument('--spool-dir', default=default_spool_dir(),
+                        help="保存上传文件和转换结果的目录（默认: %(default)s）")
+    add_conversion_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        options = options_from_args(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    def log(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+    service = ConversionService(args.renderer, options, args.workers, args.spool_dir, log,
+                                args.verbose)
+    service.start()
+    watcher = None
+    if args.drop_dir:
+        watcher = DropFolderWatcher(service, args.drop_dir, args.drop_priority)
+        watcher.start()
+    server = create_server(service, args.host, args.port)
+    log(f"HTTP接口: http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log("正在停止服务，等待进行中的任务完成...")
+    finally:
+        server.server_close()
+        if watcher is not None:
+            watcher.stop()
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
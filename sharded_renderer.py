@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片渲染
+一份很大的演示文稿交给多个渲染进程同时渲染：每个进程有自己的渲染后端实例，
+各自以只读方式打开同一份文件，按幻灯片序号领取任务，渲染结果按序交回转换流程。
+各进程可以使用不同的后端（例如Linux下的几个LibreOffice进程）。
+LibreOffice分片最耗时的一步是整份演示文稿转PDF：主进程只转换一次，
+各LibreOffice分片直接打开这个PDF，只并行栅格化各自领取的页。
+PowerPoint是单实例程序，多个分片实际驱动同一个进程，不能用于分片。
+
+用法：
+    renderer = ShardedRenderer(['libreoffice'] * 4)
+    SlideConverter(renderer=renderer).convert(src, dst)
+    renderer.shutdown()
+
+对外与普通渲染后端相同（render_slide / render_frame 逐张返回），转换流程通过 prefetch
+预告要渲染的幻灯片，各分片提前开始渲染。分片的后端能直接给出位图时，
+位图经共享内存交回主进程（见 frame_transport），不再经过临时PNG。
+"""
+
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+from collections import deque
+
+import frame_transport
+from renderers import (DEFAULT_DPI, RENDERERS, BaseRenderer, LibreOfficeRenderer, RendererError,
+                       create_renderer)
+
+# 每个分片最多同时领取的幻灯片数：渲染完一张时下一张已在它的队列里，进程不空等
+SHARD_QUEUE_DEPTH = 2
+# 等待分片打开演示文稿或交回一张幻灯片的最长时间（秒）
+SHARD_TIMEOUT = 600
+# 关闭分片进程时等待其退出的时间（秒），超时后强制结束
+SHARD_EXIT_TIMEOUT = 30
+# 共享内存位图槽位的总大小上限（字节）；高分辨率时槽位变少，不够用时改用PNG文件
+FRAME_RING_BYTES = 256 * 1024 * 1024
+
+
+def _shard_main(shard, backend, renderer_kwargs, commands, results):
+    """分片进程：按命令打开演示文稿、渲染幻灯片，结果写回 results
+
+    命令：('open', 代次, 路径, dpi, 宽度) / ('ring', 代次, 共享内存描述) /
+    ('render', 代次, 序号, 输出路径, 槽位) / ('close', 代次) / None（退出）。
+    代次用于丢弃已关闭的演示文稿的迟到结果。渲染结果为 (序号, 错误, 槽位, 尺寸)：
+    槽位为主进程分配的 (共享内存名, 槽位号) 或None，尺寸为写入槽位的 (宽, 高)，
+    为None时结果在输出路径的PNG文件中。
+    """
+    if backend == 'powerpoint':
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def log(message):
+        results.put((shard, None, 'log', message))
+
+    try:
+        renderer = create_renderer(backend, log=log, **renderer_kwargs)
+    except Exception as e:
+        results.put((shard, None, 'dead', str(e)))
+        return
+    ring = None
+    try:
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            action, generation = command[0], command[1]
+            if action == 'open':
+                try:
+                    renderer.set_resolution(command[3], command[4])
+                    renderer.open(command[2])
+                    results.put((shard, generation, 'opened',
+                                 (renderer.slide_count, tuple(renderer.slide_size))))
+                except Exception as e:
+                    results.put((shard, generation, 'open_failed', str(e)))
+            elif action == 'ring':
+                if ring is not None:
+                    ring.close()
+                ring = frame_transport.FrameRing.attach(command[2])
+            elif action == 'render':
+                index, output_path, slot = command[2], command[3], command[4]
+                slot_info = (ring.name, slot) if slot is not None and ring is not None else None
+                try:
+                    size = None
+                    if slot_info and renderer.supports_frames:
+                        image = renderer.render_frame(index)
+                        size = ring.write(slot, image)
+                        if size is None:
+                            # 尺寸超出槽位时改用PNG文件
+                            image.save(output_path, "PNG")
+                    else:
+                        renderer.render_slide(index, output_path)
+                    results.put((shard, generation, 'rendered', (index, None, slot_info, size)))
+                except Exception as e:
+                    results.put((shard, generation, 'rendered', (index, str(e), slot_info, None)))
+            elif action == 'close':
+                try:
+                    renderer.close()
+                except Exception as e:
+                    log(f"关闭演示文稿失败: {e}")
+    finally:
+        if ring is not None:
+            ring.close()
+        try:
+            renderer.shutdown()
+        except Exception:
+            pass
+
+
+class _Shard:
+    """一个分片进程及其命令队列"""
+
+    def __init__(self, process, commands):
+        self.process = process
+        self.commands = commands
+        self.opened = False
+        # 已领取未返回的幻灯片 {序号: 槽位}，槽位为 (共享内存名, 槽位号) 或None
+        self.outstanding = {}
+        # 已放弃的请求占用的槽位 {(代次, 序号): 槽位}，等分片迟到的结果返回后归还
+        self.stale = {}
+
+
+class ShardedRenderer(BaseRenderer):
+    """把同一份演示文稿的幻灯片分给多个渲染进程
+
+    backends 为每个分片使用的后端名称列表，长度即分片数；
+    renderer_kwargs 传给各分片的 create_renderer。分片进程在第一次打开
+    演示文稿时启动，在多份演示文稿之间复用，shutdown 时退出。
+    某个分片进程崩溃时，它领取的幻灯片交给其余分片，下次打开时重新启动。
+    """
+
+    supports_frames = frame_transport.available()
+
+    def __init__(self, backends, dpi=DEFAULT_DPI, log=None, renderer_kwargs=None,
+                 timeout=SHARD_TIMEOUT):
+        super().__init__(dpi, log)
+        if not backends:
+            raise RendererError("分片渲染至少需要一个后端")
+        single = sorted({name for name in backends
+                         if name in RENDERERS and RENDERERS[name].single_instance})
+        if single and len(backends) > 1:
+            raise RendererError(f"渲染后端 {', '.join(single)} 只能单实例运行，不能用于分片渲染")
+        self.backends = list(backends)
+        # 后端相同时沿用其名称，渲染结果与不分片时一致，可以共用渲染缓存
+        names = sorted(set(self.backends))
+        self.name = names[0] if len(names) == 1 else '+'.join(names)
+        self.renderer_kwargs = renderer_kwargs or {}
+        self.timeout = timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._results = None
+        self._shards = {}
+        self._generation = 0
+        self._pending = deque()
+        # 重新导出等以文件方式请求的幻灯片，分片直接写PNG
+        self._file_requests = set()
+        self._ready = {}
+        self._ring = None
+        self.work_dir = None
+        # 为LibreOffice分片统一转换PDF的实例（第一次需要时创建），以及本次的PDF目录
+        self._pdf_converter = None
+        self._pdf_dir = None
+
+    # ---- 分片进程管理 ----
+
+    def _start_shards(self):
+        """启动尚未运行（或已退出）的分片进程"""
+        if self._results is None:
+            self._results = self._context.Queue()
+        if self.work_dir is None:
+            self.work_dir = tempfile.mkdtemp(prefix="ppt_shards_")
+        started = 0
+        for shard, backend in enumerate(self.backends, 1):
+            current = self._shards.get(shard)
+            if current is not None and current.process.is_alive():
+                continue
+            if current is not None:
+                self._abandon(current)
+            commands = self._context.Queue()
+            process = self._context.Process(
+                target=_shard_main, name=f"render-shard-{shard}", daemon=True,
+                args=(shard, backend, self.renderer_kwargs, commands, self._results))
+            process.start()
+            if self._ring is not None:
+                # 重新启动的分片也要能写入已有的共享内存
+                commands.put(('ring', self._generation, self._ring.handle()))
+            self._shards[shard] = _Shard(process, commands)
+            started += 1
+        if started:
+            self.log(f"已启动 {started} 个渲染分片进程（{', '.join(self.backends)}）")
+
+    def _drop_shard(self, shard, reason):
+        """分片不再参与本次渲染，已领取的幻灯片放回队首"""
+        item = self._shards.get(shard)
+        if item is None or not item.opened:
+            return
+        item.opened = False
+        self._pending.extendleft(sorted(item.outstanding, reverse=True))
+        self._abandon(item)
+        self.log(f"渲染分片 {shard} 退出本次渲染: {reason}")
+
+    def _abandon(self, item):
+        """放弃分片已领取的幻灯片。进程已退出时不会再有结果，槽位立即归还；
+        否则分片仍可能往槽位里写，等它的结果返回后再归还"""
+        for index, slot_info in item.outstanding.items():
+            if slot_info:
+                item.stale[(self._generation, index)] = slot_info
+        item.outstanding.clear()
+        if not item.process.is_alive():
+            for slot_info in item.stale.values():
+                self._release_slot(slot_info)
+            item.stale.clear()
+
+    def _active_shards(self):
+        return [shard for shard, item in self._shards.items() if item.opened]
+
+    def _receive(self, timeout):
+        """处理一条分片消息；超时时检查分片进程是否还活着"""
+        try:
+            shard, generation, kind, payload = self._results.get(timeout=timeout)
+        except queue.Empty:
+            for shard, item in self._shards.items():
+                if item.opened and not item.process.is_alive():
+                    self._drop_shard(shard, f"进程意外退出（退出码 {item.process.exitcode}）")
+            return False
+        if kind == 'log':
+            self.log(f"[分片 {shard}] {payload}")
+        elif kind == 'dead':
+            self.log(f"渲染分片 {shard} 无法创建渲染后端: {payload}")
+            self._drop_shard(shard, payload)
+        elif generation != self._generation:
+            # 已关闭的演示文稿的迟到结果，只需归还共享内存槽位
+            if kind == 'rendered':
+                self._release_stale(self._shards[shard], generation, payload[0])
+        elif kind == 'opened':
+            self._shards[shard].opened = payload
+        elif kind == 'open_failed':
+            self._shards[shard].opened = None
+            self.log(f"渲染分片 {shard} 打开演示文稿失败: {payload}")
+        elif kind == 'rendered':
+            index, error, slot_info, size = payload
+            item = self._shards[shard]
+            if index not in item.outstanding:
+                # 分片被放弃后才返回的结果，这一张已交给其他分片
+                self._release_stale(item, generation, index)
+                return True
+            # 按主进程分配时的记录归还槽位（分片可能还没收到共享内存，报告的槽位为None）
+            slot_info = item.outstanding.pop(index)
+            if size is None:
+                # 没有写入槽位（出错或改用了PNG文件），槽位直接归还
+                self._release_slot(slot_info)
+                self._ready[index] = (error, None)
+            else:
+                self._ready[index] = (error, (slot_info[1],) + tuple(size))
+        return True
+
+    def _release_slot(self, slot_info):
+        if slot_info and self._ring is not None and slot_info[0] == self._ring.name:
+            self._ring.release(slot_info[1])
+
+    def _release_stale(self, item, generation, index):
+        """已放弃的请求有了结果，归还它的槽位"""
+        self._release_slot(item.stale.pop((generation, index), None))
+
+    def _dispatch(self):
+        """把待渲染的幻灯片按序号顺序分给有空位的分片"""
+        while self._pending:
+            shards = [shard for shard in self._active_shards()
+                      if len(self._shards[shard].outstanding) < SHARD_QUEUE_DEPTH]
+            if not shards:
+                return
+            shard = min(shards, key=lambda item: len(self._shards[item].outstanding))
+            index = self._pending.popleft()
+            slot = None
+            if self._ring is not None and index not in self._file_requests:
+                # 没有空闲槽位时这一张用PNG文件传递
+                slot = self._ring.acquire()
+            self._file_requests.discard(index)
+            self._shards[shard].outstanding[index] = (
+                (self._ring.name, slot) if slot is not None else None)
+            self._shards[shard].commands.put(('render', self._generation, index,
+                                              self._shard_path(index), slot))
+
+    def _prepare_ring(self):
+        """按本次的输出尺寸准备共享内存槽位，发给各分片"""
+        if not self.supports_frames:
+            return
+        width, height = self.pixel_size()
+        slot_bytes = width * height * 3
+        # 每个分片领取的幻灯片各占一个槽位，乱序完成的在主进程取走前也占着，再多留一些
+        slots = min(len(self.backends) * SHARD_QUEUE_DEPTH * 2, FRAME_RING_BYTES // slot_bytes)
+        if slots < 1:
+            return
+        if self._ring is not None and self._ring.slot_bytes >= slot_bytes:
+            return
+        if self._ring is not None:
+            self._ring.close()
+        self._ring = frame_transport.FrameRing.create(slot_bytes, slots)
+        for item in self._shards.values():
+            # 旧共享内存的槽位不用再归还
+            item.stale.clear()
+        for shard in self._active_shards():
+            self._shards[shard].commands.put(('ring', self._generation, self._ring.handle()))
+
+    def _shard_path(self, index):
+        return os.path.join(self.work_dir, f"g{self._generation}_slide_{index:04d}.png")
+
+    # ---- 渲染后端接口 ----
+
+    def is_alive(self):
+        return not self._shards or any(item.process.is_alive() for item in self._shards.values())
+
+    def _shared_pdf(self, deck_path):
+        """有LibreOffice分片时在主进程转换一次PDF，返回路径；失败时返回None（各分片自己转换）"""
+        if LibreOfficeRenderer.name not in self.backends or deck_path.lower().endswith('.pdf'):
+            return None
+        if self._pdf_converter is None:
+            self._pdf_converter = LibreOfficeRenderer(log=self.log)
+        self._pdf_dir = tempfile.mkdtemp(prefix=f"g{self._generation}_pdf_", dir=self.work_dir)
+        try:
+            return self._pdf_converter.convert_to_pdf(deck_path, self._pdf_dir)
+        except RendererError as pdf_error:
+            self.log(f"统一转换PDF失败，由各分片分别转换: {pdf_error}")
+            return None
+
+    def _remove_pdf(self):
+        if self._pdf_dir:
+            shutil.rmtree(self._pdf_dir, ignore_errors=True)
+            self._pdf_dir = None
+
+    def _open(self, deck_path):
+        self._start_shards()
+        self._generation += 1
+        self._pending.clear()
+        self._ready.clear()
+        self._remove_pdf()
+        pdf_path = self._shared_pdf(deck_path)
+        for shard, item in self._shards.items():
+            item.opened = False
+            self._abandon(item)
+            path = pdf_path if pdf_path and self.backends[shard - 1] == LibreOfficeRenderer.name \
+                else deck_path
+            item.commands.put(('open', self._generation, path, self.dpi, self.target_width))
+
+        # 等所有分片打开（或失败）；opened 为 (页数, 尺寸)，失败为 None
+        deadline = time.monotonic() + self.timeout
+        while any(item.opened is False and item.process.is_alive()
+                  for item in self._shards.values()):
+            if time.monotonic() > deadline:
+                break
+            self._receive(timeout=1.0)
+
+        infos = {shard: item.opened for shard, item in self._shards.items() if item.opened}
+        if not infos:
+            raise RendererError("所有渲染分片都无法打开演示文稿")
+        first = min(infos)
+        self.slide_count, self.slide_size = infos[first]
+        for shard, info in infos.items():
+            if info[0] != self.slide_count:
+                # 不同后端对隐藏页等的处理可能不同，序号对不上的分片不参与
+                self._drop_shard(shard, f"页数 {info[0]} 与分片 {first} 的 {self.slide_count} 不一致")
+        self.log(f"{len(self._active_shards())} 个渲染分片已打开演示文稿")
+        self._prepare_ring()
+
+    def prefetch(self, indices):
+        self._pending.extend(indices)
+        self._dispatch()
+
+    def _wait_for(self, index, want_frame):
+        """等待第 index 页的渲染结果，返回 (错误, 位图)"""
+        queued = index in self._ready or index in self._pending or any(
+            index in self._shards[shard].outstanding for shard in self._active_shards())
+        if not queued:
+            # 未预告的幻灯片（例如重新导出）插到队首
+            self._pending.appendleft(index)
+            if not want_frame:
+                self._file_requests.add(index)
+        self._dispatch()
+
+        deadline = time.monotonic() + self.timeout
+        while index not in self._ready:
+            if not self._active_shards():
+                raise RendererError("没有可用的渲染分片")
+            if time.monotonic() > deadline:
+                raise RendererError(f"等待分片渲染幻灯片 {index} 超时")
+            if self._receive(timeout=1.0):
+                deadline = time.monotonic() + self.timeout
+            self._dispatch()
+        return self._ready.pop(index)
+
+    def _render_slide(self, index, output_path):
+        error, frame = self._wait_for(index, want_frame=False)
+        if error:
+            raise RendererError(error)
+        if frame:
+            self._ring.read(*frame).save(output_path, "PNG")
+        else:
+            shutil.move(self._shard_path(index), output_path)
+
+    def _render_frame(self, index):
+        from PIL import Image
+
+        error, frame = self._wait_for(index, want_frame=True)
+        if error:
+            raise RendererError(error)
+        if frame:
+            return self._ring.read(*frame)
+        # 分片的后端只能输出文件，或当时没有空闲槽位
+        path = self._shard_path(index)
+        try:
+            with Image.open(path) as image:
+                return image.convert("RGB")
+        finally:
+            os.remove(path)
+
+    def _close(self):
+        for shard in self._active_shards():
+            self._shards[shard].commands.put(('close', self._generation))
+            self._shards[shard].opened = False
+            self._abandon(self._shards[shard])
+        self._pending.clear()
+        self._file_requests.clear()
+        for index, (error, frame) in self._ready.items():
+            if frame:
+                self._ring.release(frame[0])
+            elif not error:
+                try:
+                    os.remove(self._shard_path(index))
+                except OSError:
+                    pass
+        self._ready.clear()
+        self._remove_pdf()
+
+    def shutdown(self):
+        super().shutdown()
+        for item in self._shards.values():
+            try:
+                item.commands.put(None)
+            except Exception:
+                pass
+        for shard, item in self._shards.items():
+            item.process.join(SHARD_EXIT_TIMEOUT)
+            if item.process.is_alive():
+                self.log(f"渲染分片 {shard} 未能正常退出，强制结束")
+                item.process.terminate()
+                item.process.join()
+        self._shards.clear()
+        if self._pdf_converter is not None:
+            self._pdf_converter.shutdown()
+            self._pdf_converter = None
+        self._remove_pdf()
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
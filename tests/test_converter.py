@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换核心的行为测试
+用假渲染器（renderers.FakeRenderer）转换 benchmark.generate_deck 生成的合成演示文稿，
+检查写出的PPTX压缩包，不需要PowerPoint或LibreOffice。
+
+运行：
+    python -m unittest discover tests
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import io
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import DUPLICATE_RUN, generate_deck  # noqa: E402
+from converter import ConversionCancelled, SlideConverter  # noqa: E402
+from encoders import FixedJpegEncoder  # noqa: E402
+from job_manifest import JobManifest  # noqa: E402
+from render_cache import RenderCache  # noqa: E402
+from renderers import FakeRenderer  # noqa: E402
+
+
+class CountingRenderer(FakeRenderer):
+    """记录打开过的演示文稿和实际渲染了哪些幻灯片的假渲染器"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.opened = []
+        self.rendered = []
+
+    def _open(self, deck_path):
+        self.opened.append(deck_path)
+        super()._open(deck_path)
+
+    def render_image(self, index):
+        self.rendered.append(index)
+        return super().render_image(index)
+
+
+def slide_parts(zf):
+    """压缩包中的幻灯片部件名，按序号排序"""
+    names = [name for name in zf.namelist() if re.fullmatch(r'ppt/slides/slide\d+\.xml', name)]
+    return sorted(names, key=lambda name: int(re.search(r'\d+', name).group()))
+
+
+def slide_media(zf):
+    """每张幻灯片引用的图片部件名（按幻灯片顺序）"""
+    media = []
+    for part in slide_parts(zf):
+        rels = zf.read(part.replace('slides/', 'slides/_rels/') + '.rels').decode('utf-8')
+        target = re.search(r'Target="\.\./media/([^"]+)"', rels).group(1)
+        media.append('ppt/media/' + target)
+    return media
+
+
+class ConverterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="ppt_to_image_test_")
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+
+    def path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def make_deck(self, kind='text', slides=6, name='deck.pptx'):
+        return generate_deck(self.path(name), kind, slides)
+
+    def convert(self, deck, output='out.pptx', renderer=None, **kwargs):
+        renderer = renderer or CountingRenderer()
+        converter = SlideConverter(renderer=renderer, **kwargs)
+        self.assertTrue(converter.convert(deck, self.path(output)))
+        return renderer
+
+
+class RoundTripTest(ConverterTestCase):
+
+    def test_writes_one_image_slide_per_source_slide(self):
+        deck = self.make_deck('text', 6)
+        renderer = self.convert(deck)
+        self.assertEqual(sorted(renderer.rendered), [1, 2, 3, 4, 5, 6])
+
+        with zipfile.ZipFile(self.path('out.pptx')) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(slide_parts(zf), [f'ppt/slides/slide{i}.xml' for i in range(1, 7)])
+            presentation = zf.read('ppt/presentation.xml').decode('utf-8')
+            self.assertEqual(len(re.findall(r'<p:sldId ', presentation)), 6)
+            media = slide_media(zf)
+            self.assertEqual(len(set(media)), 6)
+            for name in media:
+                self.assertRegex(name, r'^ppt/media/image\d+\.(jpg|png)$')
+                self.assertIn(name, zf.namelist())
+            self.assertIn('[Content_Types].xml', zf.namelist())
+
+
+class RenderCacheTest(ConverterTestCase):
+
+    def test_second_conversion_is_served_from_cache(self):
+        deck = self.make_deck('text', 5)
+        cache = RenderCache(self.path('cache'))
+        first = self.convert(deck, 'first.pptx', cache=cache)
+        self.assertEqual(sorted(first.rendered), [1, 2, 3, 4, 5])
+
+        second = self.convert(deck, 'second.pptx', cache=cache)
+        self.assertEqual(second.rendered, [])
+        self.assertEqual(second.opened, [], "全部命中缓存时不应打开渲染后端")
+        with zipfile.ZipFile(self.path('first.pptx')) as a, \
+                zipfile.ZipFile(self.path('second.pptx')) as b:
+            self.assertEqual([a.read(name) for name in slide_media(a)],
+                             [b.read(name) for name in slide_media(b)])
+
+
+class ResumeTest(ConverterTestCase):
+
+    def test_resume_renders_only_unfinished_slides(self):
+        from PIL import Image
+
+        deck = self.make_deck('text', 6)
+        jobs_dir = self.path('jobs')
+        renderer = CountingRenderer()
+        converter = SlideConverter(renderer=renderer, resume=True, jobs_dir=jobs_dir)
+
+        # 模拟中断的任务：前3张已完成，图片留在任务工作目录
+        manifest = JobManifest.open_for(deck, converter.render_settings(), jobs_dir)
+        manifest.set_slide_info(6, (960.0, 540.0))
+        buffer = io.BytesIO()
+        Image.new("RGB", (320, 180), (12, 34, 56)).save(buffer, "JPEG")
+        finished = buffer.getvalue()
+        for i in (1, 2, 3):
+            with open(manifest.slide_path(i), 'wb') as f:
+                f.write(finished)
+            manifest.mark(i, 'done')
+
+        self.assertTrue(converter.convert(deck, self.path('out.pptx')))
+        self.assertEqual(sorted(renderer.rendered), [4, 5, 6])
+        with zipfile.ZipFile(self.path('out.pptx')) as zf:
+            images = [zf.read(name) for name in slide_media(zf)]
+        self.assertEqual(len(images), 6)
+        self.assertEqual(images[:3], [finished] * 3)
+        self.assertNotIn(finished, images[3:])
+
+
+class DedupTest(ConverterTestCase):
+
+    def test_identical_slides_share_one_media_part(self):
+        deck = self.make_deck('duplicate', 2 * DUPLICATE_RUN)
+        self.convert(deck)
+        with zipfile.ZipFile(self.path('out.pptx')) as zf:
+            media = slide_media(zf)
+            stored = [name for name in zf.namelist() if name.startswith('ppt/media/')]
+        self.assertEqual(len(media), 2 * DUPLICATE_RUN)
+        self.assertEqual(media[:DUPLICATE_RUN], [media[0]] * DUPLICATE_RUN)
+        self.assertEqual(media[DUPLICATE_RUN:], [media[DUPLICATE_RUN]] * DUPLICATE_RUN)
+        self.assertNotEqual(media[0], media[DUPLICATE_RUN])
+        self.assertEqual(sorted(stored), sorted({media[0], media[DUPLICATE_RUN]}))
+
+
+class PatchTest(ConverterTestCase):
+
+    def read_images(self, output='out.pptx'):
+        with zipfile.ZipFile(self.path(output)) as zf:
+            return [zf.read(name) for name in slide_media(zf)]
+
+    def test_patch_replaces_only_selected_slides(self):
+        deck = self.make_deck('text', 5)
+        self.convert(deck)
+        before = self.read_images()
+
+        # 用不同的编码质量重新转换第2、4张，便于区分新旧图片
+        renderer = CountingRenderer()
+        converter = SlideConverter(renderer=renderer, encoder=FixedJpegEncoder(quality=60))
+        self.assertTrue(converter.patch(deck, self.path('out.pptx'), slides=[2, 4]))
+        self.assertEqual(sorted(renderer.rendered), [2, 4])
+
+        after = self.read_images()
+        self.assertEqual(len(after), 5)
+        for i in (1, 3, 5):
+            self.assertEqual(after[i - 1], before[i - 1], f"第 {i} 张不应被改动")
+        for i in (2, 4):
+            self.assertNotEqual(after[i - 1], before[i - 1], f"第 {i} 张应被替换")
+
+    def test_patch_rejects_out_of_range_slides(self):
+        deck = self.make_deck('text', 3)
+        self.convert(deck)
+        before = self.read_images()
+        converter = SlideConverter(renderer=CountingRenderer())
+        self.assertFalse(converter.patch(deck, self.path('out.pptx'), slides=[4]))
+        self.assertEqual(self.read_images(), before)
+
+
+class CancelTest(ConverterTestCase):
+
+    def test_cancel_before_start_raises(self):
+        deck = self.make_deck('text', 3)
+        cancel_event = threading.Event()
+        cancel_event.set()
+        renderer = CountingRenderer()
+        converter = SlideConverter(renderer=renderer, cancel_event=cancel_event)
+        with self.assertRaises(ConversionCancelled):
+            converter.convert(deck, self.path('out.pptx'))
+        self.assertEqual(renderer.rendered, [])
+        self.assertFalse(os.path.exists(self.path('out.pptx')))
+
+    def test_cancelled_resumable_job_keeps_progress(self):
+        deck = self.make_deck('text', 6)
+        jobs_dir = self.path('jobs')
+        cancel_event = threading.Event()
+
+        def progress(completed, total):
+            if completed >= 2:
+                cancel_event.set()
+
+        # 逐张渲染，取消在下一张幻灯片之前生效（批量渲染时一批内的幻灯片会一起渲染完）
+        first = CountingRenderer(render_delay=0.05)
+        converter = SlideConverter(renderer=first, resume=True, jobs_dir=jobs_dir,
+                                   bulk_render=False, progress=progress,
+                                   cancel_event=cancel_event)
+        with self.assertRaises(ConversionCancelled):
+            converter.convert(deck, self.path('out.pptx'))
+        self.assertLess(len(first.rendered), 6)
+        self.assertFalse(os.path.exists(self.path('out.pptx')))
+
+        second = self.convert(deck, resume=True, jobs_dir=jobs_dir)
+        self.assertLess(len(second.rendered), 6)
+        self.assertEqual(set(first.rendered) | set(second.rendered), {1, 2, 3, 4, 5, 6})
+
+
+if __name__ == "__main__":
+    unittest.main()
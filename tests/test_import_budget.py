@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入耗时预算检查
+命令行、服务和转换核心的导入耗时不超过 benchmark.IMPORT_BUDGETS_MS，
+且导入时没有提前加载 benchmark.LAZY_MODULES 中的重量级依赖（GUI、COM、numpy、PIL等）。
+
+运行：
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import IMPORT_BUDGETS_MS, measure_import  # noqa: E402
+
+
+class ImportBudgetTest(unittest.TestCase):
+
+    def test_import_budgets(self):
+        for module, budget in IMPORT_BUDGETS_MS.items():
+            with self.subTest(module=module):
+                milliseconds, loaded = measure_import(module)
+                self.assertIsNotNone(milliseconds, f"没有得到 import {module} 的耗时")
+                self.assertEqual(loaded, [], f"import {module} 提前加载了 {', '.join(loaded)}")
+                self.assertLessEqual(milliseconds, budget,
+                                     f"import {module} 耗时 {milliseconds:.1f} ms，预算 {budget} ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换过程的分阶段计时
+在每个阶段和每张幻灯片外面包一层 span，记录墙钟时间、线程CPU时间和进程峰值内存，
+可导出为JSON行文件、Chrome/Perfetto 可打开的 trace 文件，以及日志中的汇总表
+
+用法：
+    tracer = Tracer()
+    with tracer.span('render', slide=3):
+        ...
+    tracer.write_chrome_trace('convert.trace.json')
+    for line in tracer.summary_lines():
+        print(line)
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+
+def peak_rss_bytes():
+    """当前进程的峰值常驻内存（字节），无法获取时返回None"""
+    if os.name == 'nt':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters),
+                                                        counters.cb):
+                return counters.PeakWorkingSetSize
+        except Exception:
+            pass
+        return None
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以KB为单位，macOS 以字节为单位
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return None
+
+
+def pad_display(text, width, right=False):
+    """按显示宽度补空格（中文字符占两格）"""
+    text = str(text)
+    display = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    padding = ' ' * max(0, width - display)
+    return padding + text if right else text + padding
+
+
+class Span:
+    """一次计时记录"""
+
+    __slots__ = ('name', 'attrs', 'thread', 'start', 'wall', 'cpu', 'peak_rss')
+
+    def __init__(self, name, attrs, thread, start, wall, cpu, peak_rss):
+        self.name = name
+        self.attrs = attrs
+        self.thread = thread
+        self.start = start
+        self.wall = wall
+        self.cpu = cpu
+        self.peak_rss = peak_rss
+
+    def to_dict(self):
+        record = {
+            'name': self.name, 'thread': self.thread, 'start': round(self.start, 6),
+            'wall': round(self.wall, 6), 'cpu': round(self.cpu, 6), 'peak_rss': self.peak_rss,
+        }
+        if self.attrs:
+            record['attrs'] = self.attrs
+        return record
+
+
+class Tracer:
+    """收集 span（线程安全）；时间以创建 Tracer 的时刻为零点"""
+
+    enabled = True
+
+    def __init__(self):
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """记录 with 块的耗时；attrs 为附加信息（如幻灯片序号）"""
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            span = Span(name, attrs, threading.current_thread().name, start - self.origin,
+                        time.perf_counter() - start, time.thread_time() - cpu_start,
+                        peak_rss_bytes())
+            with self._lock:
+                self.spans.append(span)
+
+    def write_jsonl(self, path):
+        """每行一个 span 的JSON"""
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, 'w', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False) + '\n')
+
+    def write_chrome_trace(self, path):
+        """Chrome trace 格式（chrome://tracing 或 ui.perfetto.dev 打开）"""
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        thread_ids = {}
+        events = []
+        for span in spans:
+            tid = thread_ids.setdefault(span.thread, len(thread_ids) + 1)
+            args = dict(span.attrs, cpu_ms=round(span.cpu * 1000, 3))
+            if span.peak_rss is not None:
+                args['peak_rss_mb'] = round(span.peak_rss / 1024 / 1024, 1)
+            events.append({
+                'name': span.name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': round(span.start * 1e6, 1), 'dur': round(span.wall * 1e6, 1), 'args': args,
+            })
+        events += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for name, tid in thread_ids.items()
+        ]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+    def summary(self):
+        """按阶段名汇总：{名称: {'count', 'wall', 'cpu', 'max', 'peak_rss'}}，按首次出现排序"""
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        for span in sorted(spans, key=lambda item: item.start):
+            stage = stages.setdefault(span.name, {'count': 0, 'wall': 0.0, 'cpu': 0.0,
+                                                  'max': 0.0, 'peak_rss': None})
+            stage['count'] += 1
+            stage['wall'] += span.wall
+            stage['cpu'] += span.cpu
+            stage['max'] = max(stage['max'], span.wall)
+            if span.peak_rss is not None:
+                stage['peak_rss'] = max(stage['peak_rss'] or 0, span.peak_rss)
+        return stages
+
+    def summary_lines(self):
+        """汇总表的文本行，用于写入日志"""
+        widths = (20, 6, 10, 10, 10, 9, 9)
+        header = ('阶段', '次数', '总耗时s', '平均ms', '最长ms', 'CPU s', '峰值MB')
+        rows = [header]
+        for name, stage in self.summary().items():
+            peak = f"{stage['peak_rss'] / 1024 / 1024:.0f}" if stage['peak_rss'] else '-'
+            rows.append((
+                name, stage['count'], f"{stage['wall']:.3f}",
+                f"{stage['wall'] / stage['count'] * 1000:.1f}", f"{stage['max'] * 1000:.1f}",
+                f"{stage['cpu']:.3f}", peak,
+            ))
+        return [
+            ''.join(pad_display(cell, width, right=column > 0)
+                    for column, (cell, width) in enumerate(zip(row, widths)))
+            for row in rows
+        ]
+
+
+class NullTracer:
+    """不记录任何信息的 Tracer，默认使用"""
+
+    enabled = False
+    spans = ()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield
+
+    def summary(self):
+        return {}
+
+    def summary_lines(self):
+        return []
+
+
+NULL_TRACER = NullTracer()